@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import time
+import uuid
+
+# ===========================
+# CONFIGURATION
+# ===========================
+
+DB_PATH = "data/ipo_ml_withsme.db"
+
+# One row per alert ever sent, keyed by (ipo_name, alert_type, threshold).
+# Sending is claim-then-send: a run first claims the key inside a write transaction
+# (only one overlapping run can win it), sends, then marks it sent or releases it on failure.
+# A send that may have gone through (abandoned in flight, read timeout) is marked unconfirmed:
+# like sent it is never claimed again, so an uncertain alert is never sent twice.
+LEDGER_TTL_DAYS = int(os.getenv("ALERT_LEDGER_TTL_DAYS", "90"))  # well past any IPO's bidding-to-listing window
+CLAIM_TIMEOUT_SECONDS = 10 * 60  # a claim older than this belongs to a run that died mid-send
+
+CLAIMED = "claimed"
+SENT = "sent"
+UNCONFIRMED = "unconfirmed"
+
+
+def _connect(db_path):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS alert_ledger (
+        ipo_name TEXT NOT NULL,
+        alert_type TEXT NOT NULL,
+        threshold REAL NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        claim_token TEXT,
+        claimed_at INTEGER NOT NULL,
+        sent_at INTEGER,
+        PRIMARY KEY (ipo_name, alert_type, threshold)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alert_ledger_sent_at ON alert_ledger (sent_at)")
+    return conn
+
+
+def ledger_key(alert):
+    return (alert["ipo_name"], alert["alert_type"], float(alert.get("threshold") or 0.0))
+
+
+def new_claim_token():
+    return uuid.uuid4().hex
+
+
+def claim(keys, token, db_path=DB_PATH):
+    """Atomically claim the keys nobody has sent or is sending. Returns the set of keys won."""
+    now = int(time.time())
+    won = set()
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for key in keys:
+            # Insert a fresh claim, or take over a claim abandoned by a crashed run; sent rows are never touched
+            cur = conn.execute("""
+                INSERT INTO alert_ledger (ipo_name, alert_type, threshold, status, claim_token, claimed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(ipo_name, alert_type, threshold) DO UPDATE SET
+                    claim_token = excluded.claim_token, claimed_at = excluded.claimed_at
+                WHERE alert_ledger.status = ? AND alert_ledger.claimed_at < ?
+            """, (*key, CLAIMED, token, now, CLAIMED, now - CLAIM_TIMEOUT_SECONDS))
+            if cur.rowcount == 1:
+                won.add(key)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return won
+
+
+def mark_sent(keys, token, db_path=DB_PATH, status=SENT):
+    """Close our claims as sent (or UNCONFIRMED); either way the alert is not sent again."""
+    conn = _connect(db_path)
+    try:
+        conn.executemany("""
+            UPDATE alert_ledger SET status = ?, sent_at = ?
+            WHERE ipo_name = ? AND alert_type = ? AND threshold = ? AND claim_token = ?
+        """, [(status, int(time.time()), *key, token) for key in keys])
+    finally:
+        conn.close()
+
+
+def release(keys, token, db_path=DB_PATH):
+    """Drop our claims on alerts that certainly failed to send, so the next run can try again."""
+    conn = _connect(db_path)
+    try:
+        conn.executemany("""
+            DELETE FROM alert_ledger
+            WHERE ipo_name = ? AND alert_type = ? AND threshold = ? AND claim_token = ? AND status = ?
+        """, [(*key, token, CLAIMED) for key in keys])
+    finally:
+        conn.close()
+
+
+def cleanup(ttl_days=LEDGER_TTL_DAYS, db_path=DB_PATH):
+    """Delete sent entries older than the TTL (indexed range delete). Returns rows removed."""
+    conn = _connect(db_path)
+    try:
+        cur = conn.execute("DELETE FROM alert_ledger WHERE sent_at < ?", (int(time.time()) - ttl_days * 86400,))
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+def migrate_sent_file(path, alert_type, threshold, db_path=DB_PATH):
+    """One-time import of the old data/sent_alerts.txt (one IPO name per line) as already-sent alerts."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        names = {line.strip() for line in f if line.strip()}
+
+    now = int(time.time())
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        before = conn.total_changes
+        conn.executemany("""
+            INSERT OR IGNORE INTO alert_ledger (ipo_name, alert_type, threshold, status, claimed_at, sent_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(name, alert_type, float(threshold), SENT, now, now) for name in names])
+        imported = conn.total_changes - before
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    os.replace(path, path + ".migrated")
+    print(f"✅ Migrated {imported} entries from {path} into alert_ledger.")
+    return imported
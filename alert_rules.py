@@ -0,0 +1,233 @@
+import hashlib
+import threading
+from bisect import bisect_right
+
+import alert_ledger
+from api_db import bump_version, get_version
+from alerts import NTFY_TOPIC, AlertDispatcher, NtfySink
+
+# ======================
+# SUBSCRIBER ALERT RULES
+# ======================
+# VIP subscribers register their own triggers (stored in alert_rules, keyed by vip_keys.key):
+#   gmp_pct  gte     25  Mainboard   -> "GMP% >= 25 on Mainboard"
+#   subscription_x crosses 50        -> "subscription crosses 50x" (between two uploads)
+#   predicted_probability jump 10    -> "probability jumps 10 points"
+#
+# Rules are matched at upload time against the rows that actually changed. They are held
+# in a RuleIndex: one sorted threshold list per (field, op, ipo_type), so each changed value
+# is a bisect plus a slice, however many rules there are.
+
+# Rule fields and the factor that turns the stored value into what subscribers see on the dashboard
+FIELDS = {
+    "gmp": 1,
+    "gmp_pct": 1,
+    "subscription_x": 1,
+    "predicted_probability": 100,  # stored 0-1, rules are in percentage points
+}
+OPS = ("gte", "crosses", "jump")
+IPO_TYPES = ("", "SME", "Mainboard")  # "" matches any type
+MAX_RULES_PER_KEY = 50
+
+FIELD_LABELS = {
+    "gmp": "GMP ₹",
+    "gmp_pct": "GMP%",
+    "subscription_x": "Subscription x",
+    "predicted_probability": "Probability %",
+}
+
+
+def _value(row, field):
+    value = row.get(field) if row else None
+    if value in (None, ""):
+        return None
+    try:
+        return float(value) * FIELDS[field]
+    except (TypeError, ValueError):
+        return None
+
+
+class RuleIndex:
+    """All subscriber rules, bucketed by (field, op, ipo_type) with thresholds sorted ascending."""
+
+    def __init__(self, rules):
+        buckets = {}
+        for rule in rules:
+            buckets.setdefault((rule["field"], rule["op"], rule["ipo_type"] or ""), []).append(rule)
+        self.buckets = {}
+        for bucket, items in buckets.items():
+            items.sort(key=lambda r: r["threshold"])
+            self.buckets[bucket] = ([r["threshold"] for r in items], items)
+        self.size = len(rules)
+
+    def _hits(self, field, op, ipo_type, low, high):
+        """Rules of one kind whose threshold t satisfies low < t <= high (low=None: no lower bound)."""
+        for bucket_type in {"", ipo_type or ""}:
+            entry = self.buckets.get((field, op, bucket_type))
+            if entry is None:
+                continue
+            thresholds, items = entry
+            start = 0 if low is None else bisect_right(thresholds, low)
+            yield from items[start:bisect_right(thresholds, high)]
+
+    def match(self, changes):
+        """changes: iterable of (old_row or None, new_row). Returns [(rule, new_row, old_value, new_value)]."""
+        fired = []
+        if not self.size:
+            return fired
+        for old, new in changes:
+            ipo_type = new.get("ipo_type")
+            for field in FIELDS:
+                value = _value(new, field)
+                if value is None:
+                    continue
+                previous = _value(old, field)
+                if previous == value:
+                    continue
+                for rule in self._hits(field, "gte", ipo_type, None, value):
+                    fired.append((rule, new, previous, value))
+                if previous is None:
+                    continue
+                if previous < value:
+                    for rule in self._hits(field, "crosses", ipo_type, previous, value):
+                        fired.append((rule, new, previous, value))
+                    for rule in self._hits(field, "jump", ipo_type, None, value - previous):
+                        fired.append((rule, new, previous, value))
+        return fired
+
+
+# ======================
+# STORAGE (called with a connection from api_db)
+# ======================
+
+def default_topic(key):
+    """Per-subscriber ntfy topic; derived from a hash so the access key itself is never published."""
+    return f"{NTFY_TOPIC}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}"
+
+
+def known_topics(conn, key):
+    """Topics `key` can point a rule at: its own default topic plus the ones its rules already use."""
+    rows = conn.execute("SELECT DISTINCT topic FROM alert_rules WHERE vip_key = ?", (key,)).fetchall()
+    return [default_topic(key)] + sorted({row[0] for row in rows} - {default_topic(key)})
+
+
+def validate_topic(conn, key, topic):
+    """Error message for a topic the subscriber doesn't listen on (e.g. a typo), or None."""
+    if topic and topic not in known_topics(conn, key):
+        return f"Unknown topic '{topic}' (leave it empty for your alert topic {default_topic(key)})"
+    return None
+
+
+def list_rules(conn, key):
+    cur = conn.execute(
+        "SELECT id, field, op, threshold, ipo_type, topic, created_at FROM alert_rules WHERE vip_key = ? ORDER BY id",
+        (key,),
+    )
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def validate_rule(field, op, threshold, ipo_type):
+    """Error message for an invalid rule, or None."""
+    if field not in FIELDS:
+        return f"Unknown field '{field}' (use one of: {', '.join(FIELDS)})"
+    if op not in OPS:
+        return f"Unknown op '{op}' (use one of: {', '.join(OPS)})"
+    if ipo_type not in IPO_TYPES:
+        return "ipo_type must be SME, Mainboard or empty for both"
+    if op == "jump" and threshold <= 0:
+        return "A jump rule needs a positive threshold"
+    return None
+
+
+def add_rule(conn, key, field, op, threshold, ipo_type="", topic=""):
+    """Insert a rule for `key` and return its id. Raises ValueError when the key already has too many."""
+    with conn:
+        count = conn.execute("SELECT COUNT(*) FROM alert_rules WHERE vip_key = ?", (key,)).fetchone()[0]
+        if count >= MAX_RULES_PER_KEY:
+            raise ValueError(f"Limit of {MAX_RULES_PER_KEY} rules per key reached")
+        cur = conn.execute(
+            "INSERT INTO alert_rules (vip_key, field, op, threshold, ipo_type, topic) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, field, op, float(threshold), ipo_type, topic or default_topic(key)),
+        )
+        bump_version(conn, "alert_rules")
+    return cur.lastrowid
+
+
+def delete_rule(conn, key, rule_id):
+    """Delete one of `key`'s rules. Returns False when it doesn't exist (or belongs to another key)."""
+    with conn:
+        cur = conn.execute("DELETE FROM alert_rules WHERE id = ? AND vip_key = ?", (rule_id, key))
+        if cur.rowcount:
+            bump_version(conn, "alert_rules")
+    return cur.rowcount > 0
+
+
+_index_lock = threading.Lock()
+_index_cache = {"version": None, "index": RuleIndex([])}
+
+
+def get_index(conn):
+    """The RuleIndex for the current rule set; only rebuilt after a rule was added or removed."""
+    version = get_version(conn, "alert_rules")
+    with _index_lock:
+        if _index_cache["version"] != version:
+            # Rules whose key was revoked drop out here (vip_keys changes bump the version, see api_db)
+            cur = conn.execute("""
+                SELECT r.id, r.vip_key, r.field, r.op, r.threshold, r.ipo_type, r.topic
+                FROM alert_rules r JOIN vip_keys k ON k.key = r.vip_key
+            """)
+            names = [d[0] for d in cur.description]
+            _index_cache["index"] = RuleIndex([dict(zip(names, row)) for row in cur.fetchall()])
+            _index_cache["version"] = version
+        return _index_cache["index"]
+
+
+# ======================
+# DELIVERY
+# ======================
+
+def rule_alert(rule, row, previous, value):
+    label = FIELD_LABELS[rule["field"]]
+    if rule["op"] == "gte":
+        what = f"{label} {value:.1f} ≥ {rule['threshold']:g}"
+    elif rule["op"] == "crosses":
+        what = f"{label} crossed {rule['threshold']:g} ({previous:.1f} → {value:.1f})"
+    else:
+        what = f"{label} jumped {value - previous:+.1f} ({previous:.1f} → {value:.1f})"
+    return {
+        "alert_id": f"{rule['id']}:{row['ipo_name']}",
+        "ipo_name": row["ipo_name"],
+        "alert_type": f"RULE:{rule['id']}",
+        "threshold": rule["threshold"],
+        "topic": rule["topic"],
+        "title": f"{row['ipo_name']}: {what}",
+        "message": f"🔔 {row['ipo_name']} ({row.get('ipo_type') or 'IPO'})\n{what}",
+        "tags": ["bell"],
+    }
+
+
+def deliver(fired, dispatcher=None, db_path=alert_ledger.DB_PATH):
+    """Send the alerts for matched rules, each at most once per (rule, IPO) via the alert ledger."""
+    candidates = {}
+    for rule, row, previous, value in fired:
+        alert = rule_alert(rule, row, previous, value)
+        candidates.setdefault(alert["alert_id"], alert)
+    if not candidates:
+        return {}
+
+    token = alert_ledger.new_claim_token()
+    claimed = alert_ledger.claim([alert_ledger.ledger_key(a) for a in candidates.values()], token, db_path)
+    alerts = [a for a in candidates.values() if alert_ledger.ledger_key(a) in claimed]
+
+    dispatcher = dispatcher or AlertDispatcher(sinks=[NtfySink()])
+    results = dispatcher.dispatch(alerts)
+    delivered = [a for a in alerts if a["alert_id"] in results and results[a["alert_id"]] is None]
+    unconfirmed = [a for a in alerts if a not in delivered and a["alert_id"] in dispatcher.unconfirmed]
+    failed = [a for a in alerts if a not in delivered and a not in unconfirmed]
+    alert_ledger.mark_sent([alert_ledger.ledger_key(a) for a in delivered], token, db_path)
+    # May have reached ntfy already: kept out of the retries so nobody gets it twice
+    alert_ledger.mark_sent([alert_ledger.ledger_key(a) for a in unconfirmed], token, db_path, status=alert_ledger.UNCONFIRMED)
+    alert_ledger.release([alert_ledger.ledger_key(a) for a in failed], token, db_path)
+    print(f"🔔 Subscriber rules: {len(fired)} matches, {len(alerts)} new alerts, {len(delivered)} delivered.")
+    return results
@@ -0,0 +1,211 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# ======================
+# CONFIG
+# ======================
+
+# Comma-separated sinks every alert goes to: ntfy, webhook, local
+ALERT_SINKS = os.getenv("ALERT_SINKS", "ntfy")
+NTFY_URL = os.getenv("NTFY_URL", "https://ntfy.sh")
+NTFY_TOPIC = os.getenv("NTFY_TOPIC", "ipo_alerts_my_portfolio")  # Change this to whatever word you want!
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")
+ALERT_LOCAL_PATH = os.getenv("ALERT_LOCAL_PATH", "data/alerts_outbox.jsonl")
+
+MAX_WORKERS = int(os.getenv("ALERT_MAX_WORKERS", "8"))
+TIMEOUT = (3.05, 10)       # (connect, read) seconds per HTTP attempt
+RETRIES = 3                # on connection errors, 429 and 5xx
+BACKOFF_FACTOR = 0.5       # 0.5s, 1s, 2s between attempts
+DEADLINE_SECONDS = 45      # the whole batch; whatever is still in flight is abandoned (unconfirmed, not retried)
+
+
+def invest_alert(row, threshold=0.0):
+    """Alert payload for an IPO the model says to INVEST in (threshold: the probability cut-off that fired)."""
+    return {
+        "ipo_name": row["ipo_name"],
+        "alert_type": "INVEST",
+        "threshold": threshold,
+        "title": f"INVEST: {row['ipo_name']}",
+        "message": (
+            f"🟢 INVEST ALERT: {row['ipo_name']}\nGMP: {row['gmp_pct']:.1f}%\n"
+            f"Prob: {row['predicted_probability']:.0%}\nPrice: ₹{row['ipo_price']}"
+        ),
+        "tags": ["green_circle", "moneybag"],
+    }
+
+
+# ======================
+# SINKS
+# ======================
+
+class NtfySink:
+    name = "ntfy"
+
+    def __init__(self, topic=NTFY_TOPIC, base_url=NTFY_URL):
+        self.base_url = base_url.rstrip("/")
+        self.url = f"{self.base_url}/{topic}"
+
+    def send(self, alert, session, timeout):
+        headers = {"Tags": ",".join(alert.get("tags", []))}
+        # Subscriber rule alerts carry their own topic
+        url = f"{self.base_url}/{alert['topic']}" if alert.get("topic") else self.url
+        resp = session.post(url, data=alert["message"].encode("utf-8"), headers=headers, timeout=timeout)
+        resp.raise_for_status()
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url=ALERT_WEBHOOK_URL):
+        self.url = url
+
+    def send(self, alert, session, timeout):
+        resp = session.post(self.url, json=alert, timeout=timeout)
+        resp.raise_for_status()
+
+
+class LocalSink:
+    """Keeps alerts in memory (and appends them to a JSONL file if a path is given). For dry runs and tests."""
+    name = "local"
+
+    def __init__(self, path=None):
+        self.path = path
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, alert, session, timeout):
+        with self._lock:
+            self.sent.append(alert)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+
+def sinks_from_env(names=ALERT_SINKS):
+    sinks = []
+    for name in (n.strip().lower() for n in names.split(",")):
+        if name == "ntfy":
+            sinks.append(NtfySink())
+        elif name == "webhook" and ALERT_WEBHOOK_URL:
+            sinks.append(WebhookSink())
+        elif name == "local":
+            sinks.append(LocalSink(ALERT_LOCAL_PATH))
+        elif name:
+            print(f"⚠️ Unknown or unconfigured alert sink '{name}', skipping.")
+    return sinks
+
+
+# ======================
+# DISPATCHER
+# ======================
+
+def alert_id(alert):
+    return alert.get("alert_id", alert["ipo_name"])
+
+
+def _never_delivered(exc):
+    """True when a failed send certainly didn't reach the endpoint: it answered with an error, the
+    connection was never made, or the sink isn't HTTP at all. Anything else (read timeout, connection
+    dropped mid-request) may have been delivered, so it must not be sent again."""
+    import requests
+    from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+    if not isinstance(exc, requests.exceptions.RequestException):
+        return True
+    if isinstance(exc, (requests.exceptions.HTTPError, requests.exceptions.RetryError, requests.exceptions.ConnectTimeout)):
+        return True
+    if isinstance(exc, requests.exceptions.ConnectionError) and exc.args:
+        return isinstance(getattr(exc.args[0], "reason", None), (NewConnectionError, ConnectTimeoutError))
+    return False
+
+
+def _pooled_session(pool_size):
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=RETRIES, connect=RETRIES, read=RETRIES, status=RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=None,  # ntfy/webhook POSTs are safe to repeat
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class AlertDispatcher:
+    """Sends alerts to every sink in parallel over one pooled HTTP session.
+
+    dispatch() returns {alert id: error or None}, the id being the alert's
+    "alert_id" if it has one, else its ipo_name; an alert counts as delivered
+    when at least one sink accepted it. Failed alerts that may still have
+    reached a sink (abandoned in flight, read timeout) are also listed in
+    self.unconfirmed: callers must not retry those, or subscribers get duplicates."""
+
+    def __init__(self, sinks=None, max_workers=MAX_WORKERS, timeout=TIMEOUT, deadline=DEADLINE_SECONDS, session=None):
+        self.sinks = sinks if sinks is not None else sinks_from_env()
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.deadline = deadline
+        self._session = session
+        self.unconfirmed = set()
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = _pooled_session(self.max_workers)
+        return self._session
+
+    def _send(self, sink, alert):
+        start = time.perf_counter()
+        sink.send(alert, self.session, self.timeout)
+        return time.perf_counter() - start
+
+    def dispatch(self, alerts):
+        if not alerts or not self.sinks:
+            return {}
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="alert")
+        futures = {
+            executor.submit(self._send, sink, alert): (alert_id(alert), sink.name)
+            for alert in alerts for sink in self.sinks
+        }
+        wait(futures, timeout=self.deadline)
+        # A stuck endpoint must not hold the pipeline: abandon whatever hasn't finished
+        # (sends that never started are cancelled; running ones may still get through)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        errors = {alert_id(alert): [] for alert in alerts}
+        delivered, maybe_sent = set(), set()
+        for future, (key, sink_name) in futures.items():
+            if future.cancelled():
+                errors[key].append(f"{sink_name}: not sent within {self.deadline}s")
+            elif not future.done():
+                maybe_sent.add(key)
+                errors[key].append(f"{sink_name}: no response within {self.deadline}s")
+            elif future.exception() is not None:
+                if not _never_delivered(future.exception()):
+                    maybe_sent.add(key)
+                errors[key].append(f"{sink_name}: {future.exception()}")
+            else:
+                delivered.add(key)
+                print(f"   -> Sent alert for {key} via {sink_name} ({future.result():.2f}s)")
+
+        results = {}
+        self.unconfirmed = maybe_sent - delivered
+        for key, errs in errors.items():
+            if key in self.unconfirmed:
+                print(f"⚠️ Alert for {key} unconfirmed (may have been delivered, not retried): {'; '.join(errs)}")
+            elif errs and key not in delivered:
+                print(f"❌ Alert for {key} failed on {'; '.join(errs)}")
+            results[key] = None if key in delivered else "; ".join(errs)
+        return results
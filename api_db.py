@@ -0,0 +1,452 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+# ======================
+# DATA LAYER (Web Service)
+# ======================
+# Every SQLite call made by app.py goes through here so the event loop never blocks:
+#   - reads run on a dedicated pool (DB_READ_WORKERS threads, not FastAPI's shared
+#     threadpool), each thread holding its own connection; WAL keeps them concurrent
+#   - writes run on a single writer thread, so uploads are serialised and never
+#     stall other requests
+
+# KEEP THIS: The API still needs a place to save what it receives
+# Ensure your API service has a volume mounted at /app/data
+DB_PATH = "data/ipo_ml_withsme.db" 
+
+# Create the table if it doesn't exist (First run setup)
+def init_db():
+    if not os.path.exists(os.path.dirname(DB_PATH)):
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    
+    conn = sqlite3.connect(DB_PATH)
+    # WAL lets the dashboard keep reading the old snapshot while an upload is being written
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Basic table structure if empty
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ipo_predictions (
+            ipo_name TEXT,
+            predicted_probability REAL,
+            gmp_pct REAL,
+            final_decision INTEGER,
+            decision_label TEXT,
+            predicted_at TEXT,
+            listing_date TEXT,
+            subscription_x REAL,
+            open_date TEXT,
+            close_date TEXT,
+            ipo_type TEXT,
+            status TEXT,
+            gmp REAL,
+            ipo_price REAL,
+            ipo_size_cr REAL,
+            lot_size INTEGER,
+            has_anchor INTEGER
+        )
+    """)
+    
+    # Auto-migration for existing databases
+    cursor = conn.cursor()
+    cols = [row[1] for row in cursor.execute("PRAGMA table_info(ipo_predictions)").fetchall()]
+    for col_name, col_type in [("status", "TEXT"), ("gmp", "REAL"), ("ipo_price", "REAL"),
+                               ("ipo_size_cr", "REAL"), ("lot_size", "INTEGER"), ("has_anchor", "INTEGER")]:
+        if col_name not in cols:
+            conn.execute(f"ALTER TABLE ipo_predictions ADD COLUMN {col_name} {col_type}")
+    conn.commit()
+
+    # 👇 Uploads are keyed by IPO name, so keep only the newest row per IPO and enforce it
+    conn.execute("""
+        DELETE FROM ipo_predictions
+        WHERE rowid NOT IN (SELECT MAX(rowid) FROM ipo_predictions GROUP BY ipo_name)
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_ipo_name ON ipo_predictions (ipo_name)")
+
+    # 👇 Indexes backing the /today filters and its (probability, name) keyset pagination
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_prob ON ipo_predictions (predicted_probability DESC, ipo_name)")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_predictions_type_status_prob
+        ON ipo_predictions (ipo_type, status, predicted_probability DESC, ipo_name)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_decision ON ipo_predictions (decision_label)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_gmp_pct ON ipo_predictions (gmp_pct)")
+    conn.commit()
+    # 👇 Append-only history: one row per IPO per pipeline run, clustered by (ipo_name, run_at)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ipo_prediction_history (
+            ipo_name TEXT NOT NULL,
+            run_at INTEGER NOT NULL,
+            gmp REAL,
+            gmp_pct REAL,
+            subscription_x REAL,
+            predicted_probability REAL,
+            final_decision INTEGER,
+            status TEXT,
+            PRIMARY KEY (ipo_name, run_at)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_run_at ON ipo_prediction_history (run_at)")
+    # 👇 Bumped whenever an upload actually changes a table, so responses can be cached per version
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dataset_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS market_meter (
+            score INTEGER,
+            mood_label TEXT,
+            color TEXT,
+            nifty_price REAL,
+            nifty_change_pct REAL,
+            vix_value REAL,
+            updated_at TEXT
+        )
+    """)
+    # 👇 NEW: Manual VIP keys table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS vip_keys (
+            key TEXT PRIMARY KEY,
+            notes TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # 👇 Daily market regime series (Nifty, VIX, Fear & Greed), uploaded by market_meter.py
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS market_regime (
+            date TEXT PRIMARY KEY,
+            nifty_close REAL,
+            nifty_change_pct REAL,
+            vix_close REAL,
+            score INTEGER,
+            mood_label TEXT,
+            color TEXT
+        ) WITHOUT ROWID
+    """)
+    # 👇 Per-subscriber alert rules (see alert_rules.py), e.g. gmp_pct gte 25 on Mainboard
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS alert_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vip_key TEXT NOT NULL REFERENCES vip_keys (key),
+            field TEXT NOT NULL,
+            op TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            ipo_type TEXT NOT NULL DEFAULT '',
+            topic TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alert_rules_vip_key ON alert_rules (vip_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alert_rules_match ON alert_rules (field, op, ipo_type, threshold)")
+    # 👇 The cached RuleIndex only holds rules of live keys: adding or revoking a key (also straight
+    #    in SQLite) bumps the alert_rules version so the index is rebuilt on the next upload
+    for event in ("INSERT", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS vip_keys_{event.lower()}_alert_rules AFTER {event} ON vip_keys
+            BEGIN
+                INSERT INTO dataset_versions (name, version) VALUES ('alert_rules', 1)
+                ON CONFLICT(name) DO UPDATE SET version = version + 1;
+            END
+        """)
+    conn.commit()
+    conn.close()
+
+
+# ======================
+# UPLOAD WRITERS (Delta Upserts, Batched)
+# ======================
+
+# Columns that change on every pipeline run without the prediction itself changing
+VOLATILE_PREDICTION_COLUMNS = {"predicted_at", "scraped_at"}
+
+def _sql_type(value):
+    if isinstance(value, (bool, int)):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    return "TEXT"
+
+def _same_value(old, new):
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return abs(old - new) <= 1e-9
+    return old == new
+
+def ensure_columns(conn, table, rows):
+    """Create the table or add any columns present in the uploaded rows that it doesn't have yet."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    missing = {}
+    for row in rows:
+        for col, value in row.items():
+            if col not in existing and missing.get(col) is None:
+                missing[col] = None if value is None else _sql_type(value)
+    if not existing and missing:
+        col_defs = ", ".join(f'"{col}" {col_type or "TEXT"}' for col, col_type in missing.items())
+        conn.execute(f"CREATE TABLE {table} ({col_defs})")
+        return set(missing)
+    for col, col_type in missing.items():
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN "{col}" {col_type or "TEXT"}')
+    return existing | set(missing)
+
+def _insert_rows(conn, verb, table, rows, suffix=lambda cols: ""):
+    """executemany() the rows, grouped by their column set."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row.keys()), []).append(row)
+    for cols, group in groups.items():
+        col_list = ", ".join(f'"{c}"' for c in cols)
+        placeholders = ", ".join("?" for _ in cols)
+        conn.executemany(
+            f"{verb} INTO {table} ({col_list}) VALUES ({placeholders}) {suffix(cols)}",
+            [[row[c] for c in cols] for row in group],
+        )
+
+class TableWriter:
+    """Applies an upload to `table` batch by batch inside one IMMEDIATE transaction.
+
+    Readers keep seeing the previous data until commit(); a malformed batch
+    rolls the whole upload back.
+    """
+
+    def __init__(self, conn, table):
+        self.conn = conn
+        self.table = table
+        self.stats = {"rows": 0}
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+
+    def write(self, batch):
+        self._write(batch)
+        self.stats["rows"] += len(batch)
+
+    def commit(self):
+        self._finish()
+        if self._changed():
+            bump_version(self.conn, self.table)
+        self.conn.execute("COMMIT")
+        return self.stats
+
+    def rollback(self):
+        if self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+
+    def _write(self, batch):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+    def _changed(self):
+        return self.stats["rows"] > 0
+
+class ReplaceWriter(TableWriter):
+    """Replaces the table contents with the upload, keeping its schema. Empty uploads leave it untouched."""
+
+    def _write(self, batch):
+        ensure_columns(self.conn, self.table, batch)
+        if self.stats["rows"] == 0:
+            self.conn.execute(f"DELETE FROM {self.table}")
+        _insert_rows(self.conn, "INSERT", self.table, batch)
+
+class SnapshotWriter(TableWriter):
+    """Makes `table` match the upload by writing only what changed.
+
+    Rows are matched on `key`: new keys are inserted, rows whose non-volatile
+    values differ are updated and keys missing from the upload are deleted.
+    Only the keys seen so far are kept (in a temp table), so memory stays flat.
+    `on_batch(conn, batch)` runs inside the same transaction, as does
+    `on_changes(conn, pairs)` with an (old row or None, new row) pair per inserted/updated row.
+    """
+
+    def __init__(self, conn, table, key, volatile=(), on_batch=None, on_changes=None):
+        super().__init__(conn, table)
+        self.key = key
+        self.volatile = set(volatile)
+        self.on_batch = on_batch
+        self.on_changes = on_changes
+        self.stats.update({"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0})
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen_keys (k PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.seen_keys")
+
+    def _write(self, batch):
+        key = self.key
+        for row in batch:
+            if not row.get(key):
+                raise ValueError(f"Every row needs a non-empty '{key}'")
+        ensure_columns(self.conn, self.table, batch)
+
+        keys = [row[key] for row in batch]
+        cur = self.conn.execute(
+            f'SELECT * FROM {self.table} WHERE "{key}" IN ({", ".join("?" for _ in keys)})', keys
+        )
+        names = [d[0] for d in cur.description]
+        current = {r[names.index(key)]: dict(zip(names, r)) for r in cur.fetchall()}
+
+        changed, pairs = [], []
+        for row in batch:
+            old = current.get(row[key])
+            if old is not None and all(
+                col in self.volatile or _same_value(old.get(col), value) for col, value in row.items()
+            ):
+                self.stats["unchanged"] += 1
+                continue
+            changed.append(row)
+            pairs.append((old, row))
+            self.stats["inserted" if old is None else "updated"] += 1
+
+        _insert_rows(
+            self.conn, "INSERT", self.table, changed,
+            suffix=lambda cols: f'ON CONFLICT("{key}") DO UPDATE SET '
+                                + ", ".join(f'"{c}" = excluded."{c}"' for c in cols if c != key),
+        )
+        self.conn.executemany("INSERT OR IGNORE INTO temp.seen_keys (k) VALUES (?)", [(k,) for k in keys])
+        if self.on_batch:
+            self.on_batch(self.conn, batch)
+        if self.on_changes and pairs:
+            self.on_changes(self.conn, pairs)
+
+    def _finish(self):
+        # Whatever wasn't part of this upload is no longer part of the snapshot
+        cur = self.conn.execute(
+            f'DELETE FROM {self.table} WHERE "{self.key}" NOT IN (SELECT k FROM temp.seen_keys)'
+        )
+        self.stats["deleted"] = cur.rowcount
+
+    def _changed(self):
+        return self.stats["inserted"] + self.stats["updated"] + self.stats["deleted"] > 0
+
+class UpsertWriter(SnapshotWriter):
+    """SnapshotWriter that never deletes: rows missing from the upload are kept (for date-keyed series)."""
+
+    def _finish(self):
+        pass
+
+class HistoryWriter(TableWriter):
+    """Appends prediction-shaped rows to ipo_prediction_history (used for backfills)."""
+
+    def __init__(self, conn):
+        super().__init__(conn, "ipo_prediction_history")
+
+    def _write(self, batch):
+        for row in batch:
+            if not row.get("ipo_name"):
+                raise ValueError("Every row needs a non-empty 'ipo_name'")
+        append_history(self.conn, batch)
+
+def bump_version(conn, name):
+    conn.execute("""
+        INSERT INTO dataset_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+    """, (name,))
+
+def get_version(conn, name):
+    row = conn.execute("SELECT version FROM dataset_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+# ======================
+# PREDICTION HISTORY
+# ======================
+
+HISTORY_COLUMNS = ["gmp", "gmp_pct", "subscription_x", "predicted_probability", "final_decision", "status"]
+
+def _to_epoch(value, default=None):
+    """ISO timestamp (or epoch number) -> integer epoch seconds."""
+    if value in (None, ""):
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(str(value)).timestamp())
+
+def append_history(conn, rows):
+    """Append one history row per IPO for this pipeline run (re-uploads of the same run are ignored)."""
+    fallback = int(time.time())
+    conn.executemany(
+        f"""INSERT OR IGNORE INTO ipo_prediction_history (ipo_name, run_at, {", ".join(HISTORY_COLUMNS)})
+            VALUES (?, ?, {", ".join("?" for _ in HISTORY_COLUMNS)})""",
+        [
+            (row["ipo_name"], _to_epoch(row.get("predicted_at"), fallback), *[row.get(c) for c in HISTORY_COLUMNS])
+            for row in rows
+        ],
+    )
+
+# ======================
+# CONNECTIONS & EXECUTORS
+# ======================
+
+READ_WORKERS = int(os.getenv("DB_READ_WORKERS", "16"))
+
+_read_pool = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="db-read")
+_write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+_local = threading.local()
+_write_lock = None
+
+def _connection():
+    """One long-lived connection per executor thread."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        _local.conn = conn
+    return conn
+
+def _run(fn, args):
+    return fn(_connection(), *args)
+
+def _submit(pool, fn, args):
+    return asyncio.get_running_loop().run_in_executor(pool, _run, fn, args)
+
+def _writer_lock():
+    global _write_lock
+    if _write_lock is None:
+        _write_lock = asyncio.Lock()
+    return _write_lock
+
+async def read(fn, *args):
+    """Run fn(conn, *args) on the read pool."""
+    return await _submit(_read_pool, fn, args)
+
+async def write(fn, *args):
+    """Run fn(conn, *args) on the writer thread as one unit of work."""
+    async with _writer_lock():
+        return await _submit(_write_pool, fn, args)
+
+@asynccontextmanager
+async def write_session():
+    """Exclusive use of the writer connection across several calls (e.g. one streamed upload).
+
+    Yields run(fn, *args), which behaves like write() without re-taking the lock.
+    """
+    async with _writer_lock():
+        yield lambda fn, *args: _submit(_write_pool, fn, args)
+
+# ======================
+# ROW MAPPING
+# ======================
+
+def _dict_factory(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+def fetch_rows(conn, query, params=()):
+    """Run a SELECT and return its rows as plain dicts (ready for JSON)."""
+    cur = conn.cursor()
+    cur.row_factory = _dict_factory
+    return cur.execute(query, params).fetchall()
+
+def blank_nulls(rows):
+    """Replace NULLs with "" for the dashboard, which expects strings over nulls."""
+    for row in rows:
+        for col, value in row.items():
+            if value is None:
+                row[col] = ""
+    return rows
+
+# Helper to verify key status
+def check_vip_key(conn, key):
+    if not key:
+        return False
+    row = conn.execute("SELECT 1 FROM vip_keys WHERE key = ?", (key.strip(),)).fetchone()
+    return row is not None
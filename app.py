@@ -1,115 +1,279 @@
-from fastapi import FastAPI, Request, BackgroundTasks
+from fastapi import BackgroundTasks, FastAPI, Request, Query, Response
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-import sqlite3
-import subprocess
-import pandas as pd
+import asyncio
 import os
 import json
+import base64
+import hashlib
+import hmac
+import orjson
 
-app = FastAPI()
+import alert_rules
+import api_db as db
+from api_db import (
+    DB_PATH, HISTORY_COLUMNS, VOLATILE_PREDICTION_COLUMNS,
+    HistoryWriter, ReplaceWriter, SnapshotWriter, UpsertWriter, _to_epoch, append_history, blank_nulls, check_vip_key, fetch_rows,
+    get_version,
+)
+from pipeline_jobs import PipelineJobs
+from upload_codec import UploadError, iter_upload_batches, supported_formats
+
+class FastJSONResponse(Response):
+    """JSON encoded with orjson, which is several times faster than the stdlib encoder."""
+    media_type = "application/json"
+
+    def render(self, content):
+        return orjson.dumps(content)
+
+app = FastAPI(default_response_class=FastJSONResponse)
 templates = Jinja2Templates(directory="templates")
 
-# KEEP THIS: The API still needs a place to save what it receives
-# Ensure your API service has a volume mounted at /app/data
-DB_PATH = "data/ipo_ml_withsme.db" 
+db.init_db()
 
-# Create the table if it doesn't exist (First run setup)
-def init_db():
-    if not os.path.exists(os.path.dirname(DB_PATH)):
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    
-    conn = sqlite3.connect(DB_PATH)
-    # Basic table structure if empty
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS ipo_predictions (
-            ipo_name TEXT,
-            predicted_probability REAL,
-            gmp_pct REAL,
-            final_decision INTEGER,
-            decision_label TEXT,
-            predicted_at TEXT,
-            listing_date TEXT,
-            subscription_x REAL,
-            open_date TEXT,
-            close_date TEXT,
-            ipo_type TEXT,
-            status TEXT
-        )
-    """)
-    
-    # Auto-migration for existing databases
-    cursor = conn.cursor()
-    cols = [row[1] for row in cursor.execute("PRAGMA table_info(ipo_predictions)").fetchall()]
-    if "status" not in cols:
-        conn.execute("ALTER TABLE ipo_predictions ADD COLUMN status TEXT")
-        conn.commit()
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS market_meter (
-            score INTEGER,
-            mood_label TEXT,
-            color TEXT,
-            nifty_price REAL,
-            nifty_change_pct REAL,
-            vix_value REAL,
-            updated_at TEXT
-        )
-    """)
-    # 👇 NEW: Manual VIP keys table
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS vip_keys (
-            key TEXT PRIMARY KEY,
-            notes TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.close()
-
-init_db()
-
-# Helper to verify key status
-def check_vip_key(key: str) -> bool:
-    if not key:
-        return False
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM vip_keys WHERE key = ?", (key.strip(),))
-    row = cursor.fetchone()
-    conn.close()
-    return row is not None
+# 👇 Uploads are written batch by batch as they decode (bounded memory), so the write lock is
+#    held while the body streams in. A client gets this long per batch, and this long in all,
+#    before it is cut off and rolled back, so a slow uploader can't keep every other writer waiting
+UPLOAD_BATCH_TIMEOUT = float(os.getenv("UPLOAD_BATCH_TIMEOUT", "10"))
+UPLOAD_LOCK_DEADLINE = float(os.getenv("UPLOAD_LOCK_DEADLINE", "60"))
+
+def _rollback_open(conn):
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
+
+async def _next_batch(batches, deadline):
+    """Next decoded batch (None at the end), or UploadError when the client is too slow to send it."""
+    timeout = min(UPLOAD_BATCH_TIMEOUT, deadline - asyncio.get_running_loop().time())
+    try:
+        return await asyncio.wait_for(batches.__anext__(), max(timeout, 0))
+    except StopAsyncIteration:
+        return None
+    except asyncio.TimeoutError:
+        raise UploadError(f"upload too slow: cut off after {UPLOAD_BATCH_TIMEOUT:g}s per batch / {UPLOAD_LOCK_DEADLINE:g}s in all")
+
+async def ingest_upload(request, make_writer):
+    """Stream the request body through a TableWriter on the writer thread and commit it."""
+    batches = iter_upload_batches(request).__aiter__()
+    try:
+        # The first batch is read before the lock is taken: a client that connects and stalls never holds it
+        batch = await _next_batch(batches, asyncio.get_running_loop().time() + UPLOAD_LOCK_DEADLINE)
+
+        async with db.write_session() as run:
+            deadline = asyncio.get_running_loop().time() + UPLOAD_LOCK_DEADLINE
+            committed = False
+            try:
+                writer = await run(make_writer)
+                while batch is not None:
+                    await run(lambda conn, batch=batch: writer.write(batch))
+                    batch = await _next_batch(batches, deadline)
+                stats = await run(lambda conn: writer.commit())
+                committed = True
+                return stats
+            finally:
+                # Also on CancelledError (client gone): the ROLLBACK is queued on the writer
+                # thread behind any in-flight batch, so the transaction never stays open
+                if not committed:
+                    await run(_rollback_open)
+    finally:
+        await batches.aclose()
+
+def upload_failed(e):
+    """Error reply for an upload: the usual error dict, with the HTTP status the error carries (413 when too large)."""
+    body = {"status": "error", "message": str(e)}
+    status_code = getattr(e, "status_code", None)
+    return FastJSONResponse(body, status_code=status_code) if status_code else body
 
 @app.get("/", response_class=HTMLResponse)
 def home(request: Request):
     upi_id = os.getenv("UPI_ID", "yourname@upi")
     return templates.TemplateResponse("index.html", {"request": request, "upi_id": upi_id})
 
+IPO_TYPES = {"sme": "SME", "mainboard": "Mainboard"}
+
+# 👇 The cursor carries the last row's sort key (probability, name), so paging keeps going even
+#    when an upload replaces or deletes that row. The probability is paywalled, so the key is
+#    encrypted (HMAC-SHA256 keystream) and authenticated (HMAC tag): free callers can neither
+#    read it nor forge one. Without CURSOR_SECRET the key lives as long as the process.
+CURSOR_SECRET = (os.getenv("CURSOR_SECRET") or "").encode("utf-8") or os.urandom(32)
+
+class CursorError(ValueError):
+    pass
+
+def _keystream(nonce, length):
+    blocks = (hmac.new(CURSOR_SECRET, b"enc" + nonce + i.to_bytes(4, "big"), hashlib.sha256).digest()
+              for i in range((length + 31) // 32))
+    return b"".join(blocks)[:length]
+
+def _encode_cursor(row):
+    raw = json.dumps([row["predicted_probability"], row["ipo_name"]]).encode("utf-8")
+    nonce = os.urandom(12)
+    sealed = bytes(a ^ b for a, b in zip(raw, _keystream(nonce, len(raw))))
+    tag = hmac.new(CURSOR_SECRET, b"mac" + nonce + sealed, hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(nonce + sealed + tag).decode("ascii")
+
+def _decode_cursor(cursor):
+    """(probability or None, ipo_name) from a cursor made by _encode_cursor."""
+    try:
+        blob = base64.urlsafe_b64decode(cursor.encode("ascii"))
+    except (ValueError, UnicodeEncodeError):
+        raise CursorError("Invalid cursor")
+    nonce, sealed, tag = blob[:12], blob[12:-16], blob[-16:]
+    expected = hmac.new(CURSOR_SECRET, b"mac" + nonce + sealed, hashlib.sha256).digest()[:16]
+    if len(blob) <= 28 or not hmac.compare_digest(tag, expected):
+        raise CursorError("Invalid or expired cursor (start again without one)")
+    prob, name = json.loads(bytes(a ^ b for a, b in zip(sealed, _keystream(nonce, len(sealed)))))
+    return (None if prob is None else float(prob)), str(name)
+
+def _today_query(ipo_type, status, decision, min_gmp_pct, cursor, limit):
+    """Build the filtered, keyset-paginated /today query (sorted by probability, then name)."""
+    where, params = [], []
+    if ipo_type:
+        canonical = IPO_TYPES.get(ipo_type.strip().lower(), ipo_type)
+        # The dashboard treats a missing type as Mainboard
+        where.append("(ipo_type = ? OR ipo_type IS NULL)" if canonical == "Mainboard" else "ipo_type = ?")
+        params.append(canonical)
+    if status:
+        # ...and a missing status as active
+        status = status.strip().lower()
+        where.append("(status = ? OR status IS NULL)" if status == "active" else "status = ?")
+        params.append(status)
+    if decision:
+        where.append("decision_label = ?")
+        params.append(decision.strip().upper())
+    if min_gmp_pct is not None:
+        where.append("gmp_pct >= ?")
+        params.append(min_gmp_pct)
+    if cursor:
+        last_prob, name = _decode_cursor(cursor)
+        # NULL probabilities sort last under DESC, so they always come after a real one
+        if last_prob is None:
+            where.append("(predicted_probability IS NULL AND ipo_name > ?)")
+            params.append(name)
+        else:
+            where.append("(predicted_probability < ? OR (predicted_probability = ? AND ipo_name > ?) OR predicted_probability IS NULL)")
+            params.extend([last_prob, last_prob, name])
+
+    query = "SELECT * FROM ipo_predictions"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY predicted_probability DESC, ipo_name ASC"
+    if limit:
+        # One extra row tells us whether there is a next page
+        query += " LIMIT ?"
+        params.append(limit + 1)
+    return query, params
+
+def _redact_today(rows):
+    # 👇 Freemium paywall: key ML signal columns are hidden unless the caller has a VIP key
+    for row in rows:
+        row["decision_label"] = "LOCKED"
+        row["predicted_probability"] = 0.0
+        row["final_decision"] = 0
+    return rows
+
+# 👇 Unfiltered /today is what the dashboard (and nearly all free traffic) asks for, so the
+#    full and redacted bodies are serialised once per dataset version and served as-is
+_today_cache = {"version": None, "full": b"[]", "redacted": b"[]"}
+
+def _today_state(conn, key):
+    return get_version(conn, "ipo_predictions"), check_vip_key(conn, key)
+
+def _build_today_variants(conn):
+    conn.execute("BEGIN")  # read the version and the rows from the same snapshot
+    try:
+        version = get_version(conn, "ipo_predictions")
+        rows = fetch_rows(conn, "SELECT * FROM ipo_predictions ORDER BY predicted_probability DESC, ipo_name ASC")
+    finally:
+        conn.execute("COMMIT")
+    full = orjson.dumps(blank_nulls(rows))
+    return version, full, orjson.dumps(_redact_today(rows))
+
 @app.get("/today")
-def today_predictions(key: str = None):
+async def today_predictions(
+    response: Response,
+    key: str = None,
+    ipo_type: str = None,
+    status: str = None,
+    decision: str = None,
+    min_gmp_pct: float = None,
+    limit: int = Query(None, ge=1, le=500),
+    cursor: str = None,
+):
     if not os.path.exists(DB_PATH):
         return {"error": "Database not initialized yet"}
     
-    is_vip = check_vip_key(key)
-    conn = sqlite3.connect(DB_PATH)
     try:
-        # Get the latest predictions
-        df = pd.read_sql("SELECT * FROM ipo_predictions ORDER BY predicted_probability DESC", conn)
-        df = df.fillna("") # 👇 Clean NaN/None values for safe JSON serialization
-        
-        # 👇 NEW: If not a valid VIP, redact key ML signal columns for Freemium paywall
-        if not is_vip and not df.empty:
-            df["decision_label"] = "LOCKED"
-            df["predicted_probability"] = 0.0
-            df["final_decision"] = 0
-            
-        return df.to_dict(orient="records")
+        version, is_vip = await db.read(_today_state, key)
+
+        if not any([ipo_type, status, decision, min_gmp_pct is not None, limit, cursor]):
+            if _today_cache["version"] != version:
+                _today_cache.update(zip(("version", "full", "redacted"), await db.read(_build_today_variants)))
+            return Response(_today_cache["full" if is_vip else "redacted"], media_type="application/json")
+
+        # Get the latest predictions (the decision filter is a VIP signal, so free users can't use it)
+        query, params = _today_query(ipo_type, status, decision if is_vip else None, min_gmp_pct, cursor, limit)
+        rows = await db.read(fetch_rows, query, params)
+
+        # 👇 Keyset pagination: hand back an opaque cursor for the next page in a header
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+
+        blank_nulls(rows) # 👇 Clean None values the same way the dashboard always got them
+        return rows if is_vip else _redact_today(rows)
+    except Exception as e:
+        return {"error": str(e)}
+
+def _redact_history(rows, is_vip):
+    if not is_vip:
+        for row in rows:
+            row["predicted_probability"] = 0.0
+            row["final_decision"] = 0
+    return rows
+
+# 👇 Time series of one IPO through its bidding window (probability is VIP-only, like /today)
+@app.get("/ipo_history")
+async def ipo_history(ipo_name: str, since: str = None, until: str = None, key: str = None):
+    if not os.path.exists(DB_PATH):
+        return {"error": "Database not initialized yet"}
+
+    is_vip = await db.read(check_vip_key, key)
+    try:
+        rows = await db.read(
+            fetch_rows,
+            f"""SELECT ipo_name, datetime(run_at, 'unixepoch') AS run_at, {", ".join(HISTORY_COLUMNS)}
+                FROM ipo_prediction_history
+                WHERE ipo_name = ? AND run_at >= ? AND run_at <= ?
+                ORDER BY run_at""",
+            (ipo_name, _to_epoch(since, 0), _to_epoch(until, 2**62)),
+        )
+        return _redact_history(blank_nulls(rows), is_vip)
+    except Exception as e:
+        return {"error": str(e)}
+
+# 👇 Time travel: the predictions exactly as they were uploaded by the last run at or before `as_of`
+@app.get("/history_snapshot")
+async def history_snapshot(as_of: str, key: str = None):
+    if not os.path.exists(DB_PATH):
+        return {"error": "Database not initialized yet"}
+
+    is_vip = await db.read(check_vip_key, key)
+    try:
+        rows = await db.read(
+            fetch_rows,
+            f"""SELECT ipo_name, datetime(run_at, 'unixepoch') AS run_at, {", ".join(HISTORY_COLUMNS)}
+                FROM ipo_prediction_history
+                WHERE run_at = (SELECT MAX(run_at) FROM ipo_prediction_history WHERE run_at <= ?)
+                ORDER BY predicted_probability DESC""",
+            (_to_epoch(as_of),),
+        )
+        return _redact_history(blank_nulls(rows), is_vip)
     except Exception as e:
         return {"error": str(e)}
-    finally:
-        conn.close()
 
 # 👇 NEW: Secure admin route to dynamically add GPay-purchased access keys
 @app.get("/add-vip-key")
-def add_vip_key(admin_pass: str, key: str, notes: str = ""):
+async def add_vip_key(admin_pass: str, key: str, notes: str = ""):
     required_pass = os.getenv("ADMIN_PASS", "GPayAdminPass123")
     if admin_pass != required_pass:
         return {"status": "error", "message": "Unauthorized: Incorrect admin_pass"}
@@ -117,118 +281,196 @@ def add_vip_key(admin_pass: str, key: str, notes: str = ""):
     if not key or len(key.strip()) < 3:
         return {"status": "error", "message": "Invalid key format"}
         
-    conn = sqlite3.connect(DB_PATH)
+    def _insert(conn):
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO vip_keys (key, notes) VALUES (?, ?)", (key.strip(), notes.strip()))
+
     try:
-        conn.execute("INSERT OR REPLACE INTO vip_keys (key, notes) VALUES (?, ?)", (key.strip(), notes.strip()))
-        conn.commit()
+        await db.write(_insert)
         return {"status": "success", "message": f"Access Key '{key}' successfully activated!"}
     except Exception as e:
         return {"status": "error", "message": f"Database error: {e}"}
-    finally:
-        conn.close()
+
+# 👇 Revoking a key also takes its alert rules out of matching (they come back if the key is re-added)
+@app.get("/revoke-vip-key")
+async def revoke_vip_key(admin_pass: str, key: str):
+    required_pass = os.getenv("ADMIN_PASS", "GPayAdminPass123")
+    if admin_pass != required_pass:
+        return {"status": "error", "message": "Unauthorized: Incorrect admin_pass"}
+
+    def _delete(conn):
+        with conn:
+            return conn.execute("DELETE FROM vip_keys WHERE key = ?", (key.strip(),)).rowcount
+
+    try:
+        if await db.write(_delete):
+            return {"status": "success", "message": f"Access Key '{key}' revoked"}
+        return {"status": "error", "message": f"Access Key '{key}' not found"}
+    except Exception as e:
+        return {"status": "error", "message": f"Database error: {e}"}
+
+# 👇 VIP subscribers manage their own alert rules (sent to their own ntfy topic)
+@app.get("/alert-rules")
+async def get_alert_rules(key: str):
+    if not await db.read(check_vip_key, key):
+        return {"status": "error", "message": "Unauthorized: Invalid access key"}
+    try:
+        return await db.read(alert_rules.list_rules, key.strip())
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.post("/alert-rules")
+async def add_alert_rule(key: str, field: str, op: str, threshold: float, ipo_type: str = "", topic: str = ""):
+    if not await db.read(check_vip_key, key):
+        return {"status": "error", "message": "Unauthorized: Invalid access key"}
+    error = alert_rules.validate_rule(field, op, threshold, ipo_type) or await db.read(alert_rules.validate_topic, key.strip(), topic.strip())
+    if error:
+        return {"status": "error", "message": error}
+    try:
+        rule_id = await db.write(alert_rules.add_rule, key.strip(), field, op, threshold, ipo_type, topic.strip())
+        return {"status": "success", "id": rule_id, "topic": topic.strip() or alert_rules.default_topic(key.strip())}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.delete("/alert-rules/{rule_id}")
+async def delete_alert_rule(rule_id: int, key: str):
+    if not await db.read(check_vip_key, key):
+        return {"status": "error", "message": "Unauthorized: Invalid access key"}
+    try:
+        if await db.write(alert_rules.delete_rule, key.strip(), rule_id):
+            return {"status": "success", "message": f"Rule {rule_id} deleted"}
+        return {"status": "error", "message": f"Rule {rule_id} not found"}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
 @app.get("/scorecard_data")
-def scorecard_data():
+async def scorecard_data():
     if not os.path.exists(DB_PATH):
         return {"error": "Database not initialized yet"}
     
-    conn = sqlite3.connect(DB_PATH)
     try:
         # Get the latest scorecard
-        df = pd.read_sql("SELECT * FROM ipo_scorecard", conn)
-        return df.to_dict(orient="records")
+        return await db.read(fetch_rows, "SELECT * FROM ipo_scorecard")
     except Exception as e:
         return {"error": str(e)}
-    finally:
-        conn.close()
 
 @app.get("/market_meter_data")
-def market_meter_data():
+async def market_meter_data():
     if not os.path.exists(DB_PATH):
         return {"error": "Database not initialized yet"}
     
-    conn = sqlite3.connect(DB_PATH)
     try:
-        df = pd.read_sql("SELECT * FROM market_meter", conn)
-        return df.to_dict(orient="records")
+        return await db.read(fetch_rows, "SELECT * FROM market_meter")
+    except Exception as e:
+        return {"error": str(e)}
+
+# 👇 Daily Fear & Greed history for charting (oldest first)
+@app.get("/market_regime_data")
+async def market_regime_data(days: int = Query(365, ge=1, le=10000)):
+    if not os.path.exists(DB_PATH):
+        return {"error": "Database not initialized yet"}
+
+    try:
+        rows = await db.read(fetch_rows, "SELECT * FROM market_regime ORDER BY date DESC LIMIT ?", (days,))
+        return rows[::-1]
     except Exception as e:
         return {"error": str(e)}
-    finally:
-        conn.close()
 
 # 🚀 NEW ENDPOINT: The Scraper sends data here!
 @app.post("/upload_predictions")
-async def upload_predictions(request: Request):
+async def upload_predictions(request: Request, background_tasks: BackgroundTasks):
     try:
-        data = await request.json() # Receive JSON data
-        
-        # Convert JSON back to DataFrame
-        df = pd.DataFrame(data)
-        
-        # Save to the API's local database
-        conn = sqlite3.connect(DB_PATH)
-        
-        if df.empty:
-            # Clear the predictions table so dashboard shows "No predictions" properly
-            cur = conn.cursor()
-            cur.execute("DELETE FROM ipo_predictions")
-            conn.commit()
-            conn.close()
-            return {"status": "success", "message": "Dashboard cleared (no active IPOs)"}
-
-        df.to_sql("ipo_predictions", conn, if_exists="replace", index=False)
-        conn.close()
-        
-        return {"status": "success", "rows_updated": len(df)}
+        # Save to the API's local database, touching only the rows that changed;
+        # those same rows are matched against the subscribers' alert rules on the way in
+        fired = []
+        stats = await ingest_upload(request, lambda conn: SnapshotWriter(
+            conn, "ipo_predictions", "ipo_name", VOLATILE_PREDICTION_COLUMNS, on_batch=append_history,
+            on_changes=lambda conn, pairs: fired.extend(alert_rules.get_index(conn).match(pairs)),
+        ))
+        if fired:
+            # Sent after the response, so a slow ntfy never holds up the pipeline's upload
+            background_tasks.add_task(alert_rules.deliver, fired)
+
+        if stats["rows"] == 0:
+            # Empty upload clears the table so dashboard shows "No predictions" properly
+            return {"status": "success", "message": "Dashboard cleared (no active IPOs)", **stats}
+
+        return {"status": "success", "rows_updated": stats["inserted"] + stats["updated"], **stats}
     
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return upload_failed(e)
 
 @app.post("/upload_scorecard")
 async def upload_scorecard(request: Request):
     try:
-        data = await request.json()
-        df = pd.DataFrame(data)
-        
-        if df.empty:
+        stats = await ingest_upload(request, lambda conn: ReplaceWriter(conn, "ipo_scorecard"))
+
+        if stats["rows"] == 0:
             return {"message": "No data received"}
 
-        conn = sqlite3.connect(DB_PATH)
-        df.to_sql("ipo_scorecard", conn, if_exists="replace", index=False)
-        conn.close()
-        
-        return {"status": "success", "rows_updated": len(df)}
+        return {"status": "success", "rows_updated": stats["rows"]}
     
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return upload_failed(e)
 
 @app.post("/upload_market_meter")
 async def upload_market_meter(request: Request):
     try:
-        data = await request.json()
-        df = pd.DataFrame(data)
-        
-        if df.empty:
+        stats = await ingest_upload(request, lambda conn: ReplaceWriter(conn, "market_meter"))
+
+        if stats["rows"] == 0:
             return {"message": "No data received"}
 
-        conn = sqlite3.connect(DB_PATH)
-        df.to_sql("market_meter", conn, if_exists="replace", index=False)
-        conn.close()
-        
-        return {"status": "success", "rows_updated": len(df)}
+        return {"status": "success", "rows_updated": stats["rows"]}
     
     except Exception as e:
-        return {"status": "error", "message": str(e)}
+        return upload_failed(e)
+
+# 👇 Regime rows are upserted by date, so a few recent days (or a whole backfill) can be sent at once
+@app.post("/upload_market_regime")
+async def upload_market_regime(request: Request):
+    try:
+        stats = await ingest_upload(request, lambda conn: UpsertWriter(conn, "market_regime", "date"))
+        return {"status": "success", **stats}
+
+    except Exception as e:
+        return upload_failed(e)
+
+# 👇 Lets the pipeline see which body formats / encodings this deployment can decode
+@app.get("/upload_formats")
+def upload_formats():
+    return supported_formats()
+
+# 👇 Bulk backfill of ipo_prediction_history (send NDJSON, optionally gzip'd, for large uploads)
+@app.post("/upload_history")
+async def upload_history(request: Request):
+    try:
+        stats = await ingest_upload(request, HistoryWriter)
+        return {"status": "success", "rows_received": stats["rows"]}
+
+    except Exception as e:
+        return upload_failed(e)
+
+# 👇 One pipeline run at a time: repeated clicks join the in-flight run instead of launching new scrapes
+pipeline_jobs = PipelineJobs()
 
 @app.post("/refresh-pipeline")
-async def refresh_pipeline(background_tasks: BackgroundTasks):
-    def run_p():
-        try:
-            print("⏳ Manual Refresh Triggered via API...")
-            subprocess.run(["python", "run_pipeline.py"], check=True)
-            print("✅ Manual Refresh Complete.")
-        except Exception as e:
-            print(f"❌ Manual Refresh Failed: {e}")
-
-    background_tasks.add_task(run_p)
-    return {"status": "success", "message": "Pipeline started in background"}
+async def refresh_pipeline():
+    outcome, job = pipeline_jobs.request_run(trigger="api")
+    if outcome == "started":
+        print("⏳ Manual Refresh Triggered via API...")
+        return {"status": "success", "message": "Pipeline started in background", "job": job}
+    if outcome == "joined":
+        return {"status": "success", "message": "Pipeline already running, joined the current run", "job": job}
+    return {
+        "status": "error",
+        "message": f"Pipeline ran recently, try again in {job['retry_after']}s",
+        "retry_after": job["retry_after"],
+        "job": job,
+    }
+
+# 👇 Progress is public; the log tail names the IPOs alerts went out for, so it needs the admin pass or a VIP key
+@app.get("/pipeline-status")
+async def pipeline_status(key: str = None, admin_pass: str = None):
+    can_see_log = admin_pass == os.getenv("ADMIN_PASS", "GPayAdminPass123") or await db.read(check_vip_key, key)
+    return pipeline_jobs.status(include_log=can_see_log)
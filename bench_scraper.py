@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from ipo_parsing import extract_table_rows, parse_table_rows
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# ======================
+# OFFLINE SCRAPER BENCHMARK
+# ======================
+# Replays saved HTML snapshots through the same parse path scrape_daily_ipos() uses
+# (row payload -> ipo_parsing.parse_table_rows), without Chrome or network:
+#
+#   python bench_scraper.py                        # page_source.html + 10k synthetic rows
+#   python bench_scraper.py --rows 50000 --repeat 5
+#   python bench_scraper.py --update-golden        # after an intended parsing change
+#
+# Exits non-zero when any parsed field differs from the golden output, so it can gate CI.
+
+DEFAULT_SNAPSHOTS = ["page_source.html"]
+GOLDEN_SUFFIX = ".golden.json"
+SYNTHETIC_ROWS = 10000
+SEED = 42
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# Markup of one live-table row, trimmed from page_source.html
+ROW_TEMPLATE = (
+    '<tr><td data-label="Name"><div class="report-td"><div class="mono-num">'
+    '<a href="{href}" target="_parent" title="{name}">{name}</a> '
+    '<span class="badge rounded-pill bg-secondary d-inline ms-2">{board}</span>{status}</div></div></td>'
+    '<td data-label="GMP"><div class="report-td"><div class="mono-num">₹<b>{gmp}</b> ({gmp_pct}%)<br/>'
+    '<small><b>0 ↓ / 0 ↑</b></small></div></div></td>'
+    '<td data-label="Rating"><div class="report-td"><div class="mono-num"><span>🔥</span></div></div></td>'
+    '<td data-label="Sub"><div class="report-td"><div class="mono-num">{sub}</div></div></td>'
+    '<td data-label="Price (₹)"><div class="report-td"><div class="mono-num">{price}</div></div></td>'
+    '<td data-label="IPO Size (₹ in cr)"><div class="report-td"><div class="mono-num">{size}</div></div></td>'
+    '<td data-label="Lot"><div class="report-td"><div class="mono-num">{lot}</div></div></td>'
+    '<td data-label="Open"><div class="report-td"><div class="mono-num">{open}<br/><small><b>GMP: 0</b></small></div></div></td>'
+    '<td data-label="Close"><div class="report-td"><div class="mono-num">{close}</div></div></td>'
+    '<td data-label="BoA Dt"><div class="report-td"><div class="mono-num">{close}</div></div></td>'
+    '<td data-label="Listing"><div class="report-td"><div class="mono-num">{listing}</div></div></td>'
+    '<td data-label="Updated-On"><div class="report-td"><div class="mono-num"><small><b>27-Apr 5:55</b></small></div></div></td>'
+    '<td data-label="Anchor"><div class="report-td"><div class="mono-num"><span>{anchor}</span></div></div></td></tr>'
+)
+
+
+def _fmt_thousands(value):
+    return f"{value:,}"
+
+
+def synthetic_table(n_rows, seed=SEED):
+    """(html, expected) for an n-row live table with known field values."""
+    rng = random.Random(seed)
+    rows, expected = [], []
+    for i in range(n_rows):
+        is_sme = rng.random() < 0.6
+        price = rng.randint(10, 2000)
+        lot = rng.choice([1, 2, 4, 6]) * 400 if is_sme else rng.randint(5, 300)
+        gmp = round(rng.uniform(-50, 150) * 4) / 4 if rng.random() < 0.8 else None
+        listing_price = round(price * rng.uniform(0.7, 1.6), 2) if rng.random() < 0.5 else None
+        size = round(rng.uniform(5, 5000), 2)
+        sub = round(rng.uniform(0, 300), 2)
+        month = rng.choice(MONTHS)
+        day = rng.randint(1, 25)
+        name = f"Synthetic Industries {i}"
+
+        rows.append(ROW_TEMPLATE.format(
+            href=f"/gmp/synthetic-industries-{i}-ipo/{i}/",
+            name=name,
+            board="NSE SME" if is_sme else "IPO",
+            status=(f'<span class="text-success d-inline ms-2"><small><b>L@{listing_price:.2f} (1%)</b></small></span>'
+                    if listing_price else '<span class="badge rounded-pill bg-warning d-inline ms-2">O</span>'),
+            gmp="--" if gmp is None else f"{gmp:g}",
+            gmp_pct="0.00" if gmp is None else f"{gmp / price * 100:.2f}",
+            sub=f"{sub}x",
+            price=_fmt_thousands(price),
+            size=f"{size:,.2f}",
+            lot=_fmt_thousands(lot),
+            open=f"{day}-{month}",
+            close=f"{day + 2}-{month}",
+            listing=f"{day + 5}-{month}",
+            anchor="✅" if i % 3 else "❌",
+        ))
+        # The parser types IPOs by name/href and the financial rules, not by the board badge
+        rule_sme = lot * price >= 80000 or lot >= 500
+        expected.append({
+            "ipo_name": name,
+            "gmp": 0.0 if gmp is None else float(gmp),
+            "subscription_x": sub,
+            "ipo_price": float(price),
+            "ipo_size_cr": size,
+            "lot_size": lot,
+            "listing_date": f"{day + 5}-{month}",
+            "has_anchor": 1 if i % 3 else 0,
+            "listing_price": listing_price,
+            "is_listed": 1 if listing_price else 0,
+            "open_date": f"{day}-{month}",
+            "close_date": f"{day + 2}-{month}",
+            "ipo_type": "SME" if rule_sme else "Mainboard",
+        })
+
+    html = '<table id="reportTable"><tr><th>Name</th><th>GMP</th></tr>' + "".join(rows) + "</table>"
+    return html, expected
+
+
+def diff_rows(expected, actual, label):
+    """Field-level differences between two lists of parsed IPO dicts."""
+    diffs = []
+    if len(expected) != len(actual):
+        diffs.append(f"{label}: expected {len(expected)} IPOs, parsed {len(actual)}")
+    for i, (want, got) in enumerate(zip(expected, actual)):
+        for field in sorted(set(want) | set(got)):
+            if want.get(field) != got.get(field):
+                diffs.append(f"{label} row {i} ({want.get('ipo_name')}): {field} expected {want.get(field)!r}, got {got.get(field)!r}")
+    return diffs
+
+
+def measure(html, repeat):
+    """Best-of-`repeat` timings for extraction and parsing, plus peak memory of one full pass."""
+    extract_s, parse_s = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = extract_table_rows(html)
+        mid = time.perf_counter()
+        ipos = parse_table_rows(rows)
+        extract_s.append(mid - start)
+        parse_s.append(time.perf_counter() - mid)
+
+    tracemalloc.start()
+    parse_table_rows(extract_table_rows(html))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ipos, min(extract_s), min(parse_s), peak
+
+
+def report(label, ipos, extract_s, parse_s, peak):
+    n = max(len(ipos), 1)
+    print(
+        f"[*] {label}: {len(ipos)} IPOs | extract {extract_s * 1000:.1f} ms | "
+        f"parse {parse_s * 1000:.2f} ms ({n / parse_s:,.0f} rows/s, {parse_s * 1e6 / n:.1f} µs/row) | "
+        f"peak {peak / 1024 / 1024:.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark / regression check for the live-table parser")
+    parser.add_argument("snapshots", nargs="*", default=DEFAULT_SNAPSHOTS, help="saved HTML pages to replay")
+    parser.add_argument("--rows", type=int, default=SYNTHETIC_ROWS, help="synthetic table size (0 to skip)")
+    parser.add_argument("--repeat", type=int, default=3, help="timing repetitions (best is reported)")
+    parser.add_argument("--update-golden", action="store_true", help="rewrite <snapshot>.golden.json from the current parser")
+    args = parser.parse_args()
+
+    diffs = []
+    for path in args.snapshots:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        ipos, extract_s, parse_s, peak = measure(html, args.repeat)
+        report(path, ipos, extract_s, parse_s, peak)
+
+        golden_path = os.path.splitext(path)[0] + GOLDEN_SUFFIX
+        if args.update_golden or not os.path.exists(golden_path):
+            with open(golden_path, "w", encoding="utf-8") as f:
+                json.dump(ipos, f, indent=1, ensure_ascii=False)
+            print(f"[OK] Wrote golden output {golden_path}")
+        else:
+            with open(golden_path, encoding="utf-8") as f:
+                diffs += diff_rows(json.load(f), ipos, path)
+
+    if args.rows:
+        html, expected = synthetic_table(args.rows)
+        ipos, extract_s, parse_s, peak = measure(html, args.repeat)
+        report(f"synthetic x{args.rows}", ipos, extract_s, parse_s, peak)
+        diffs += diff_rows(expected, ipos, "synthetic")
+
+    if diffs:
+        print(f"❌ {len(diffs)} field differences:")
+        for line in diffs[:50]:
+            print(f"   {line}")
+        sys.exit(1)
+    print("✅ Parsed output matches golden data.")
+
+
+if __name__ == "__main__":
+    main()
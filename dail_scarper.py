@@ -1,6 +1,8 @@
 import sqlite3
 import re
 import os
+import hashlib
+import json
 import shutil
 from datetime import datetime
 import sys
@@ -17,12 +19,46 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from ipo_parsing import parse_day, parse_table_rows
+from pipeline_schedule import IST
+from pipeline_state import (SCRAPE_CHANGED_KEY, get_state, has_changes, new_change_set, save_change_set,
+                            set_state)
+from timeseries_store import record_samples
+
 # ===========================
 # CONFIGURATION
 # ===========================
 
 DB_PATH = "data/ipo_ml_withsme.db"
 URL = "https://www.investorgain.com/report/ipo-gmp-live/331/"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
+
+# 👇 Change detection: skip parsing/upserting (and the downstream steps) when the live table is unchanged
+FINGERPRINT_KEY = "live_table_fingerprint"
+VALIDATORS_KEY = "live_table_validators"
+FORCE_SCRAPE = os.getenv("FORCE_SCRAPE") == "1"
+LAST_SCRAPE_KEY = "last_scrape_at"
+
+# Stored fields compared per IPO to build the run's change set
+TRACKED_FIELDS = [
+    "gmp", "subscription_x", "ipo_price", "ipo_size_cr", "lot_size", "listing_date", "has_anchor",
+    "listing_price", "is_listed", "open_date", "close_date", "ipo_type",
+]
+_WS_RE = re.compile(r"\s+")
+
+# Every #reportTable row as {cells: [innerText], link_text, href, anchor_html} (see ipo_parsing.parse_ipo_row)
+ROW_PAYLOAD_JS = """
+return Array.from(document.querySelectorAll('#reportTable tr')).map(function (tr) {
+    var cells = Array.from(tr.querySelectorAll('td'));
+    var link = cells.length ? cells[0].querySelector('a') : null;
+    return {
+        cells: cells.map(function (td) { return td.innerText.trim(); }),
+        link_text: link ? link.innerText : null,
+        href: link ? link.href : null,
+        anchor_html: cells.length > 12 ? cells[12].innerHTML : ''
+    };
+});
+"""
 
 def get_driver():
     print("[*] Initializing Chrome Driver (Robust Mode)...")
@@ -33,7 +69,7 @@ def get_driver():
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36")
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
 
     # 👇 Support environment variables for headless cloud environments
     chrome_bin = os.getenv("CHROME_BIN")
@@ -60,22 +96,43 @@ def get_driver():
         print(f"[!] Driver Initialization Failed: {e}")
         raise
 
-def clean_number(text):
-    if not text:
-        return 0.0
-    text = str(text).split("\n")[0].split("(")[0].strip()
-    text = text.replace(",", "").replace("₹", "").replace("Rs.", "").strip()
-    match = re.search(r"(\d+\.?\d*)", text)
-    if match:
-        try:
-            return float(match.group(1))
-        except ValueError:
-            return 0.0
-    return 0.0
+def fingerprint_rows(rows):
+    """sha256 of everything parse_table_rows reads from the row payloads (cell texts, name link,
+    anchor cell HTML), whitespace-normalised so re-layouts don't count as changes."""
+    digest = hashlib.sha256()
+    for row in rows:
+        for part in ["\t".join(row["cells"]), row.get("href"), row.get("anchor_html")]:
+            digest.update(_WS_RE.sub(" ", part or "").strip().encode("utf-8"))
+            digest.update(b"\t")
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def probe_source():
+    """HTTP fast path: a conditional GET with the ETag / Last-Modified of the last full scrape.
+    Returns (not_modified, validators); validators are only persisted once a scrape succeeds."""
+    try:
+        import requests
+        stored = json.loads(get_state(VALIDATORS_KEY) or "{}")
+        headers = {"User-Agent": USER_AGENT}
+        if stored.get("etag"):
+            headers["If-None-Match"] = stored["etag"]
+        if stored.get("last_modified"):
+            headers["If-Modified-Since"] = stored["last_modified"]
+
+        resp = requests.get(URL, headers=headers, timeout=15)
+        if resp.status_code == 304 and len(headers) > 1:
+            return True, stored
+        return False, {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    except Exception as e:
+        print(f"[WARN] HTTP fast path unavailable: {e}")
+        return False, {}
 
-def scrape_daily_ipos():
+def scrape_daily_ipos(known_fingerprint=None):
+    """Scrape the live GMP table. Returns (ipo_rows, fingerprint); ipo_rows is None when the
+    table's fingerprint matches `known_fingerprint` (nothing changed, nothing parsed)."""
     driver = None
     ipo_rows = []
+    fingerprint = None
 
     try:
         driver = get_driver()
@@ -90,126 +147,23 @@ def scrape_daily_ipos():
         # Give it a tiny bit of extra time for rows to render
         time.sleep(3)
 
-        # Get all rows from the table
-        rows = driver.find_elements(By.CSS_SELECTOR, "#reportTable tr")
+        # 👇 One round trip for the whole table (cell texts + name link), instead of a WebDriver call per cell
+        rows = driver.execute_script(ROW_PAYLOAD_JS)
         print(f"[*] Total rows found (including headers): {len(rows)}")
 
         # Retry once if no data rows found (page may not have fully rendered)
-        data_rows = [r for r in rows if len(r.find_elements(By.TAG_NAME, 'td')) >= 10]
-        if len(data_rows) == 0:
+        if not any(len(r["cells"]) >= 10 for r in rows):
             print("[*] No data rows found, retrying with longer wait...")
             time.sleep(5)
-            rows = driver.find_elements(By.CSS_SELECTOR, "#reportTable tr")
+            rows = driver.execute_script(ROW_PAYLOAD_JS)
             print(f"[*] Retry: Total rows found: {len(rows)}")
 
-        for i, row in enumerate(rows):
-            cells = row.find_elements(By.TAG_NAME, "td")
-            
-            # Skip header rows or empty rows
-            if len(cells) < 10:
-                continue
-
-            ipo_name_full = cells[0].text.strip()
-            if not ipo_name_full or "IPO Name" in ipo_name_full:
-                continue
-                
-            try:
-                name_element = cells[0].find_element(By.TAG_NAME, "a")
-                clean_name = name_element.text.strip()
-            except:
-                clean_name = ipo_name_full.split("\n")[0].strip()
-            
-            if not clean_name:
-                continue
-
-            # GMP Parsing
-            gmp_text = cells[1].text
-            # Support negative GMP (e.g. -₹10, ₹ -10, or ₹-10)
-            gmp_match = re.search(r"(-?)\s*₹?\s*(-?\d+)", gmp_text)
-            if gmp_match:
-                is_neg = '-' in gmp_match.group(1) or '-' in gmp_match.group(2)
-                val = abs(int(gmp_match.group(2)))
-                gmp = float(-val if is_neg else val)
-            else:
-                gmp = 0.0
-
-
-            # Subscription, Price, Size, Lot
-            subscription_x = clean_number(cells[3].text)
-            ipo_price = clean_number(cells[4].text)
-            ipo_size_cr = clean_number(cells[5].text)
-            lot_size = clean_number(cells[6].text)
-
-            # Listing Price and Status
-            listing_price = None
-            is_listed = 0
-            lp_match = re.search(r"L@(\d+\.?\d*)", ipo_name_full)
-            if lp_match:
-                listing_price = float(lp_match.group(1))
-                is_listed = 1
-            
-            if any(p in ipo_name_full for p in ["Listed ", "listed "]):
-                is_listed = 1
-
-            # Listing Date
-            listing_date = ""
-            # Try columns 10, then 7, then 8
-            for idx in [10, 7, 8]:
-                if len(cells) > idx and cells[idx].text.strip():
-                    listing_date = cells[idx].text.split("\n")[0].strip()
-                    if listing_date: break
-            
-            # 👇 Parse Open & Close Dates
-            open_date = cells[7].text.split("\n")[0].strip() if len(cells) > 7 else ""
-            close_date = cells[8].text.split("\n")[0].strip() if len(cells) > 8 else ""
-
-            # 👇 Determine IPO Type (SME vs Mainboard)
-            is_sme = "SME" in clean_name.upper()
-
-            # Check the href URL of the link (Foolproof fallback)
-            try:
-                name_element = cells[0].find_element(By.TAG_NAME, "a")
-                href = name_element.get_attribute("href")
-                if href and "/sme-ipo/" in href.lower():
-                    is_sme = True
-            except Exception:
-                pass
+        fingerprint = fingerprint_rows(rows)
+        if known_fingerprint and fingerprint == known_fingerprint:
+            print(f"[*] Live table unchanged since last scrape (fingerprint {fingerprint[:12]}). Skipping parse.")
+            return None, fingerprint
 
-            # Apply the Financial Rule (if price and lot size are known)
-            if not is_sme and lot_size > 0 and ipo_price > 0:
-                min_investment = lot_size * ipo_price
-                if min_investment >= 80000:
-                    is_sme = True
-
-            # Apply high lot size threshold fallback
-            if not is_sme and lot_size >= 500:
-                is_sme = True
-
-            ipo_type = "SME" if is_sme else "Mainboard"
-
-            # Anchor Status
-            has_anchor = 0
-            if len(cells) > 12:
-                cell_text = cells[12].text
-                cell_html = cells[12].get_attribute('innerHTML')
-                if "✅" in cell_text or "✅" in cell_html:
-                    has_anchor = 1
-
-            ipo_rows.append({
-                "ipo_name": clean_name,
-                "gmp": gmp,
-                "subscription_x": subscription_x,
-                "ipo_price": ipo_price,
-                "ipo_size_cr": ipo_size_cr,
-                "lot_size": int(lot_size),
-                "listing_date": listing_date,
-                "has_anchor": has_anchor,
-                "listing_price": listing_price,
-                "is_listed": is_listed,
-                "open_date": open_date,
-                "close_date": close_date,
-                "ipo_type": ipo_type
-            })
+        ipo_rows = parse_table_rows(rows)
 
         listed_count = sum(1 for ipo in ipo_rows if ipo["is_listed"] == 1)
         unlisted_count = len(ipo_rows) - listed_count
@@ -232,12 +186,15 @@ def scrape_daily_ipos():
             except:
                 pass
 
-    return ipo_rows
+    return ipo_rows, fingerprint
 
 def upsert_ipos(ipo_rows):
+    """Upsert the scraped rows, writing only IPOs whose fields moved.
+    Returns the change set (see pipeline_state.py) for the downstream steps."""
+    changes = new_change_set()
     if not ipo_rows:
         print("[WARN] No data to update.")
-        return
+        return changes
 
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
@@ -271,15 +228,35 @@ def upsert_ipos(ipo_rows):
             col_type = "REAL" if col_name == "listing_price" else col_type
             cur.execute(f"ALTER TABLE ipo_raw_data ADD COLUMN {col_name} {col_type}")
 
+    # 👇 One read for every stored row we're about to compare against (instead of a SELECT per IPO)
+    stored = {}
+    names = list(dict.fromkeys(ipo["ipo_name"] for ipo in ipo_rows))
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        cur.execute(
+            f"SELECT ipo_name, {', '.join(TRACKED_FIELDS)} FROM ipo_raw_data WHERE ipo_name IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        for row in cur.fetchall():
+            stored[row[0]] = dict(zip(TRACKED_FIELDS, row[1:]))
+
+    unchanged = []
     for ipo in ipo_rows:
-        cur.execute("SELECT gmp, listing_price, is_listed FROM ipo_raw_data WHERE ipo_name = ?", (ipo["ipo_name"],))
-        old_data = cur.fetchone()
+        name = ipo["ipo_name"]
+        old = stored.get(name)
 
-        if old_data:
-            old_gmp, old_listing_price, old_is_listed = old_data
+        if old:
+            old_gmp, old_listing_price, old_is_listed = old["gmp"], old["listing_price"], old["is_listed"]
             final_gmp = ipo["gmp"] if (ipo["gmp"] != 0 or not old_gmp) else old_gmp
             final_lp = ipo["listing_price"] if (ipo["listing_price"] or not old_listing_price) else old_listing_price
-            final_is_listed = max(ipo["is_listed"], old_is_listed)
+            final_is_listed = max(ipo["is_listed"], old_is_listed or 0)
+
+            new_values = {f: ipo[f] for f in TRACKED_FIELDS}
+            new_values.update(gmp=final_gmp, listing_price=final_lp, is_listed=final_is_listed)
+            diff = [f for f in TRACKED_FIELDS if new_values[f] != old[f]]
+            if not diff:
+                unchanged.append(name)
+                continue
 
             cur.execute("""
             UPDATE ipo_raw_data
@@ -290,21 +267,38 @@ def upsert_ipos(ipo_rows):
             """, (
                 final_gmp, ipo["subscription_x"], ipo["lot_size"], ipo["ipo_price"],
                 ipo["ipo_size_cr"], ipo["listing_date"], ipo["has_anchor"], final_lp, final_is_listed,
-                ipo["open_date"], ipo["close_date"], ipo["ipo_type"], ipo["ipo_name"]
+                ipo["open_date"], ipo["close_date"], ipo["ipo_type"], name
             ))
+            stored[name] = new_values
+            changes["changed"][name] = diff
+            if final_is_listed and {"is_listed", "listing_price"} & set(diff):
+                changes["listed"].append(name)
         else:
             cur.execute("""
             INSERT INTO ipo_raw_data (ipo_name, gmp, subscription_x, ipo_price, ipo_size_cr, lot_size, listing_date, listing_price, is_listed, has_anchor, open_date, close_date, ipo_type, scraped_at)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """, (ipo["ipo_name"], ipo["gmp"], ipo["subscription_x"], ipo["ipo_price"], ipo["ipo_size_cr"], ipo["lot_size"], ipo["ipo_date"] if "ipo_date" in ipo else ipo["listing_date"], ipo["listing_price"], ipo["is_listed"], ipo["has_anchor"], ipo["open_date"], ipo["close_date"], ipo["ipo_type"]))
+            """, (name, ipo["gmp"], ipo["subscription_x"], ipo["ipo_price"], ipo["ipo_size_cr"], ipo["lot_size"], ipo["ipo_date"] if "ipo_date" in ipo else ipo["listing_date"], ipo["listing_price"], ipo["is_listed"], ipo["has_anchor"], ipo["open_date"], ipo["close_date"], ipo["ipo_type"]))
+            stored[name] = {f: ipo[f] for f in TRACKED_FIELDS}
+            changes["new"].append(name)
+            if ipo["is_listed"]:
+                changes["listed"].append(name)
+
+    # Unchanged rows were still seen in this scrape
+    if unchanged:
+        cur.executemany("UPDATE ipo_raw_data SET scraped_at=CURRENT_TIMESTAMP WHERE ipo_name=?", [(n,) for n in unchanged])
+
+    # 👇 Every scrape is a sample of the numeric series (changed or not), committed with the upsert
+    record_samples(conn, ipo_rows)
 
     conn.commit()
     conn.close()
-    print(f"[OK] Database Updated.")
+    print(f"[OK] Database Updated: {len(changes['new'])} new, {len(changes['changed'])} changed, {len(unchanged)} unchanged.")
+    return changes
 
 def update_listed_status_from_tracker(driver):
     tracker_url = "https://www.investorgain.com/report/ipo-gmp-performance-tracker/377/"
     print(f"\n[*] Connecting to performance tracker: {tracker_url}...")
+    updated = []
     try:
         driver.get(tracker_url)
         wait = WebDriverWait(driver, 30)
@@ -316,7 +310,7 @@ def update_listed_status_from_tracker(driver):
         conn = sqlite3.connect(DB_PATH)
         cur = conn.cursor()
         
-        updated_count = 0
+        updated = []
         for row in rows:
             cells = row.find_elements(By.TAG_NAME, "td")
             if len(cells) < 10:
@@ -350,14 +344,15 @@ def update_listed_status_from_tracker(driver):
                         SET is_listed = 1, listing_price = ?, listing_date = ?
                         WHERE ipo_name = ?
                         """, (listing_price, cells[2].text.strip().split("\n")[0].strip(), clean_name))
-                        updated_count += 1
+                        updated.append(clean_name)
                         print(f"    -> Updated listed status for {clean_name}: Price = {listing_price}")
         
         conn.commit()
         conn.close()
-        print(f"[*] Updated {updated_count} IPOs from performance tracker.")
+        print(f"[*] Updated {len(updated)} IPOs from performance tracker.")
     except Exception as e:
         print(f"[ERR] Error scraping performance tracker: {e}")
+    return updated
 
 def auto_mark_listed_by_date():
     """Safety net: auto-mark IPOs as listed if their listing_date has passed by 1+ days.
@@ -374,7 +369,7 @@ def auto_mark_listed_by_date():
     candidates = cur.fetchall()
     
     now = datetime.now()
-    updated_count = 0
+    updated = []
     
     for ipo_name, listing_date_str, close_date_str in candidates:
         try:
@@ -397,7 +392,7 @@ def auto_mark_listed_by_date():
                     UPDATE ipo_raw_data SET is_listed = 1
                     WHERE ipo_name = ? AND is_listed = 0
                 """, (ipo_name,))
-                updated_count += 1
+                updated.append(ipo_name)
                 print(f"    -> Auto-marked '{ipo_name}' as listed (listing_date={clean_date}, {(now - listing_dt).days} days ago)")
         except Exception as e:
             # Also try with close_date as fallback (listing is typically 3 days after close)
@@ -414,33 +409,84 @@ def auto_mark_listed_by_date():
                             UPDATE ipo_raw_data SET is_listed = 1
                             WHERE ipo_name = ? AND is_listed = 0
                         """, (ipo_name,))
-                        updated_count += 1
+                        updated.append(ipo_name)
                         print(f"    -> Auto-marked '{ipo_name}' as listed (close_date={clean_close}, {(now - close_dt).days} days past close)")
             except:
                 pass
     
     conn.commit()
     conn.close()
-    print(f"[*] Auto-listed {updated_count} IPOs by date.")
+    print(f"[*] Auto-listed {len(updated)} IPOs by date.")
+    return updated
+
+def closed_since(last_scrape_at, now=None):
+    """Unlisted IPOs whose bidding closed (5 PM IST on close_date) between the last scrape and now."""
+    now = now or datetime.now(IST)
+    if not last_scrape_at:
+        return []
+    last = datetime.fromisoformat(last_scrape_at)
+
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute("SELECT ipo_name, close_date FROM ipo_raw_data WHERE is_listed = 0").fetchall()
+    conn.close()
+
+    closed = []
+    for ipo_name, close_date_str in rows:
+        close_day = parse_day(close_date_str, now.date())
+        if close_day is None:
+            continue
+        cutoff = datetime(close_day.year, close_day.month, close_day.day, 17, 0, tzinfo=IST)
+        if last < cutoff <= now:
+            closed.append(ipo_name)
+    return closed
 
 if __name__ == "__main__":
     try:
-        # 1. Scrape live IPOs
-        ipos = scrape_daily_ipos()
-        upsert_ipos(ipos)
-        
-        # 2. Scrape performance tracker to update listing prices of past IPOs
+        scrape_at = datetime.now(IST)
+        changes = new_change_set()
+        ipos = None
+
+        # 0. Fast path: the server says the page hasn't changed since the last full scrape
+        not_modified, validators = (False, {}) if FORCE_SCRAPE else probe_source()
+        if not_modified:
+            print("[*] Live page not modified (HTTP 304). Skipping browser scrape.")
+        else:
+            # 1. Scrape live IPOs (unless the table's fingerprint matches the last run)
+            known_fingerprint = None if FORCE_SCRAPE else get_state(FINGERPRINT_KEY)
+            ipos, fingerprint = scrape_daily_ipos(known_fingerprint)
+
+        if ipos is not None:
+            changes = upsert_ipos(ipos)
+
+        # 2. Scrape performance tracker to update listing prices of past IPOs. It's a different page
+        #    (and matches against every unlisted IPO in the DB), so it runs even when the live table didn't change
         print("\n[*] Starting Performance Tracker Scraper...")
         driver = get_driver()
         try:
-            update_listed_status_from_tracker(driver)
+            changes["listed"] += update_listed_status_from_tracker(driver)
         finally:
             driver.quit()
-        
+
         # 3. Safety net: auto-mark IPOs whose listing date has passed
-        auto_mark_listed_by_date()
-            
+        changes["listed"] += auto_mark_listed_by_date()
+        changes["listed"] = list(dict.fromkeys(changes["listed"]))
+
+        # 4. A bidding window closing flips an IPO's status even when none of its numbers moved
+        changes["closed"] = closed_since(get_state(LAST_SCRAPE_KEY), scrape_at)
+
+        # Only remember the fingerprint once the data behind it is safely in the DB (an empty table counts)
+        if ipos is not None:
+            set_state(FINGERPRINT_KEY, fingerprint)
+            set_state(VALIDATORS_KEY, json.dumps(validators))
+
+        save_change_set(changes)
+        set_state(SCRAPE_CHANGED_KEY, int(has_changes(changes)))
+        set_state(LAST_SCRAPE_KEY, scrape_at.isoformat(timespec="seconds"))
+        print(
+            f"[*] Change set: {len(changes['new'])} new, {len(changes['changed'])} changed, "
+            f"{len(changes['listed'])} listed, {len(changes['closed'])} closed."
+        )
         print("[*] Scrape Complete.")
     except Exception as e:
         print(f"[ERR] Scraper Failed: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,394 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from market_regime import join_regime, listing_days, load_series
+from pipeline_state import touched_names
+
+# ======================
+# MODEL FEATURES
+# ======================
+# Shared by train_dl.py, ipo_predicition.py and historical_scorer.py so training and
+# inference always build features the same way. The results are materialised in
+# ipo_features (one float64 vector per IPO per feature set, see FEATURE STORE below):
+# every consumer reads the same stored vectors instead of recomputing from raw rows.
+#
+# Market features are the regime (market_regime.py) as of each IPO's close date: the
+# last trading day on or before it, so training never sees the market after bidding
+# ended. They are joined in one sorted merge_asof and cached per IPO in
+# ipo_market_features. A cached row is reused only while it is final (matched, and the
+# series has reached its close day) and its matched trading day is still the as-of day in
+# the current series, so a backfill of earlier or missing days re-joins the IPOs it affects.
+
+DB_PATH = "data/ipo_ml_withsme.db"
+
+BASE_FEATURES = [
+    "gmp_pct", "subscription_x", "log_subscription",
+    "ipo_size_cr", "log_ipo_size", "ipo_price", "has_anchor",
+]
+MARKET_FEATURES = ["market_nifty_change_pct", "market_vix_close", "market_score"]
+
+# Used when there is no regime data yet (same fallbacks as market_meter.py: VIX 14, flat Nifty)
+NEUTRAL_MARKET = {"market_nifty_change_pct": 0.0, "market_vix_close": 14.0, "market_score": 51.0}
+
+ANCHOR_COLUMN = "close_date"
+# No close date scraped: listing day minus the T+3 settlement gap stands in for it
+LISTING_LAG_BDAYS = 3
+
+# Bump when a feature formula changes: it is part of the feature-set hash, so every stored vector is rebuilt
+FEATURE_CODE_VERSION = 1
+
+# Raw ipo_raw_data columns the features are computed from (a change to any of them refreshes the IPO)
+RAW_COLUMNS = ["gmp", "subscription_x", "ipo_price", "ipo_size_cr", "has_anchor", "close_date", "listing_date", "scraped_at"]
+NUMERIC_COLUMNS = ["gmp", "subscription_x", "ipo_price", "ipo_size_cr", "has_anchor"]
+
+
+def add_base_features(df):
+    """gmp_pct / log_subscription / log_ipo_size from the raw scraped columns (in place)."""
+    df["gmp_pct"] = (df["gmp"] / df["ipo_price"]) * 100
+    df["log_subscription"] = np.log1p(df["subscription_x"])
+    df["log_ipo_size"] = np.log1p(df["ipo_size_cr"])
+    return df
+
+
+def model_features(scaler):
+    """Feature columns the fitted scaler expects, in order (older scalers: the base set)."""
+    names = getattr(scaler, "feature_names_in_", None)
+    return list(names) if names is not None else list(BASE_FEATURES)
+
+
+# ======================
+# MARKET FEATURES (as-of join, cached per IPO)
+# ======================
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ipo_market_features (
+        ipo_name TEXT PRIMARY KEY,
+        anchor_day TEXT,
+        regime_date TEXT,
+        final INTEGER NOT NULL DEFAULT 0,
+        market_nifty_change_pct REAL,
+        market_vix_close REAL,
+        market_score REAL
+    )
+    """)
+    return conn
+
+
+def _load_cache(conn):
+    cur = conn.execute(f"SELECT ipo_name, anchor_day, regime_date, final, {', '.join(MARKET_FEATURES)} FROM ipo_market_features")
+    names = [d[0] for d in cur.description]
+    return pd.DataFrame(cur.fetchall(), columns=names)
+
+
+def _anchor_days(df):
+    """ISO close day per IPO ("" when neither a close nor a listing date parses)."""
+    close = listing_days(df[ANCHOR_COLUMN].fillna(""), df["scraped_at"])
+    listed = listing_days(df["listing_date"].fillna(""), df["scraped_at"]) - pd.offsets.BDay(LISTING_LAG_BDAYS)
+    return close.fillna(listed).dt.strftime("%Y-%m-%d").fillna("")
+
+
+def _asof_days(anchor_days, series_days):
+    """Last series day on or before each anchor day ("" when there is none). Both are sorted-able ISO strings."""
+    series_days = np.asarray(series_days, dtype=object)
+    if len(series_days) == 0:
+        return np.full(len(anchor_days), "", dtype=object)
+    pos = np.searchsorted(series_days, np.asarray(anchor_days, dtype=object), side="right") - 1
+    return np.where(pos >= 0, series_days[np.clip(pos, 0, None)], "")
+
+
+def add_market_features(df, db_path=DB_PATH, series=None):
+    """Adds MARKET_FEATURES to df (needs ipo_name, close_date, listing_date and scraped_at). Returns df.
+
+    Cached IPOs with a final match that is still the as-of day in the series are reused
+    as-is; the rest go through one merge_asof against the regime series and are written back."""
+    df = df.copy()
+    df["anchor_day"] = _anchor_days(df)
+
+    conn = _connect(db_path)
+    try:
+        if series is None:
+            series = load_series(db_path)
+        cache = _load_cache(conn)
+        reuse = df[["ipo_name", "anchor_day"]].merge(cache, on=["ipo_name", "anchor_day"], how="inner")
+        reuse = reuse[reuse["final"] == 1]
+        # 👇 A backfill can put a closer trading day under a cached match: only keep rows whose match still holds
+        reuse = reuse[reuse["regime_date"].to_numpy() == _asof_days(reuse["anchor_day"], np.sort(series["date"].to_numpy()))]
+        reuse = reuse.set_index("ipo_name")[MARKET_FEATURES]
+        final_names = set(reuse.index)
+
+        todo = df.loc[~df["ipo_name"].isin(reuse.index), ["ipo_name", "anchor_day"]]
+        if not todo.empty:
+            if series.empty:
+                joined = todo.assign(regime_date=None, **{c: np.nan for c in MARKET_FEATURES})
+                last_day = None
+            else:
+                joined = join_regime(todo.assign(anchor_ts=pd.to_datetime(todo["anchor_day"], errors="coerce")), series, on="anchor_ts")
+                joined["regime_date"] = pd.to_datetime(joined["regime_date"]).dt.strftime("%Y-%m-%d")
+                last_day = series["date"].max()
+            # Final only with an actual match, once the series has reached the close day (later days can't
+            # change it). No match (no close date, or a close before the series starts) is retried every run
+            joined["final"] = [
+                int(isinstance(r, str) and last_day is not None and a <= last_day)
+                for a, r in zip(joined["anchor_day"], joined["regime_date"])
+            ]
+
+            with conn:
+                conn.executemany(f"""
+                    INSERT INTO ipo_market_features (ipo_name, anchor_day, regime_date, final, {", ".join(MARKET_FEATURES)})
+                    VALUES (?, ?, ?, ?, {", ".join("?" for _ in MARKET_FEATURES)})
+                    ON CONFLICT(ipo_name) DO UPDATE SET
+                        anchor_day = excluded.anchor_day, regime_date = excluded.regime_date, final = excluded.final,
+                        {", ".join(f"{c} = excluded.{c}" for c in MARKET_FEATURES)}
+                """, [
+                    (row["ipo_name"], row["anchor_day"],
+                     row["regime_date"] if isinstance(row["regime_date"], str) else None, row["final"],
+                     *[None if pd.isna(row[c]) else float(row[c]) for c in MARKET_FEATURES])
+                    for row in joined.to_dict(orient="records")
+                ])
+            final_names |= set(joined.loc[joined["final"] == 1, "ipo_name"])
+            fresh = joined.drop_duplicates("ipo_name", keep="last").set_index("ipo_name")[MARKET_FEATURES]
+            reuse = pd.concat([reuse, fresh])
+    finally:
+        conn.close()
+
+    values = reuse.reindex(df["ipo_name"].to_numpy())
+    for col in MARKET_FEATURES:
+        df[col] = values[col].fillna(NEUTRAL_MARKET[col]).to_numpy()
+    df["market_final"] = df["ipo_name"].isin(final_names).to_numpy()
+    print(f"📈 Market features: {len(df) - len(todo)} cached, {len(todo)} joined as of close date.")
+    return df.drop(columns=["anchor_day"])
+
+
+def build_features(df, feature_names, db_path=DB_PATH):
+    """Base features always; market features only when the model uses them (no extra cost otherwise)."""
+    df = add_base_features(df)
+    if any(name in MARKET_FEATURES for name in feature_names):
+        df = add_market_features(df, db_path)
+    return df
+
+
+# ======================
+# FEATURE STORE (ipo_features)
+# ======================
+
+def feature_set_hash(feature_names):
+    raw = json.dumps([FEATURE_CODE_VERSION, list(feature_names)])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _store_connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS feature_sets (
+        feature_set TEXT PRIMARY KEY,
+        names TEXT NOT NULL,
+        created_at TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ipo_features (
+        feature_set TEXT NOT NULL,
+        ipo_name TEXT NOT NULL,
+        vec BLOB NOT NULL,
+        final INTEGER NOT NULL DEFAULT 1,
+        updated_at TEXT,
+        src_hash TEXT,
+        PRIMARY KEY (feature_set, ipo_name)
+    ) WITHOUT ROWID
+    """)
+    # 👇 Stores created before src_hash existed: the NULL hashes make the next run rebuild every vector once
+    if "src_hash" not in {row[1] for row in conn.execute("PRAGMA table_info(ipo_features)")}:
+        conn.execute("ALTER TABLE ipo_features ADD COLUMN src_hash TEXT")
+    return conn
+
+
+def _read_raw(conn):
+    cur = conn.execute(f"SELECT {', '.join(['ipo_name'] + RAW_COLUMNS)} FROM ipo_raw_data")
+    return pd.DataFrame(cur.fetchall(), columns=["ipo_name"] + RAW_COLUMNS)
+
+
+def _source_hashes(raw, feature_names, db_path):
+    """Per-row hash of the inputs a vector is computed from: the numeric columns and, for market
+    features, the parsed close day plus the regime day it is joined to in the current series.
+
+    scraped_at itself stays out (the scraper re-stamps every live row each run); it only
+    matters through the year it gives the close day, which is what gets hashed."""
+    values = raw[NUMERIC_COLUMNS].apply(pd.to_numeric, errors="coerce").astype(float)
+    parts = values.astype(object).where(values.notna(), None)
+    if any(name in MARKET_FEATURES for name in feature_names):
+        anchor_days = _anchor_days(raw)
+        series_days = np.sort(load_series(db_path)["date"].to_numpy())
+        parts = parts.assign(anchor_day=anchor_days.to_numpy(), regime_day=_asof_days(anchor_days, series_days))
+    return [
+        hashlib.sha1(json.dumps(row, default=str).encode("utf-8")).hexdigest()[:16]
+        for row in parts.itertuples(index=False, name=None)
+    ]
+
+
+def _stale_names(raw, stored):
+    """(IPOs to recompute, those among them that had a final vector): no vector yet, not final, or src_hash moved."""
+    stale = {
+        name for name, src_hash in zip(raw["ipo_name"], raw["src_hash"])
+        if stored.get(name, (0, None)) != (1, src_hash)
+    }
+    return stale, {name for name in stale if stored.get(name, (0, None))[0] == 1}
+
+
+def materialize(feature_names, changes=None, db_path=DB_PATH):
+    """Bring ipo_features up to date for one feature set. Returns the feature-set hash.
+
+    With the scraper's change set only new IPOs, IPOs whose raw inputs changed and IPOs
+    whose market features aren't final yet are recomputed; without one (first run,
+    --force, training) the whole set is rebuilt. Every run also reconciles the stored
+    src_hash against the current raw rows, so a change set that was lost (a failed run,
+    overwritten by the next scrape) can't leave a stale vector behind."""
+    feature_names = list(feature_names)
+    fs = feature_set_hash(feature_names)
+    conn = _store_connect(db_path)
+    try:
+        conn.execute(
+            "INSERT OR IGNORE INTO feature_sets (feature_set, names, created_at) VALUES (?, ?, ?)",
+            (fs, json.dumps(feature_names), datetime.now().isoformat()),
+        )
+        stored = {
+            name: (final, src_hash) for name, final, src_hash in
+            conn.execute("SELECT ipo_name, final, src_hash FROM ipo_features WHERE feature_set = ?", (fs,)).fetchall()
+        }
+        raw = _read_raw(conn)
+    finally:
+        conn.close()
+
+    raw["src_hash"] = _source_hashes(raw, feature_names, db_path)
+    all_names = set(raw["ipo_name"])
+    if changes is not None:
+        touched = touched_names(changes, RAW_COLUMNS) & all_names
+        stale, missed = _stale_names(raw, stored)
+        missed -= touched
+        if missed:
+            print(f"⚠️ Features [{fs}]: {len(missed)} IPOs changed outside the change set, recomputing them too.")
+        todo = touched | stale
+        if not todo:
+            print(f"🧮 Features [{fs}]: all {len(all_names)} IPOs up to date.")
+            return fs
+        raw = raw[raw["ipo_name"].isin(todo)].reset_index(drop=True)
+
+    for col in NUMERIC_COLUMNS:
+        raw[col] = pd.to_numeric(raw[col], errors="coerce")
+    frame = build_features(raw, feature_names, db_path)
+    matrix = frame[feature_names].to_numpy(dtype="<f8")
+    if "market_final" in frame:
+        final = frame["market_final"].to_numpy(dtype=int)
+    else:
+        final = np.ones(len(frame), dtype=int)
+
+    now = datetime.now().isoformat()
+    conn = _store_connect(db_path)
+    try:
+        with conn:
+            conn.executemany("""
+                INSERT INTO ipo_features (feature_set, ipo_name, vec, final, updated_at, src_hash) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(feature_set, ipo_name) DO UPDATE SET
+                    vec = excluded.vec, final = excluded.final, updated_at = excluded.updated_at, src_hash = excluded.src_hash
+            """, [
+                (fs, name, vec.tobytes(), int(fin), now, src_hash)
+                for name, vec, fin, src_hash in zip(frame["ipo_name"], matrix, final, frame["src_hash"])
+            ])
+    finally:
+        conn.close()
+    print(f"🧮 Features [{fs}]: {len(frame)} of {len(all_names)} IPOs recomputed.")
+    return fs
+
+
+def load_features(feature_names, ipo_names=None, db_path=DB_PATH):
+    """(ipo_names, float64 matrix) from ipo_features, rows in the order of `ipo_names` if given.
+
+    IPOs with no stored vector come back as rows of NaN."""
+    feature_names = list(feature_names)
+    fs = feature_set_hash(feature_names)
+    conn = _store_connect(db_path)
+    try:
+        rows = conn.execute("SELECT ipo_name, vec FROM ipo_features WHERE feature_set = ?", (fs,)).fetchall()
+    finally:
+        conn.close()
+
+    vectors = {name: np.frombuffer(vec, dtype="<f8") for name, vec in rows}
+    names = list(vectors) if ipo_names is None else list(ipo_names)
+    matrix = np.full((len(names), len(feature_names)), np.nan)
+    for i, name in enumerate(names):
+        vec = vectors.get(name)
+        if vec is not None:
+            matrix[i] = vec
+    return names, matrix
+
+
+def attach_features(df, feature_names, changes=None, db_path=DB_PATH):
+    """Materialise, then put the stored feature columns onto df (matched by ipo_name)."""
+    materialize(feature_names, changes, db_path)
+    _, matrix = load_features(feature_names, df["ipo_name"], db_path)
+    df = df.copy()
+    for i, col in enumerate(feature_names):
+        df[col] = matrix[:, i]
+    return df
+
+
+# ======================
+# SELF-CHECK
+# ======================
+
+def check_unchanged_run(db_path=DB_PATH):
+    """Materialise on a scratch copy of the DB, replay a scrape that changed nothing (the scraper
+    only re-stamps scraped_at) and list the feature sets that would still recompute a final vector."""
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, os.path.basename(db_path))
+        shutil.copyfile(db_path, copy)
+        for feature_names in (BASE_FEATURES, BASE_FEATURES + MARKET_FEATURES):
+            fs = materialize(feature_names, None, copy)
+            conn = _store_connect(copy)
+            try:
+                with conn:
+                    conn.execute("UPDATE ipo_raw_data SET scraped_at = datetime(scraped_at, '+10 minutes') WHERE scraped_at IS NOT NULL")
+                stored = {
+                    name: (final, src_hash) for name, final, src_hash in
+                    conn.execute("SELECT ipo_name, final, src_hash FROM ipo_features WHERE feature_set = ?", (fs,)).fetchall()
+                }
+                raw = _read_raw(conn)
+            finally:
+                conn.close()
+            raw["src_hash"] = _source_hashes(raw, feature_names, copy)
+            _, missed = _stale_names(raw, stored)
+            if missed:
+                failures.append(f"[{fs}] {len(missed)} final vectors recomputed, e.g. {sorted(missed)[:3]}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feature store self-check")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--check", action="store_true",
+                        help="exit non-zero when a scrape that changed nothing would recompute stored vectors")
+    args = parser.parse_args()
+
+    if args.check:
+        problems = check_unchanged_run(args.db)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ An unchanged scrape recomputes no stored feature vector.")
+
+
+if __name__ == "__main__":
+    main()
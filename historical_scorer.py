@@ -1,11 +1,15 @@
 import sqlite3
 import pandas as pd
 import numpy as np
-import joblib
 import os
-import requests
 import sys
-from tensorflow.keras.models import load_model
+from datetime import datetime
+
+from features import attach_features
+from model_registry import current_model
+from pipeline_state import load_change_set
+from prediction_cache import input_hash, load_cached, store_predictions
+from upload_codec import SCORECARD_FIELDS, post_rows, select_fields
 
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
@@ -14,8 +18,6 @@ if hasattr(sys.stdout, 'reconfigure'):
 # CONFIGURATION
 # ======================
 DB_PATH = "data/ipo_ml_withsme.db"
-MODEL_PATH = "ipo_dl_model.h5"
-SCALER_PATH = "scaler.pkl"
 
 # 👇 Dynamic API URL resolution with fallback
 BASE_API_URL = os.getenv("API_URL")
@@ -31,19 +33,19 @@ else:
 PROB_THRESHOLD = 0.70
 GMP_MIN = 5.0
 GMP_AUTO_INVEST = 15.0
+FORCE_FULL = os.getenv("FORCE_SCRAPE") == "1"  # set by `run_pipeline.py --force`
 
 print("\n" + "="*40)
 print("🔹 Historical Scorecard Generator")
 print("="*40)
 
-if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH):
-    print("❌ Error: Model or scaler not found.")
+# 👇 Same live model as the predictor (models/CURRENT, or the root files as "legacy")
+try:
+    active_model = current_model()
+except FileNotFoundError as e:
+    print(f"❌ Error: {e}")
     exit()
 
-
-model = load_model(MODEL_PATH)
-scaler = joblib.load(SCALER_PATH)
-
 conn = sqlite3.connect(DB_PATH)
 query = """
 SELECT ipo_name, gmp, subscription_x, ipo_price, ipo_size_cr, has_anchor, listing_price, listing_date
@@ -59,8 +61,6 @@ if df.empty:
     print("⚠️ No listed IPO data found for scorecard.")
     exit()
 
-from datetime import datetime
-
 def parse_ipo_date(d):
     try:
         # Expected: "2-Apr" or "30-Mar"
@@ -77,15 +77,10 @@ df["sort_date"] = df["listing_date"].apply(parse_ipo_date)
 df = df.sort_values(by="sort_date", ascending=False)
 
 
-# Preprocessing
-df["gmp_pct"] = (df["gmp"] / df["ipo_price"]) * 100
-df["log_subscription"] = np.log1p(df["subscription_x"])
-df["log_ipo_size"] = np.log1p(df["ipo_size_cr"])
-
-features = [
-    "gmp_pct", "subscription_x", "log_subscription", 
-    "ipo_size_cr", "log_ipo_size", "ipo_price", "has_anchor"
-]
+# Preprocessing: the same stored feature vectors the predictor and training use (see features.py)
+features = active_model.features
+changes = None if FORCE_FULL else load_change_set()
+df = attach_features(df, features, changes)
 
 # Ensure no NaNs drop
 df = df.dropna(subset=features)
@@ -95,10 +90,27 @@ if X.empty:
     print("⚠️ After dropping NaNs, no data left.")
     exit()
 
-X_scaled = scaler.transform(X)
+# 👇 Listed IPOs don't change, so only newly listed ones (or a new model) need the network
+cached = load_cached("scorecard")
+df["input_hash"] = [input_hash(values, active_model.content_hash) for values in X.itertuples(index=False, name=None)]
+needs_predict = np.array([
+    name not in cached or cached[name][0] != h for name, h in zip(df["ipo_name"], df["input_hash"])
+], dtype=bool)
+
+if changes is not None and not changes.get("listed") and not needs_predict.any():
+    print("ℹ️ No newly listed IPOs since the last run. Scorecard unchanged, nothing to send.")
+    exit()
 
-# Predict
-df["predicted_probability"] = model.predict(X_scaled).flatten()
+df["predicted_probability"] = [np.nan if fresh else cached[name][1] for name, fresh in zip(df["ipo_name"], needs_predict)]
+if needs_predict.any():
+    df.loc[needs_predict, "predicted_probability"] = active_model.predict(X[needs_predict])
+    scored_at = datetime.now().isoformat()
+    store_predictions("scorecard", [
+        (name, h, prob, scored_at)
+        for name, h, prob in df.loc[needs_predict, ["ipo_name", "input_hash", "predicted_probability"]].itertuples(index=False, name=None)
+    ])
+print(f"🧠 Model run on {int(needs_predict.sum())} of {len(df)} listed IPOs (the rest reused their cached prediction).")
+df["model_version"] = active_model.version
 
 # Rules
 df["final_decision"] = 0 
@@ -158,7 +170,7 @@ safe_payload = [{k: _safe(v) for k, v in r.items()} for r in payload]
 # Send to API
 print(f"📡 Sending Scorecard data to {SCORECARD_API_URL}...")
 try:
-    response = requests.post(SCORECARD_API_URL, json=safe_payload)
+    response = post_rows(SCORECARD_API_URL, select_fields(safe_payload, SCORECARD_FIELDS))
     if response.status_code == 200:
         print("✅ SUCCESS: Scorecard pushed to API.")
     else:
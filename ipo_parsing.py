@@ -0,0 +1,238 @@
+import re
+import sys
+import time
+from datetime import date
+from html.parser import HTMLParser
+
+# ===========================
+# PATTERNS (compiled once, one pass per cell)
+# ===========================
+
+# Leading number of a cell's first line, before any "(...)" note:
+#   "1,105.00" -> 1105.0   "44.91x" -> 44.91   "0.40  Shares" -> 0.4   "-" -> 0.0
+_NUMBER_RE = re.compile(r"[^\n(\d]*(\d[\d,]*(?:\.\d+)?)")
+
+# GMP amount, signed either side of the rupee sign: "₹3.75 (3.83%)", "₹-92", "-₹10", "₹ -10". "₹--" is no GMP.
+_GMP_RE = re.compile(r"[^\n(\d-]*?(-?)\s*₹?\s*(-?)\s*(\d[\d,]*(?:\.\d+)?)")
+
+# Listing marker in the name cell: "L@108.00 (10.2%)"
+_LISTING_PRICE_RE = re.compile(r"L@(\d+\.?\d*)")
+
+# Day-month as shown on the site: "18-Jun", "2-Jul"
+_DAY_MONTH_RE = re.compile(r"(\d{1,2})-([A-Za-z]{3})")
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+
+# Financial rules used to spot SME issues the site doesn't label
+SME_MIN_INVESTMENT = 80000
+SME_MIN_LOT = 500
+
+
+def first_line(text):
+    return (text or "").partition("\n")[0].strip()
+
+
+def parse_number(text):
+    """Leading number of a cell (commas, ₹/Rs. and units ignored); 0.0 when there is none."""
+    match = _NUMBER_RE.match(text or "")
+    return float(match.group(1).replace(",", "")) if match else 0.0
+
+
+def parse_gmp(text):
+    """Signed GMP in rupees from the GMP cell; 0.0 when the site shows '--'."""
+    match = _GMP_RE.match(text or "")
+    if not match:
+        return 0.0
+    value = float(match.group(3).replace(",", ""))
+    return -value if (match.group(1) or match.group(2)) else value
+
+
+def parse_listing(name_text):
+    """(listing_price, is_listed) from the name cell's 'L@price' / 'Listed' markers."""
+    match = _LISTING_PRICE_RE.search(name_text)
+    listing_price = float(match.group(1)) if match else None
+    is_listed = 1 if match or "Listed " in name_text or "listed " in name_text else 0
+    return listing_price, is_listed
+
+
+def parse_day(text, today):
+    """'18-Jun' (as scraped) -> date, picking the year closest to `today`. None if unparseable."""
+    match = _DAY_MONTH_RE.fullmatch(first_line(text))
+    if not match:
+        return None
+    month = _MONTHS.get(match.group(2).lower())
+    if month is None:
+        return None
+    year = today.year
+    # Handle year boundary (e.g., Dec close date checked in Jan)
+    if today.month in [1, 2] and month in [11, 12]:
+        year -= 1
+    elif today.month in [11, 12] and month in [1, 2]:
+        year += 1
+    try:
+        return date(year, month, int(match.group(1)))
+    except ValueError:
+        return None
+
+
+def detect_ipo_type(name, href, ipo_price, lot_size):
+    is_sme = "SME" in name.upper()
+    # The href of the name link is the foolproof signal
+    if href and "/sme-ipo/" in href.lower():
+        is_sme = True
+    # Apply the Financial Rule (if price and lot size are known)
+    if not is_sme and lot_size > 0 and ipo_price > 0 and lot_size * ipo_price >= SME_MIN_INVESTMENT:
+        is_sme = True
+    # Apply high lot size threshold fallback
+    if not is_sme and lot_size >= SME_MIN_LOT:
+        is_sme = True
+    return "SME" if is_sme else "Mainboard"
+
+
+def parse_ipo_row(cells, link_text=None, href=None, anchor_html=""):
+    """One row of the live GMP table (cell texts as rendered) -> IPO dict, or None for header/empty rows.
+
+    `link_text`/`href` come from the <a> in the name cell (None when there is no link)."""
+    if len(cells) < 10:
+        return None
+
+    ipo_name_full = cells[0].strip()
+    if not ipo_name_full or "IPO Name" in ipo_name_full:
+        return None
+
+    clean_name = link_text.strip() if link_text is not None else first_line(ipo_name_full)
+    if not clean_name:
+        return None
+
+    gmp = parse_gmp(cells[1])
+    subscription_x = parse_number(cells[3])
+    ipo_price = parse_number(cells[4])
+    ipo_size_cr = parse_number(cells[5])
+    lot_size = parse_number(cells[6])
+    listing_price, is_listed = parse_listing(ipo_name_full)
+
+    # Listing Date: try columns 10, then 7, then 8
+    listing_date = ""
+    for idx in (10, 7, 8):
+        if len(cells) > idx:
+            listing_date = first_line(cells[idx])
+            if listing_date:
+                break
+
+    anchor_text = cells[12] if len(cells) > 12 else ""
+    has_anchor = 1 if "✅" in anchor_text or "✅" in (anchor_html or "") else 0
+
+    return {
+        "ipo_name": clean_name,
+        "gmp": gmp,
+        "subscription_x": subscription_x,
+        "ipo_price": ipo_price,
+        "ipo_size_cr": ipo_size_cr,
+        "lot_size": int(lot_size),
+        "listing_date": listing_date,
+        "has_anchor": has_anchor,
+        "listing_price": listing_price,
+        "is_listed": is_listed,
+        "open_date": first_line(cells[7]) if len(cells) > 7 else "",
+        "close_date": first_line(cells[8]) if len(cells) > 8 else "",
+        "ipo_type": detect_ipo_type(clean_name, href, ipo_price, lot_size),
+    }
+
+
+# ======================
+# OFFLINE EXTRACTION (saved HTML snapshots)
+# ======================
+
+class _TableExtractor(HTMLParser):
+    """Collects the rows of one <table id=...> in the same shape the scraper gets from the browser:
+    {"cells": [cell innerText], "link_text": ..., "href": ..., "anchor_html": ""}."""
+
+    _BLOCK_TAGS = {"div", "p", "li"}
+
+    def __init__(self, table_id):
+        super().__init__(convert_charrefs=True)
+        self.table_id = table_id
+        self.rows = []
+        self._depth = 0  # <table> nesting inside the target table
+        self._row = None
+        self._cell = None
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._depth == 0:
+            if tag == "table" and dict(attrs).get("id") == self.table_id:
+                self._depth = 1
+            return
+        if tag == "table":
+            self._depth += 1
+        elif tag == "tr":
+            self._row = {"cells": [], "link_text": None, "href": None, "anchor_html": ""}
+        elif tag == "td" and self._row is not None:
+            self._cell = []
+        elif self._cell is not None:
+            if tag == "br":
+                self._cell.append("\n")
+            elif tag in self._BLOCK_TAGS and self._cell and self._cell[-1] != "\n":
+                self._cell.append("\n")
+            elif tag == "a" and len(self._row["cells"]) == 0 and self._row["href"] is None:
+                self._row["href"] = dict(attrs).get("href")
+                self._link = []
+
+    def handle_endtag(self, tag):
+        if self._depth == 0:
+            return
+        if tag == "table":
+            self._depth -= 1
+        elif tag == "a" and self._link is not None:
+            self._row["link_text"] = "".join(self._link)
+            self._link = None
+        elif tag == "td" and self._cell is not None:
+            text = "".join(self._cell)
+            self._row["cells"].append("\n".join(line.strip() for line in text.strip().split("\n")))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+        if self._link is not None:
+            self._link.append(data)
+
+
+def extract_table_rows(html, table_id="reportTable"):
+    parser = _TableExtractor(table_id)
+    parser.feed(html)
+    parser.close()
+    return parser.rows
+
+
+def parse_table_rows(rows):
+    """Row payloads (browser or offline) -> list of IPO dicts, skipping header/empty rows."""
+    ipos = []
+    for row in rows:
+        ipo = parse_ipo_row(row["cells"], row.get("link_text"), row.get("href"), row.get("anchor_html", ""))
+        if ipo:
+            ipos.append(ipo)
+    return ipos
+
+
+if __name__ == "__main__":
+    # Quick check against the saved page: python ipo_parsing.py [page_source.html]
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+    path = sys.argv[1] if len(sys.argv) > 1 else "page_source.html"
+    with open(path, encoding="utf-8") as f:
+        rows = extract_table_rows(f.read())
+
+    ipos = parse_table_rows(rows)
+    listed = sum(ipo["is_listed"] for ipo in ipos)
+    print(f"[OK] {path}: {len(rows)} rows -> {len(ipos)} IPOs ({listed} listed, {len(ipos) - listed} unlisted)")
+
+    data_rows = [row for row in rows if len(row["cells"]) >= 10]
+    table = (data_rows * (1000 // max(len(data_rows), 1) + 1))[:1000]
+    start = time.perf_counter()
+    parse_table_rows(table)
+    print(f"[*] Parsed {len(table)} rows in {(time.perf_counter() - start) * 1000:.2f} ms")
@@ -1,17 +1,22 @@
 import sqlite3
 import numpy as np
 import pandas as pd
-import joblib
 import sys
 
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
-import requests  # <--- NEW: Needed to talk to the API
 import json
 import os
 from datetime import datetime
-from tensorflow.keras.models import load_model
+
+import alert_ledger
+from alerts import AlertDispatcher, invest_alert
+from features import attach_features
+from model_registry import current_model
+from pipeline_state import get_state, load_change_set, set_state, touched_names
+from prediction_cache import input_hash, load_cached, store_predictions
+from upload_codec import PREDICTION_FIELDS, post_rows, select_fields
 
 # ======================
 # CONFIG
@@ -19,30 +24,31 @@ from tensorflow.keras.models import load_model
 
 # Raw data source (Created by the scraper in the previous step)
 DB_PATH = "data/ipo_ml_withsme.db"
-MODEL_PATH = "ipo_dl_model.h5"
-SCALER_PATH = "scaler.pkl"
 
 # 👇 REPLACE THIS WITH YOUR ACTUAL RAILWAY APP URL OR USE ENVIRONMENT VARIABLES
 API_URL = os.getenv("API_URL", "http://localhost:8000/upload_predictions")
 
-NTFY_TOPIC = os.getenv("NTFY_TOPIC", "ipo_alerts_my_portfolio")  # Change this to whatever word you want!
-
 PROB_THRESHOLD = 0.70
 GMP_MIN = 5.0
 GMP_AUTO_INVEST = 15.0
 
+# 👇 Raw fields the model reads: only IPOs where one of these moved get re-predicted
+PREDICTION_INPUTS = ["gmp", "subscription_x", "ipo_price", "ipo_size_cr", "has_anchor"]
+FORCE_FULL = os.getenv("FORCE_SCRAPE") == "1"  # set by `run_pipeline.py --force`
+ALERT_RETRY_KEY = "pending_invest_alerts"
+
 # ======================
 # LOAD MODEL
 # ======================
 
-if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH):
-    print(f"❌ Error: Model or scaler file not found")
+# 👇 Whatever models/CURRENT points to (see model_registry.py); the loose root files if nothing is promoted.
+# The scaler and feature list load now, TensorFlow only when some IPO actually needs a fresh prediction
+try:
+    active_model = current_model()
+except FileNotFoundError as e:
+    print(f"❌ Error: {e}")
     exit()
-
-
-model = load_model(MODEL_PATH)
-scaler = joblib.load(SCALER_PATH)
-print("✅ Model and Scaler loaded")
+print(f"✅ Model version: {active_model.version} [{active_model.content_hash}]")
 
 # ======================
 # LOAD RAW DATA (From Local Scraper)
@@ -177,7 +183,7 @@ else:
 if df.empty:
     print("⚠️ No ACTIVE IPOs detected (all are likely listed or closed). Clearing dashboard.")
     try:
-        requests.post(API_URL, json=[])
+        post_rows(API_URL, [])
         print("✅ Dashboard cleared successfully.")
     except Exception as e:
         print(f"❌ Failed to clear dashboard: {e}")
@@ -199,23 +205,40 @@ df = df[df["ipo_price"] > 0].copy()
 # FEATURE ENGINEERING
 # ======================
 
-df["gmp_pct"] = (df["gmp"] / df["ipo_price"]) * 100
-df["log_subscription"] = np.log1p(df["subscription_x"])
-df["log_ipo_size"] = np.log1p(df["ipo_size_cr"])
-
-features = [
-    "gmp_pct", "subscription_x", "log_subscription", 
-    "ipo_size_cr", "log_ipo_size", "ipo_price", "has_anchor"
-]
-
-X = df[features]
-X_scaled = scaler.transform(X)
+# 👇 Whatever the model was trained on, read from the ipo_features store (refreshed for this run's change set)
+features = active_model.features
+changes = None if FORCE_FULL else load_change_set()
+df = attach_features(df, features, changes)
 
 # ======================
-# MODEL PREDICTION
+# MODEL PREDICTION (only for IPOs in this run's change set)
 # ======================
 
-df["predicted_probability"] = model.predict(X_scaled).flatten()
+touched = touched_names(changes, PREDICTION_INPUTS) if changes is not None else None
+
+run_at = datetime.now().isoformat()
+cached = load_cached("live")
+df["input_hash"] = [input_hash(values, active_model.content_hash) for values in df[features].itertuples(index=False, name=None)]
+
+# Re-predict what changed, plus anything the cache can't vouch for (new model, missing entry)
+needs_predict = np.array([
+    touched is None or name in touched or name not in cached or cached[name][0] != h
+    for name, h in zip(df["ipo_name"], df["input_hash"])
+], dtype=bool)
+
+df["predicted_probability"] = [np.nan if fresh else cached[name][1] for name, fresh in zip(df["ipo_name"], needs_predict)]
+# 👇 Every row is stamped with this run (the API keys its per-run history on predicted_at);
+#    when the model last actually computed the probability is kept separately
+df["predicted_at"] = run_at
+df["probability_computed_at"] = [run_at if fresh else cached[name][2] for name, fresh in zip(df["ipo_name"], needs_predict)]
+
+if needs_predict.any():
+    df.loc[needs_predict, "predicted_probability"] = active_model.predict(df.loc[needs_predict])
+    store_predictions("live", df.loc[needs_predict, ["ipo_name", "input_hash", "predicted_probability", "probability_computed_at"]].itertuples(index=False, name=None))
+
+print(f"🧠 Model run on {int(needs_predict.sum())} of {len(df)} IPOs (the rest reused their last prediction).")
+# Cached probabilities are keyed on the content hash, so every row comes from this version
+df["model_version"] = active_model.version
 
 # Decision Logic
 df["final_decision"] = 0
@@ -232,36 +255,46 @@ df.loc[
 df["decision_label"] = df["final_decision"].map({1: "INVEST", 0: "SKIP"})
 
 # Convert timestamps to string for JSON serialization
-df["predicted_at"] = datetime.now().isoformat()
 df["listing_date"] = df["listing_date"].astype(str) 
 
 # ======================
-# PUSH NOTIFICATIONS (NTFY)
+# PUSH NOTIFICATIONS (see alerts.py for sinks: ntfy, webhook, local)
 # ======================
 print("\n🔔 Checking for new INVEST alerts...")
-ALERTS_FILE = "data/sent_alerts.txt"
-if not os.path.exists(ALERTS_FILE):
-    open(ALERTS_FILE, "w").close()
-
-with open(ALERTS_FILE, "r") as f:
-    sent_alerts = f.read().splitlines()
-
-new_alerts_sent = 0
-for _, row in df[df["decision_label"] == "INVEST"].iterrows():
-    ipo_name = row["ipo_name"]
-    if ipo_name not in sent_alerts:
-        msg = f"🟢 INVEST ALERT: {ipo_name}\nGMP: {row['gmp_pct']:.1f}%\nProb: {row['predicted_probability']:.0%}\nPrice: ₹{row['ipo_price']}"
-        try:
-            requests.post(f"https://ntfy.sh/{NTFY_TOPIC}", data=msg.encode('utf-8'))
-            with open(ALERTS_FILE, "a") as f:
-                f.write(ipo_name + "\n")
-            new_alerts_sent += 1
-            print(f"   -> Sent alert for {ipo_name}")
-        except Exception as e:
-            print(f"❌ Failed to send alert: {e}")
-
-if new_alerts_sent == 0:
+ALERTS_FILE = "data/sent_alerts.txt"  # legacy dedup file, imported into alert_ledger once
+
+alert_ledger.migrate_sent_file(ALERTS_FILE, "INVEST", PROB_THRESHOLD)
+expired = alert_ledger.cleanup()
+if expired:
+    print(f"ℹ️ Dropped {expired} expired alert ledger entries.")
+
+# A decision can only flip when its inputs do, so only re-predicted IPOs (plus earlier failed sends) are checked
+pending_retry = set(json.loads(get_state(ALERT_RETRY_KEY) or "[]"))
+alert_candidates = df[(needs_predict | df["ipo_name"].isin(pending_retry)) & (df["decision_label"] == "INVEST")]
+candidates = [invest_alert(row, PROB_THRESHOLD) for row in alert_candidates.to_dict(orient="records")]
+
+# 👇 Claim-then-send: an alert already sent (or being sent by an overlapping run) is never claimed twice
+claim_token = alert_ledger.new_claim_token()
+claimed = alert_ledger.claim([alert_ledger.ledger_key(a) for a in candidates], claim_token)
+alerts = [a for a in candidates if alert_ledger.ledger_key(a) in claimed]
+
+# All alerts go out in parallel (pooled session, timeouts, retries); a slow endpoint can't stall the run
+dispatcher = AlertDispatcher()
+results = dispatcher.dispatch(alerts)
+delivered = [a for a in alerts if a["ipo_name"] in results and results[a["ipo_name"]] is None]
+unconfirmed = [a for a in alerts if a not in delivered and a["ipo_name"] in dispatcher.unconfirmed]
+failed = [a for a in alerts if a not in delivered and a not in unconfirmed]
+
+alert_ledger.mark_sent([alert_ledger.ledger_key(a) for a in delivered], claim_token)
+# 👇 A send that may have gone through is closed as unconfirmed, never retried (no duplicate alerts)
+alert_ledger.mark_sent([alert_ledger.ledger_key(a) for a in unconfirmed], claim_token, status=alert_ledger.UNCONFIRMED)
+alert_ledger.release([alert_ledger.ledger_key(a) for a in failed], claim_token)
+set_state(ALERT_RETRY_KEY, json.dumps([a["ipo_name"] for a in failed]))
+
+if not alerts:
     print("   -> No new alerts to send today.")
+else:
+    print(f"   -> {len(delivered)} of {len(alerts)} alerts delivered.")
 
 # ======================
 # SEND TO API (New Logic)
@@ -279,11 +312,11 @@ def _safe(v):
 
 payload = [
     {k: _safe(v) for k, v in row.items()}
-    for row in df.to_dict(orient="records")
+    for row in select_fields(df.to_dict(orient="records"), PREDICTION_FIELDS)
 ]
 
 try:
-    response = requests.post(API_URL, json=payload)
+    response = post_rows(API_URL, payload)
 
     if response.status_code == 200:
         print("✅ SUCCESS: Data successfully sent to the Website!")
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ======================
+# MARKET DATA LAYER
+# ======================
+# One place that fetches index quotes for the pipeline:
+#   - tickers are fetched concurrently (one thread per symbol)
+#   - quotes are cached on disk for MARKET_CACHE_TTL seconds, so a manual refresh or a
+#     re-run inside the window reuses them instead of hitting Yahoo again
+#   - the source is injectable: MARKET_DATA_SOURCE=local reads quotes from a JSON file
+#     (MARKET_DATA_FILE) for offline runs; tests can pass a StaticSource directly
+#
+#   from market_data import fetch_quotes
+#   quotes = fetch_quotes(["^NSEI", "^INDIAVIX"])   # {symbol: {"price", "previous_close", "trade_date", ...}}
+
+NIFTY = "^NSEI"
+INDIA_VIX = "^INDIAVIX"
+
+CACHE_PATH = os.getenv("MARKET_CACHE_PATH", "data/market_cache.json")
+CACHE_TTL_SECONDS = int(os.getenv("MARKET_CACHE_TTL", "300"))
+MARKET_DATA_SOURCE = os.getenv("MARKET_DATA_SOURCE", "yfinance")
+MARKET_DATA_FILE = os.getenv("MARKET_DATA_FILE", "data/market_quotes.json")
+
+
+def _number(x):
+    """float(x), or None for missing/NaN/inf values."""
+    try:
+        value = float(x)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) or math.isinf(value) else value
+
+
+# ======================
+# SOURCES
+# ======================
+
+class YFinanceSource:
+    name = "yfinance"
+
+    def fetch(self, symbol):
+        """(price, previous_close, trade_date) for one ticker; previous_close may be None.
+
+        Read from the daily bars, so the price comes with the session it belongs to
+        (on a weekend or holiday that is the last trading day, not today)."""
+        import yfinance as yf
+
+        hist = yf.Ticker(symbol).history(period="5d")
+        if hist.empty:
+            raise ValueError(f"No price data for {symbol}")
+        closes = hist["Close"]
+        trade_date = closes.index[-1].strftime("%Y-%m-%d")
+        return _number(closes.iloc[-1]), _number(closes.iloc[-2]) if len(closes) >= 2 else None, trade_date
+
+    def history(self, symbol, start, end=None):
+        """Daily closes from `start` (YYYY-MM-DD) as a pandas Series indexed by date."""
+        import yfinance as yf
+
+        hist = yf.Ticker(symbol).history(start=start, end=end, auto_adjust=False)
+        if hist.empty:
+            raise ValueError(f"No history for {symbol} since {start}")
+        closes = hist["Close"]
+        closes.index = closes.index.tz_localize(None).normalize()
+        return closes
+
+
+class StaticSource:
+    """Serves fixed quotes: {symbol: price or (price, previous_close[, trade_date])}. For offline runs and tests."""
+    name = "static"
+
+    def __init__(self, quotes):
+        self.quotes = quotes
+
+    def fetch(self, symbol):
+        if symbol not in self.quotes:
+            raise KeyError(f"No local quote for {symbol}")
+        quote = self.quotes[symbol]
+        if isinstance(quote, (list, tuple)):
+            return _number(quote[0]), _number(quote[1]), quote[2] if len(quote) > 2 else None
+        return _number(quote), None, None
+
+
+class LocalSource(StaticSource):
+    """StaticSource read from a JSON file, e.g. {"^NSEI": [22150.5, 22010.0, "2026-10-16"], "^INDIAVIX": 13.4}."""
+    name = "local"
+
+    def __init__(self, path=MARKET_DATA_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            super().__init__(json.load(f))
+
+
+def source_from_env(name=MARKET_DATA_SOURCE):
+    if name == "local":
+        return LocalSource()
+    if name != "yfinance":
+        print(f"⚠️ Unknown MARKET_DATA_SOURCE '{name}', using yfinance.")
+    return YFinanceSource()
+
+
+# ======================
+# DISK CACHE
+# ======================
+
+def _load_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path, cache):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)  # atomic, so an overlapping run never reads half a file
+
+
+# ======================
+# FETCH
+# ======================
+
+def _fetch_one(source, symbol):
+    start = time.perf_counter()
+    price, previous_close, trade_date = source.fetch(symbol)
+    if price is None:
+        raise ValueError(f"No price for {symbol}")
+    return {
+        "symbol": symbol,
+        "price": price,
+        "previous_close": previous_close,
+        "trade_date": trade_date,
+        "fetched_at": time.time(),
+        "source": source.name,
+        "latency_s": round(time.perf_counter() - start, 3),
+    }
+
+
+def fetch_quotes(symbols, source=None, ttl=CACHE_TTL_SECONDS, cache_path=CACHE_PATH):
+    """{symbol: quote} for every symbol that could be fetched (or served from cache).
+
+    Fresh cached quotes are reused; the rest are fetched in parallel. If a fetch fails,
+    the last cached quote is returned instead (marked "stale"), however old it is.
+    Pass cache_path=None to bypass the cache entirely.
+    """
+    source = source or source_from_env()
+    cache = _load_cache(cache_path) if cache_path else {}
+    now = time.time()
+
+    # Cache entries are per source, so switching to a local source never serves live quotes
+    key = lambda symbol: f"{source.name}:{symbol}"
+
+    quotes, missing = {}, []
+    for symbol in symbols:
+        cached = cache.get(key(symbol))
+        if cached and ttl > 0 and now - cached["fetched_at"] < ttl:
+            quotes[symbol] = dict(cached, cached=True)
+        else:
+            missing.append(symbol)
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing), thread_name_prefix="market") as executor:
+            futures = {symbol: executor.submit(_fetch_one, source, symbol) for symbol in missing}
+        for symbol, future in futures.items():
+            try:
+                quotes[symbol] = cache[key(symbol)] = future.result()
+            except Exception as e:
+                stale = cache.get(key(symbol))
+                if stale:
+                    print(f"⚠️ {symbol}: fetch failed ({e}), using cached quote from {int(now - stale['fetched_at'])}s ago")
+                    quotes[symbol] = dict(stale, cached=True, stale=True)
+                else:
+                    print(f"⚠️ {symbol}: fetch failed ({e})")
+        if cache_path:
+            _save_cache(cache_path, cache)
+
+    return quotes
+
+
+def fetch_history(symbols, start, end=None, source=None):
+    """{symbol: daily close Series}, one thread per symbol. Not cached: backfills are one-offs."""
+    source = source or source_from_env()
+    with ThreadPoolExecutor(max_workers=len(symbols), thread_name_prefix="market") as executor:
+        futures = {symbol: executor.submit(source.history, symbol, start, end) for symbol in symbols}
+    return {symbol: future.result() for symbol, future in futures.items()}
+
+
+def pct_change(quote):
+    """Day change in % from a quote, or None without a previous close."""
+    prev = quote.get("previous_close")
+    if not prev:
+        return None
+    return (quote["price"] - prev) / prev * 100
@@ -1,10 +1,13 @@
-import yfinance as yf
-import requests
 import datetime
 import math
 import sys
 import os
 
+from market_data import INDIA_VIX, NIFTY, fetch_quotes, pct_change
+from market_regime import COLORS, MOODS, fear_greed_scores, load_series, mood_bands, record_day
+from pipeline_schedule import IST
+from upload_codec import post_rows
+
 # Force UTF-8 output so emojis don't crash the console on Windows
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
@@ -14,105 +17,123 @@ BASE_API_URL = os.getenv("API_URL")
 if BASE_API_URL:
     API_URL = BASE_API_URL.replace("upload_predictions", "upload_market_meter")
 else:
-    try:
-        from ipo_predicition import API_URL as base_url
-        API_URL = base_url.replace("upload_predictions", "upload_market_meter")
-    except Exception:
-        API_URL = "http://localhost:8000/upload_market_meter"
+    API_URL = "http://localhost:8000/upload_market_meter"
+REGIME_API_URL = API_URL.replace("upload_market_meter", "upload_market_regime")
+REGIME_UPLOAD_DAYS = 5  # recent days re-sent each run; older history goes up via market_regime.py --upload
 
-print("\n" + "="*40)
-print("🔹 Market Condition & Fear/Greed Meter")
-print("="*40)
+# Used when a quote can't be fetched at all (and nothing is cached)
+FALLBACK_NIFTY = 22000.0
+FALLBACK_VIX = 14.0  # safe fallback
+
+# NSE closes at 15:30 IST; a session's quotes only become its daily close after that
+CLOSE_SETTLED_AT = datetime.time(15, 45)
 
 def safe_number(x):
     if math.isnan(float(x)) or math.isinf(float(x)):
         return 0.0
     return float(x)
 
-try:
-    # 1. Fetch Nifty 50 Data
-    nifty = yf.Ticker("^NSEI")
-    
-    # Use fast_info for more immediate current day stats
-    try:
-        current_nifty = nifty.fast_info['lastPrice']
-        prev_close = nifty.fast_info['previousClose']
-        nifty_pct_change = ((current_nifty - prev_close) / prev_close) * 100
-    except:
-        # Fallback to history if fast_info fails
-        n_hist = nifty.history(period="2d")
-        if len(n_hist) >= 2:
-            current_nifty = n_hist['Close'].iloc[-1]
-            prev_close = n_hist['Close'].iloc[-2]
-            nifty_pct_change = ((current_nifty - prev_close) / prev_close) * 100
-        else:
-            current_nifty = 22000.0
-            nifty_pct_change = 0.0
+def compute_meter(current_nifty, nifty_pct_change, current_vix):
+    """0-100 Fear & Greed score plus its label/colour, as the market_meter row.
 
-    # 2. Fetch India VIX Data
-    vix = yf.Ticker("^INDIAVIX")
-    v_hist = vix.history(period="1d")
-    if len(v_hist) >= 1:
-        current_vix = v_hist['Close'][-1]
-    else:
-        current_vix = 14.0 # safe fallback
-        
-    current_nifty = safe_number(current_nifty)
-    nifty_pct_change = safe_number(nifty_pct_change)
-    current_vix = safe_number(current_vix)
-
-    print(f"📉 NIFTY 50: {current_nifty:.2f} ({nifty_pct_change:+.2f}%)")
-    print(f"📊 INDIA VIX: {current_vix:.2f}")
-
-    # 3. Calculate 0-100 Fear & Greed Score
-    # Baseline: VIX of 10 gives a high score (Greed). VIX of 25 gives a low score (Fear).
-    base_score = 100 - (current_vix * 3.5)
-    
-    # Add momentum from daily Nifty change (+1% adds 20 points, -1% removes 20 points)
-    momentum_boost = nifty_pct_change * 20
-    
-    final_score = base_score + momentum_boost
-    
-    # Clamp score between 0 and 100
-    final_score = max(0, min(100, final_score))
-    
-    # 4. Determine Text Label
-    if final_score <= 25:
-        mood = "Extreme Fear"
-        color = "#ef4444"
-    elif final_score <= 45:
-        mood = "Fear"
-        color = "#f97316"
-    elif final_score <= 55:
-        mood = "Neutral"
-        color = "#eab308"
-    elif final_score <= 75:
-        mood = "Greed"
-        color = "#84cc16"
-    else:
-        mood = "Extreme Greed"
-        color = "#22c55e"
-
-    print(f"🌡️ MARKET SCORE: {final_score:.0f}/100 -> {mood}")
-
-    payload = {
+    Same formula as the backfilled history (market_regime.fear_greed_scores)."""
+    final_score = float(fear_greed_scores(current_vix, nifty_pct_change))
+    band = int(mood_bands(final_score))
+
+    return {
         "score": round(final_score),
-        "mood_label": mood,
-        "color": color,
+        "mood_label": MOODS[band],
+        "color": COLORS[band],
         "nifty_price": round(current_nifty, 2),
         "nifty_change_pct": round(nifty_pct_change, 2),
         "vix_value": round(current_vix, 2),
         "updated_at": datetime.datetime.now().isoformat()
     }
 
-    # 5. Send to Server
-    print(f"📡 Pushing to {API_URL}...")
-    resp = requests.post(API_URL, json=[payload])
-    
-    if resp.status_code == 200:
-        print("✅ SUCCESS: Market Meter updated.")
-    else:
-        print(f"❌ API ERROR: {resp.status_code} - {resp.text}")
-
-except Exception as e:
-    print(f"❌ FAULT: Failed to calculate Market Meter: {e}")
+def regime_day(quotes, fallback_used):
+    """Trading day (a date) whose close the quotes are, or None if they can't go into the daily
+    series: a fallback or stale quote, no trade date, the two indices on different sessions, or
+    a quote fetched before that session's close settled (e.g. by the 15:00 idle run)."""
+    nifty, vix = quotes.get(NIFTY), quotes.get(INDIA_VIX)
+    if fallback_used or not nifty or not vix or nifty.get("stale") or vix.get("stale"):
+        return None
+    if not nifty.get("trade_date") or nifty.get("trade_date") != vix.get("trade_date"):
+        return None
+    day = datetime.date.fromisoformat(nifty["trade_date"])
+    fetched = datetime.datetime.fromtimestamp(min(nifty["fetched_at"], vix["fetched_at"]), IST)
+    if fetched < datetime.datetime.combine(day, CLOSE_SETTLED_AT, tzinfo=IST):
+        return None
+    return day
+
+def main(source=None, post=True):
+    print("\n" + "="*40)
+    print("🔹 Market Condition & Fear/Greed Meter")
+    print("="*40)
+
+    try:
+        # 1. Fetch Nifty 50 and India VIX together (cached for a few minutes, see market_data.py)
+        quotes = fetch_quotes([NIFTY, INDIA_VIX], source=source)
+
+        nifty = quotes.get(NIFTY)
+        fallback_used = False
+        if nifty and pct_change(nifty) is not None:
+            current_nifty = nifty["price"]
+            nifty_pct_change = pct_change(nifty)
+        else:
+            current_nifty = nifty["price"] if nifty else FALLBACK_NIFTY
+            nifty_pct_change = 0.0
+            fallback_used = True
+
+        # 2. India VIX level
+        if INDIA_VIX in quotes:
+            current_vix = quotes[INDIA_VIX]["price"]
+        else:
+            current_vix = FALLBACK_VIX
+            fallback_used = True
+
+        current_nifty = safe_number(current_nifty)
+        nifty_pct_change = safe_number(nifty_pct_change)
+        current_vix = safe_number(current_vix)
+
+        cached = [s for s, q in quotes.items() if q.get("cached")]
+        if cached:
+            print(f"ℹ️ Reused cached quotes for {', '.join(cached)}")
+        print(f"📉 NIFTY 50: {current_nifty:.2f} ({nifty_pct_change:+.2f}%)")
+        print(f"📊 INDIA VIX: {current_vix:.2f}")
+
+        # 3. Calculate 0-100 Fear & Greed Score
+        payload = compute_meter(current_nifty, nifty_pct_change, current_vix)
+        print(f"🌡️ MARKET SCORE: {payload['score']}/100 -> {payload['mood_label']}")
+
+        # 👇 The daily regime series (kept locally, next to ipo_raw_data) only takes real closes,
+        #    keyed by the session the quotes belong to; the live meter above is sent either way
+        day = regime_day(quotes, fallback_used)
+        if day:
+            record_day(day, payload)
+            print(f"📅 Regime series: recorded the {day.isoformat()} close")
+        else:
+            print("ℹ️ Regime series: no settled close in these quotes (intraday, fallback or stale), not recorded")
+
+        if not post:
+            return payload
+
+        # 4. Send to Server
+        print(f"📡 Pushing to {API_URL}...")
+        resp = post_rows(API_URL, [payload])
+        
+        if resp.status_code == 200:
+            print("✅ SUCCESS: Market Meter updated.")
+        else:
+            print(f"❌ API ERROR: {resp.status_code} - {resp.text}")
+
+        recent = load_series().tail(REGIME_UPLOAD_DAYS)
+        resp = post_rows(REGIME_API_URL, recent.to_dict(orient="records"))
+        if resp.status_code != 200:
+            print(f"⚠️ Regime series not updated: {resp.status_code} - {resp.text}")
+        return payload
+
+    except Exception as e:
+        print(f"❌ FAULT: Failed to calculate Market Meter: {e}")
+
+if __name__ == "__main__":
+    main()
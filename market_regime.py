@@ -0,0 +1,241 @@
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# ======================
+# MARKET REGIME SERIES
+# ======================
+# One row per trading day: Nifty close, its day change, India VIX and the Fear & Greed
+# score/label. market_meter.py adds today's row on every run; years of history can be
+# backfilled in one vectorised pass:
+#
+#   python market_regime.py --backfill --start 2015-01-01           # from Yahoo
+#   python market_regime.py --backfill --csv regime.csv             # offline: date,nifty_close,vix_close
+#   python market_regime.py --show 10 [--upload]
+#
+# listing_regime() joins the series to ipo_raw_data by listing date (as of the last
+# trading day on or before it), so the regime can be used as a model feature.
+
+DB_PATH = "data/ipo_ml_withsme.db"
+
+API_URL = os.getenv("API_URL", "http://localhost:8000/upload_predictions").replace(
+    "upload_predictions", "upload_market_regime"
+)
+
+# Score bands (upper bound inclusive) -> label and dashboard colour
+MOOD_EDGES = [25, 45, 55, 75]
+MOODS = ["Extreme Fear", "Fear", "Neutral", "Greed", "Extreme Greed"]
+COLORS = ["#ef4444", "#f97316", "#eab308", "#84cc16", "#22c55e"]
+
+REGIME_COLUMNS = ["date", "nifty_close", "nifty_change_pct", "vix_close", "score", "mood_label", "color"]
+
+
+# ======================
+# SCORING (vectorised)
+# ======================
+
+def fear_greed_scores(vix, nifty_change_pct):
+    """0-100 Fear & Greed scores for arrays (or scalars) of VIX levels and Nifty day changes in %.
+
+    Baseline: VIX of 10 gives a high score (Greed), VIX of 25 a low one (Fear);
+    +1% on the Nifty adds 20 points, -1% removes 20."""
+    vix = np.asarray(vix, dtype=float)
+    pct = np.nan_to_num(np.asarray(nifty_change_pct, dtype=float))
+    return np.clip(100 - vix * 3.5 + pct * 20, 0, 100)
+
+
+def mood_bands(scores):
+    """Index into MOODS/COLORS for each score."""
+    return np.searchsorted(MOOD_EDGES, np.asarray(scores, dtype=float), side="left")
+
+
+def build_series(nifty_close, vix_close):
+    """Regime DataFrame from two daily close Series (indexed by date), one row per Nifty trading day."""
+    df = pd.DataFrame({"nifty_close": nifty_close}).join(pd.DataFrame({"vix_close": vix_close}), how="left")
+    df = df.sort_index()
+    df["vix_close"] = df["vix_close"].ffill()
+    df["nifty_change_pct"] = df["nifty_close"].pct_change() * 100
+    df = df.dropna(subset=["nifty_close", "vix_close"])
+
+    scores = fear_greed_scores(df["vix_close"].to_numpy(), df["nifty_change_pct"].to_numpy())
+    bands = mood_bands(scores)
+    df["score"] = np.round(scores).astype(int)
+    df["mood_label"] = np.asarray(MOODS)[bands]
+    df["color"] = np.asarray(COLORS)[bands]
+    df["nifty_change_pct"] = df["nifty_change_pct"].fillna(0.0).round(2)
+    df["nifty_close"] = df["nifty_close"].round(2)
+    df["vix_close"] = df["vix_close"].round(2)
+    df["date"] = pd.to_datetime(df.index).strftime("%Y-%m-%d")
+    return df.reset_index(drop=True)[REGIME_COLUMNS]
+
+
+# ======================
+# STORAGE
+# ======================
+
+def _connect(db_path):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS market_regime (
+        date TEXT PRIMARY KEY,
+        nifty_close REAL,
+        nifty_change_pct REAL,
+        vix_close REAL,
+        score INTEGER,
+        mood_label TEXT,
+        color TEXT
+    ) WITHOUT ROWID
+    """)
+    return conn
+
+
+def store_series(df, db_path=DB_PATH):
+    """Upsert regime rows (one per date). Returns the number of rows written."""
+    rows = df[REGIME_COLUMNS].itertuples(index=False, name=None)
+    conn = _connect(db_path)
+    try:
+        with conn:
+            cur = conn.executemany(f"""
+                INSERT INTO market_regime ({", ".join(REGIME_COLUMNS)}) VALUES ({", ".join("?" for _ in REGIME_COLUMNS)})
+                ON CONFLICT(date) DO UPDATE SET
+                {", ".join(f"{c} = excluded.{c}" for c in REGIME_COLUMNS if c != "date")}
+            """, [(d, float(n), float(p), float(v), int(s), m, c) for d, n, p, v, s, m, c in rows])
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+def record_day(day, payload, db_path=DB_PATH):
+    """Store today's market_meter payload as the regime row for `day` (a date)."""
+    row = {
+        "date": day.isoformat(),
+        "nifty_close": payload["nifty_price"],
+        "nifty_change_pct": payload["nifty_change_pct"],
+        "vix_close": payload["vix_value"],
+        "score": payload["score"],
+        "mood_label": payload["mood_label"],
+        "color": payload["color"],
+    }
+    return store_series(pd.DataFrame([row]), db_path)
+
+
+def load_series(db_path=DB_PATH, since=None):
+    conn = _connect(db_path)
+    try:
+        query = "SELECT * FROM market_regime"
+        params = ()
+        if since:
+            query += " WHERE date >= ?"
+            params = (since,)
+        return pd.read_sql(query + " ORDER BY date", conn, params=params)
+    finally:
+        conn.close()
+
+
+# ======================
+# JOIN TO IPOs
+# ======================
+
+def listing_days(listing_date, reference):
+    """Vectorised '18-Jun' + reference timestamp (e.g. scraped_at) -> datetime64 listing days.
+
+    The year comes from the reference, moved across a year boundary the same way as
+    ipo_parsing.parse_day (Nov/Dec listings seen in Jan/Feb, and the reverse)."""
+    ref = pd.to_datetime(reference, errors="coerce")
+    text = listing_date.astype(str).str.split("\n").str[0].str.strip()
+    parsed = pd.to_datetime(text + "-2000", format="%d-%b-%Y", errors="coerce")  # 2000: leap year, so 29-Feb parses
+    year = ref.dt.year
+    year = year.where(~(ref.dt.month.isin([1, 2]) & parsed.dt.month.isin([11, 12])), year - 1)
+    year = year.where(~(ref.dt.month.isin([11, 12]) & parsed.dt.month.isin([1, 2])), year + 1)
+    return pd.to_datetime(
+        pd.DataFrame({"year": year, "month": parsed.dt.month, "day": parsed.dt.day}), errors="coerce"
+    )
+
+
+def join_regime(ipos, series, on="listing_day"):
+    """Attach the regime as of the last trading day on or before `on` to each IPO row (one merge, no per-IPO lookups)."""
+    regime = series.assign(regime_date=pd.to_datetime(series["date"]).astype("datetime64[ns]")).drop(columns=["date", "color"])
+    regime = regime.rename(columns={c: f"market_{c}" for c in regime.columns if c != "regime_date"})
+    left = ipos.reset_index(drop=True)
+    left[on] = pd.to_datetime(left[on]).astype("datetime64[ns]")  # merge_asof needs matching resolutions
+    left["_order"] = np.arange(len(left))
+    known = left[left[on].notna()].sort_values(on)
+    merged = pd.merge_asof(known, regime.sort_values("regime_date"), left_on=on, right_on="regime_date", direction="backward")
+    merged = pd.concat([merged, left[left[on].isna()]], ignore_index=True)
+    return merged.sort_values("_order").drop(columns=["_order"]).reset_index(drop=True)
+
+
+def listing_regime(db_path=DB_PATH):
+    """ipo_raw_data joined to the market regime on each IPO's listing date."""
+    conn = sqlite3.connect(db_path)
+    try:
+        ipos = pd.read_sql("SELECT ipo_name, listing_date, scraped_at, is_listed FROM ipo_raw_data", conn)
+    finally:
+        conn.close()
+    ipos["listing_day"] = listing_days(ipos["listing_date"], ipos["scraped_at"])
+    return join_regime(ipos, load_series(db_path))
+
+
+# ======================
+# CLI
+# ======================
+
+def backfill(start, csv_path=None, db_path=DB_PATH):
+    if csv_path:
+        raw = pd.read_csv(csv_path, parse_dates=["date"]).set_index("date")
+        nifty, vix = raw["nifty_close"], raw["vix_close"]
+    else:
+        from market_data import INDIA_VIX, NIFTY, fetch_history
+        closes = fetch_history([NIFTY, INDIA_VIX], start)
+        nifty, vix = closes[NIFTY], closes[INDIA_VIX]
+
+    t0 = datetime.now()
+    series = build_series(nifty, vix)
+    written = store_series(series, db_path)
+    elapsed = (datetime.now() - t0).total_seconds()
+    print(f"✅ Backfilled {written} trading days ({series['date'].iloc[0]} to {series['date'].iloc[-1]}) in {elapsed:.2f}s")
+    return series
+
+
+def upload(series):
+    from upload_codec import post_rows
+    print(f"📡 Pushing {len(series)} regime rows to {API_URL}...")
+    resp = post_rows(API_URL, series.to_dict(orient="records"))
+    if resp.status_code == 200:
+        print(f"✅ SUCCESS: {resp.json()}")
+    else:
+        print(f"❌ API ERROR: {resp.status_code} - {resp.text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily market regime (Nifty, VIX, Fear & Greed) series")
+    parser.add_argument("--backfill", action="store_true", help="fetch and score the whole history in one pass")
+    parser.add_argument("--start", default="2015-01-01", help="backfill start date (YYYY-MM-DD)")
+    parser.add_argument("--csv", help="backfill from a CSV (date,nifty_close,vix_close) instead of Yahoo")
+    parser.add_argument("--show", type=int, default=0, help="print the last N days")
+    parser.add_argument("--upload", action="store_true", help="push the series to the API for charting")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill(args.start, args.csv)
+
+    series = load_series()
+    if args.show:
+        print(series.tail(args.show).to_string(index=False))
+    if args.upload:
+        upload(series)
+    if not (args.backfill or args.show or args.upload):
+        print(f"[*] market_regime: {len(series)} days stored. Use --backfill, --show N or --upload.")
+
+
+if __name__ == "__main__":
+    main()
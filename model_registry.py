@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+import joblib
+
+from features import model_features
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# ======================
+# MODEL REGISTRY
+# ======================
+# Every train_dl.py run writes models/<version>/ (model, scaler, config.json, metrics.json)
+# plus a manifest.json with the feature list and a content hash of the artifacts.
+# models/CURRENT names the version in use; the predictor, the scorer and any long-running
+# process read it through ModelRegistry, which reloads as soon as the pointer changes.
+#
+#   python model_registry.py                       # what is live
+#   python model_registry.py --list
+#   python model_registry.py --promote 20261001-1234
+#   python model_registry.py --verify 20261001-1234
+#
+# Without a CURRENT pointer (or if it names a missing version) the loose ipo_dl_model.h5 +
+# scaler.pkl in the repo root are used as version "legacy", so older checkouts keep working.
+#
+# Predictions carry model_version, and prediction_cache keys on the content hash: promoting
+# a model (or rolling back) re-predicts exactly once.
+
+MODELS_DIR = "models"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+MODEL_FILE = "ipo_dl_model.h5"
+SCALER_FILE = "scaler.pkl"
+
+# Hashed into the manifest when present (model + scaler are required)
+ARTIFACTS = [MODEL_FILE, "ipo_dl_model.keras", SCALER_FILE, "config.json", "metrics.json"]
+
+LEGACY_VERSION = "legacy"
+LEGACY_MODEL_PATH = MODEL_FILE
+LEGACY_SCALER_PATH = SCALER_FILE
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(file_hashes):
+    """Short hash over {file name: sha256}: identifies the model artifacts, not where they live."""
+    raw = json.dumps(sorted(file_hashes.items()))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+# ======================
+# MANIFESTS
+# ======================
+
+def write_manifest(version_dir):
+    """Hash the artifacts of one version folder into its manifest.json. Returns the manifest."""
+    for required in (MODEL_FILE, SCALER_FILE):
+        if not os.path.exists(os.path.join(version_dir, required)):
+            raise FileNotFoundError(f"{version_dir} has no {required}")
+
+    config, metrics = {}, {}
+    if os.path.exists(os.path.join(version_dir, "config.json")):
+        with open(os.path.join(version_dir, "config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+    if os.path.exists(os.path.join(version_dir, "metrics.json")):
+        with open(os.path.join(version_dir, "metrics.json"), encoding="utf-8") as f:
+            metrics = json.load(f)
+
+    files = {
+        name: file_sha256(os.path.join(version_dir, name))
+        for name in ARTIFACTS if os.path.exists(os.path.join(version_dir, name))
+    }
+    features = config.get("features") or model_features(joblib.load(os.path.join(version_dir, SCALER_FILE)))
+    manifest = {
+        "version": os.path.basename(os.path.normpath(version_dir)),
+        "features": list(features),
+        "files": files,
+        "content_hash": content_hash(files),
+        "baseline": metrics.get("baseline"),
+        "created_at": datetime.now().isoformat(),
+    }
+    with open(os.path.join(version_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(version_dir):
+    with open(os.path.join(version_dir, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify(version_dir):
+    """Artifact files whose content no longer matches the manifest (empty list = intact)."""
+    manifest = read_manifest(version_dir)
+    bad = []
+    for name, expected in manifest["files"].items():
+        path = os.path.join(version_dir, name)
+        if not os.path.exists(path) or file_sha256(path) != expected:
+            bad.append(name)
+    return bad
+
+
+def list_versions(models_dir=MODELS_DIR):
+    if not os.path.isdir(models_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(models_dir)
+        if os.path.exists(os.path.join(models_dir, name, MANIFEST_FILE))
+    )
+
+
+# ======================
+# CURRENT POINTER
+# ======================
+
+def current_version(models_dir=MODELS_DIR):
+    """Version named by models/CURRENT, or None."""
+    try:
+        with open(os.path.join(models_dir, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def promote(version, models_dir=MODELS_DIR):
+    """Point models/CURRENT at `version` (after checking its artifacts against the manifest)."""
+    version_dir = os.path.join(models_dir, version)
+    if not os.path.exists(os.path.join(version_dir, MANIFEST_FILE)):
+        raise FileNotFoundError(f"{version_dir} has no {MANIFEST_FILE}")
+    bad = verify(version_dir)
+    if bad:
+        raise ValueError(f"{version} artifacts changed since training: {', '.join(bad)}")
+
+    # Atomic swap: a process reading the pointer sees either the old version or the new one
+    path = os.path.join(models_dir, CURRENT_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, path)
+    print(f"✅ models/{CURRENT_FILE} -> {version}")
+
+
+# ======================
+# LOADING
+# ======================
+
+class ActiveModel:
+    """One loaded model version: scaler and features up front, TensorFlow only on first predict."""
+
+    def __init__(self, version, model_path, scaler_path, content_hash, features=None):
+        self.version = version
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.content_hash = content_hash
+        self.scaler = joblib.load(scaler_path)
+        self.features = list(features) if features else model_features(self.scaler)
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                # TensorFlow is only imported when some IPO actually needs a fresh prediction
+                from tensorflow.keras.models import load_model
+                self._model = load_model(self.model_path)
+                print(f"✅ Model {self.version} loaded")
+            return self._model
+
+    def predict(self, frame):
+        """Probabilities for a DataFrame holding (at least) self.features."""
+        X_scaled = self.scaler.transform(frame[self.features])
+        return self.model.predict(X_scaled).flatten()
+
+
+def load_version(version, models_dir=MODELS_DIR):
+    version_dir = os.path.join(models_dir, version)
+    manifest = read_manifest(version_dir)
+    return ActiveModel(
+        version,
+        os.path.join(version_dir, MODEL_FILE),
+        os.path.join(version_dir, SCALER_FILE),
+        manifest["content_hash"],
+        manifest.get("features"),
+    )
+
+
+def load_legacy():
+    if not os.path.exists(LEGACY_MODEL_PATH) or not os.path.exists(LEGACY_SCALER_PATH):
+        raise FileNotFoundError("Model or scaler file not found")
+    files = {name: file_sha256(name) for name in (LEGACY_MODEL_PATH, LEGACY_SCALER_PATH)}
+    return ActiveModel(LEGACY_VERSION, LEGACY_MODEL_PATH, LEGACY_SCALER_PATH, content_hash(files))
+
+
+def load_current(models_dir=MODELS_DIR):
+    version = current_version(models_dir)
+    if version is None:
+        return load_legacy()
+    if not os.path.exists(os.path.join(models_dir, version, MANIFEST_FILE)):
+        print(f"⚠️ models/{CURRENT_FILE} points to missing version '{version}', using the legacy model")
+        return load_legacy()
+    return load_version(version, models_dir)
+
+
+class ModelRegistry:
+    """Serves the CURRENT model and swaps it when the pointer changes (no restart needed).
+
+    Each current() call re-reads the one-line pointer file; the model is only reloaded
+    when the named version differs. A version that fails to load leaves the old one serving."""
+
+    def __init__(self, models_dir=MODELS_DIR):
+        self.models_dir = models_dir
+        self._active = None
+        self._pointer = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        pointer = current_version(self.models_dir)
+        with self._lock:
+            if self._active is None or pointer != self._pointer:
+                try:
+                    active = load_current(self.models_dir)
+                except Exception as e:
+                    if self._active is None:
+                        raise
+                    print(f"⚠️ Could not load model '{pointer}', still serving {self._active.version}: {e}")
+                else:
+                    if self._active is not None and active.version != self._active.version:
+                        print(f"🔄 Model switched: {self._active.version} -> {active.version}")
+                    self._active = active
+                self._pointer = pointer
+            return self._active
+
+
+registry = ModelRegistry()
+
+
+def current_model():
+    """The live model (process-wide registry)."""
+    return registry.current()
+
+
+# ======================
+# CLI
+# ======================
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned model artifacts and the CURRENT pointer")
+    parser.add_argument("--models-dir", default=MODELS_DIR)
+    parser.add_argument("--list", action="store_true", help="list trained versions")
+    parser.add_argument("--promote", metavar="VERSION", help="make VERSION the live model")
+    parser.add_argument("--verify", metavar="VERSION", help="check VERSION's artifacts against its manifest")
+    parser.add_argument("--manifest", metavar="VERSION", help="(re)write VERSION's manifest.json")
+    args = parser.parse_args()
+
+    if args.manifest:
+        manifest = write_manifest(os.path.join(args.models_dir, args.manifest))
+        print(f"✅ Manifest written: {manifest['version']} [{manifest['content_hash']}]")
+    if args.verify:
+        bad = verify(os.path.join(args.models_dir, args.verify))
+        print(f"❌ Changed or missing: {', '.join(bad)}" if bad else f"✅ {args.verify} matches its manifest")
+    if args.promote:
+        promote(args.promote, args.models_dir)
+    if args.list:
+        live = current_version(args.models_dir)
+        for version in list_versions(args.models_dir):
+            manifest = read_manifest(os.path.join(args.models_dir, version))
+            accuracy = (manifest.get("baseline") or {}).get("accuracy")
+            print(f"{'*' if version == live else ' '} {version}  [{manifest['content_hash']}]"
+                  f"  {len(manifest['features'])} features" + (f"  acc {accuracy:.3f}" if accuracy is not None else ""))
+
+    active = load_current(args.models_dir)
+    print(f"[*] Live model: {active.version} [{active.content_hash}] ({len(active.features)} features)")
+
+
+if __name__ == "__main__":
+    main()
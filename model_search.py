@@ -0,0 +1,268 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.preprocessing import StandardScaler
+
+from features import BASE_FEATURES, MARKET_FEATURES
+from train_dl import DB_PATH, MIN_MARKET_COVERAGE, MODELS_DIR, load_rows, market_coverage, prepare
+
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# =====================================================
+# MODEL SEARCH
+# =====================================================
+# Evaluates many model configurations on the same time-ordered data train_dl.py uses,
+# one configuration per worker process (CPU only), with TimeSeriesSplit cross-validation:
+# every fold trains on older IPOs and scores the next, newer block.
+#
+#   python model_search.py                      # full grid, all cores
+#   python model_search.py --quick --workers 4  # a few configs of each kind
+#   python model_search.py --no-nn              # sklearn baselines only (no TensorFlow needed)
+#
+# Besides AUC, each config is scored the way production uses it: precision/recall of the
+# model alone at PROB_THRESHOLD, and of the full INVEST decision (anchor + GMP rules +
+# probability), plus serving cost (µs per prediction, parameter count).
+# Results go to models/search-<timestamp>.json.
+
+# Production decision thresholds (ipo_predicition.py)
+PROB_THRESHOLD = 0.70
+GMP_MIN = 5.0
+GMP_AUTO_INVEST = 15.0
+
+NN_GRID = {
+    "layers": [(32, 16), (16,), (64, 32), (8,)],
+    "dropout": [0.0, 0.2],
+    "learning_rate": [1e-3, 3e-3],
+    "class_weight": [None, "balanced"],
+}
+GBT_GRID = {
+    "max_depth": [2, 3, None],
+    "learning_rate": [0.05, 0.1],
+    "max_iter": [100, 300],
+    "class_weight": [None, "balanced"],
+}
+LR_GRID = {
+    "C": [0.1, 1.0, 10.0],
+    "class_weight": [None, "balanced"],
+}
+
+
+def _grid(kind, grid):
+    keys = list(grid)
+    return [{"kind": kind, **dict(zip(keys, values))} for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def build_configs(include_nn=True, quick=False):
+    configs = _grid("lr", LR_GRID) + _grid("gbt", GBT_GRID)
+    if include_nn:
+        configs += _grid("nn", NN_GRID)
+    if quick:
+        # First two of each kind: a smoke test of the whole harness
+        by_kind = {}
+        for config in configs:
+            by_kind.setdefault(config["kind"], []).append(config)
+        configs = [c for group in by_kind.values() for c in group[:2]]
+    return configs
+
+
+def config_name(config):
+    return " ".join(f"{k}={v}" for k, v in config.items() if k != "kind").join([f"{config['kind']}(", ")"])
+
+
+# =====================================================
+# MODELS (built inside the worker process)
+# =====================================================
+
+def _class_weights(y, mode):
+    if mode != "balanced":
+        return None
+    counts = np.bincount(y, minlength=2)
+    return {c: len(y) / (2 * counts[c]) for c in (0, 1) if counts[c]}
+
+
+def _fit_predict(config, X_train, y_train, X_test, epochs, seed):
+    """Fit one config on one fold. Returns (test probabilities, µs per predicted row, parameter count)."""
+    kind = config["kind"]
+    if kind == "lr":
+        from sklearn.linear_model import LogisticRegression
+        model = LogisticRegression(C=config["C"], class_weight=config["class_weight"], max_iter=1000)
+        model.fit(X_train, y_train)
+        n_params = model.coef_.size + model.intercept_.size
+        predict = lambda X: model.predict_proba(X)[:, 1]
+    elif kind == "gbt":
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        model = HistGradientBoostingClassifier(
+            max_depth=config["max_depth"], learning_rate=config["learning_rate"], max_iter=config["max_iter"],
+            class_weight=config["class_weight"], random_state=seed,
+        )
+        model.fit(X_train, y_train)
+        n_params = sum(len(p.nodes) for stage in model._predictors for p in stage)  # tree nodes
+        predict = lambda X: model.predict_proba(X)[:, 1]
+    else:
+        import tensorflow as tf
+        from tensorflow.keras.layers import Dense, Dropout
+        from tensorflow.keras.models import Sequential
+
+        tf.random.set_seed(seed)
+        layers = []
+        for i, width in enumerate(config["layers"]):
+            kwargs = {"input_shape": (X_train.shape[1],)} if i == 0 else {}
+            layers.append(Dense(width, activation="relu", **kwargs))
+            if config["dropout"]:
+                layers.append(Dropout(config["dropout"]))
+        layers.append(Dense(1, activation="sigmoid"))
+        model = Sequential(layers)
+        model.compile(optimizer=tf.keras.optimizers.Adam(config["learning_rate"]), loss="binary_crossentropy")
+        early_stop = tf.keras.callbacks.EarlyStopping(monitor="loss", patience=10, restore_best_weights=True)
+        model.fit(
+            X_train, y_train, epochs=epochs, batch_size=32, verbose=0, callbacks=[early_stop],
+            class_weight=_class_weights(y_train, config["class_weight"]),
+        )
+        n_params = model.count_params()
+        predict = lambda X: model.predict(X, verbose=0).flatten()
+
+    start = time.perf_counter()
+    prob = predict(X_test)
+    us_per_row = (time.perf_counter() - start) * 1e6 / max(len(X_test), 1)
+    return prob, us_per_row, int(n_params)
+
+
+def _decision(prob, gmp_pct, has_anchor):
+    """Production INVEST rule (ipo_predicition.py) on arrays."""
+    auto = gmp_pct >= GMP_AUTO_INVEST
+    model_pick = (gmp_pct >= GMP_MIN) & (gmp_pct < GMP_AUTO_INVEST) & (prob >= PROB_THRESHOLD)
+    return ((has_anchor == 1) & (auto | model_pick)).astype(int)
+
+
+def evaluate_config(config, X, y, gmp_pct, has_anchor, n_splits, epochs, seed):
+    """Cross-validate one config over TimeSeriesSplit folds (runs in a worker process)."""
+    if config["kind"] == "nn":
+        # One core per worker: the pool provides the parallelism
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(1)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    started = time.perf_counter()
+    folds = []
+    for train_idx, test_idx in TimeSeriesSplit(n_splits=n_splits).split(X):
+        scaler = StandardScaler().fit(X[train_idx])
+        X_train, X_test = scaler.transform(X[train_idx]), scaler.transform(X[test_idx])
+        y_train, y_test = y[train_idx], y[test_idx]
+        if len(np.unique(y_train)) < 2:
+            continue
+
+        prob, us_per_row, n_params = _fit_predict(config, X_train, y_train, X_test, epochs, seed)
+        model_pred = (prob >= PROB_THRESHOLD).astype(int)
+        decision = _decision(prob, gmp_pct[test_idx], has_anchor[test_idx])
+        folds.append({
+            "auc": roc_auc_score(y_test, prob) if len(np.unique(y_test)) > 1 else np.nan,
+            "precision_at_threshold": precision_score(y_test, model_pred, zero_division=0),
+            "recall_at_threshold": recall_score(y_test, model_pred, zero_division=0),
+            "decision_precision": precision_score(y_test, decision, zero_division=0),
+            "decision_recall": recall_score(y_test, decision, zero_division=0),
+            "invest_picks": int(decision.sum()),
+            "us_per_row": us_per_row,
+            "n_params": n_params,
+        })
+
+    result = {"name": config_name(config), "config": config, "folds": len(folds), "fit_s": time.perf_counter() - started}
+    if folds:
+        frame = pd.DataFrame(folds)
+        for col in frame.columns:
+            result[col] = float(frame[col].mean()) if col != "invest_picks" else int(frame[col].sum())
+        result["auc_std"] = float(frame["auc"].std(ddof=0))
+    return result
+
+
+# =====================================================
+# MAIN
+# =====================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel model/hyperparameter search with time-series CV")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--parquet", help="search on a Parquet snapshot (see train_dl.py --export-parquet)")
+    parser.add_argument("--no-market", action="store_true", help="base features only")
+    parser.add_argument("--no-nn", action="store_true", help="skip the TensorFlow configs")
+    parser.add_argument("--quick", action="store_true", help="two configs per model kind")
+    parser.add_argument("--splits", type=int, default=5, help="TimeSeriesSplit folds")
+    parser.add_argument("--epochs", type=int, default=100, help="max epochs per NN fold (early stopping on loss)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--top", type=int, default=15, help="rows to print")
+    parser.add_argument("--out", default=MODELS_DIR)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = load_rows(None if args.parquet else args.db, args.parquet)
+    features = list(BASE_FEATURES)
+    if not args.no_market:
+        # Same rule as train_dl.py: no market features without a regime series behind them
+        coverage = market_coverage(rows, args.db)
+        if coverage >= MIN_MARKET_COVERAGE:
+            features += MARKET_FEATURES
+        else:
+            print(f"⚠️ Regime series covers {coverage:.0%} of listings: searching without market features.")
+    df = prepare(rows, features, args.db, bool(args.parquet))
+    if len(df) < (args.splits + 1) * 2:
+        raise SystemExit(f"❌ Only {len(df)} usable rows, too few for {args.splits} folds")
+
+    X = df[features].to_numpy(dtype=float)
+    y = df["target"].to_numpy(dtype=int)
+    gmp_pct = df["gmp_pct"].to_numpy(dtype=float)
+    has_anchor = df["has_anchor"].to_numpy(dtype=float)
+
+    configs = build_configs(include_nn=not args.no_nn, quick=args.quick)
+    print(f"🔹 {len(configs)} configs x {args.splits} folds on {len(df)} IPOs ({len(features)} features), {args.workers} workers")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(evaluate_config, config, X, y, gmp_pct, has_anchor, args.splits, args.epochs, args.seed): config
+            for config in configs
+        }
+        for i, future in enumerate(as_completed(futures), start=1):
+            config = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ [{i}/{len(configs)}] {config_name(config)}: {e}")
+                continue
+            results.append(result)
+            print(f"   [{i}/{len(configs)}] {result['name']}: AUC {result.get('auc', float('nan')):.3f} ({result['fit_s']:.1f}s)")
+
+    if not results:
+        raise SystemExit("❌ No config finished")
+
+    table = pd.DataFrame(results).sort_values(["auc", "decision_precision"], ascending=False)
+    cols = ["name", "auc", "auc_std", "precision_at_threshold", "recall_at_threshold",
+            "decision_precision", "decision_recall", "invest_picks", "us_per_row", "n_params", "fit_s"]
+    print(f"\n📊 Top {args.top} by AUC (production thresholds: prob ≥ {PROB_THRESHOLD}, GMP {GMP_MIN}-{GMP_AUTO_INVEST}%):")
+    print(table[[c for c in cols if c in table]].head(args.top).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(args.out, f"search-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "features": features,
+            "rows": len(df),
+            "splits": args.splits,
+            "thresholds": {"prob": PROB_THRESHOLD, "gmp_min": GMP_MIN, "gmp_auto_invest": GMP_AUTO_INVEST},
+            "results": table.replace({np.nan: None}).to_dict(orient="records"),
+        }, f, indent=2, default=str)
+    print(f"\n✅ {len(results)} configs evaluated in {time.perf_counter() - started:.1f}s -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
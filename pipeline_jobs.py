@@ -0,0 +1,137 @@
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# ======================
+# PIPELINE JOB RUNNER (Web Service)
+# ======================
+# /refresh-pipeline used to spawn a fresh `python run_pipeline.py` per click.
+# This runner keeps at most one run in flight on a single worker thread:
+# clicks during a run join it, clicks shortly after a run are rate-limited,
+# and the run's STEP banners are tracked so /pipeline-status can report
+# progress and timings. The raw log tail ("Sent alert for <IPO>" lines) shows
+# INVEST decisions, so snapshots only include it when the caller asks for it.
+
+PIPELINE_CMD = [sys.executable, "run_pipeline.py"]
+MIN_INTERVAL_SECONDS = int(os.getenv("PIPELINE_MIN_INTERVAL", "600"))
+LOG_TAIL_LINES = 40
+
+# Matches run_pipeline.py banners such as "🔹 STEP 2: Starting Predictor (ipo_predicition.py)"
+_STEP_RE = re.compile(r"STEP (\d+): (.+)$")
+
+
+def _now_iso():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class PipelineJobs:
+    def __init__(self, cmd=PIPELINE_CMD, min_interval=MIN_INTERVAL_SECONDS):
+        self.cmd = cmd
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline")
+        self._job = None
+        self._next_id = 1
+
+    def request_run(self, trigger="api"):
+        """Start a run, or join the in-flight one. Returns (outcome, job_snapshot)."""
+        with self._lock:
+            job = self._job
+            if job and job["state"] in ("queued", "running"):
+                job["coalesced_requests"] += 1
+                return "joined", self._snapshot(job)
+
+            if job and job["finished_ts"] and time.time() - job["finished_ts"] < self.min_interval:
+                snapshot = self._snapshot(job)
+                snapshot["retry_after"] = int(self.min_interval - (time.time() - job["finished_ts"]))
+                return "rate_limited", snapshot
+
+            job = {
+                "id": self._next_id,
+                "trigger": trigger,
+                "state": "queued",
+                "requested_at": _now_iso(),
+                "started_at": None,
+                "finished_at": None,
+                "finished_ts": None,
+                "duration_s": None,
+                "exit_code": None,
+                "coalesced_requests": 0,
+                "steps": [],
+                "log_tail": deque(maxlen=LOG_TAIL_LINES),
+            }
+            self._next_id += 1
+            self._job = job
+            self._executor.submit(self._run, job)
+            return "started", self._snapshot(job)
+
+    def status(self, include_log=False):
+        with self._lock:
+            return self._snapshot(self._job, include_log) if self._job else {"state": "idle"}
+
+    def _snapshot(self, job, include_log=False):
+        snap = {k: v for k, v in job.items() if k not in ("finished_ts", "log_tail")}
+        snap["steps"] = [{k: v for k, v in step.items() if k != "started_ts"} for step in job["steps"]]
+        if include_log:
+            snap["log_tail"] = list(job["log_tail"])
+        return snap
+
+    def _close_step(self, job, outcome):
+        if job["steps"] and job["steps"][-1]["finished_at"] is None:
+            step = job["steps"][-1]
+            step["finished_at"] = _now_iso()
+            step["duration_s"] = round(time.time() - step["started_ts"], 1)
+            if step["outcome"] == "running" or outcome == "failed":
+                step["outcome"] = outcome
+
+    def _run(self, job):
+        started = time.time()
+        with self._lock:
+            job["state"] = "running"
+            job["started_at"] = _now_iso()
+
+        exit_code = None
+        try:
+            proc = subprocess.Popen(
+                self.cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, encoding="utf-8", errors="replace", bufsize=1,
+                # Unbuffered so STEP banners arrive as they happen, not when the run ends
+                env={**os.environ, "PYTHONUNBUFFERED": "1", "PYTHONIOENCODING": "utf-8"},
+            )
+            for line in proc.stdout:
+                line = line.rstrip()
+                with self._lock:
+                    job["log_tail"].append(line)
+                    match = _STEP_RE.search(line)
+                    if match:
+                        self._close_step(job, "ok")
+                        job["steps"].append({
+                            "step": int(match.group(1)),
+                            "name": match.group(2).strip(),
+                            "started_at": _now_iso(),
+                            "started_ts": time.time(),
+                            "finished_at": None,
+                            "duration_s": None,
+                            "outcome": "running",
+                        })
+                    elif job["steps"] and ("❌" in line or "⚠️" in line):
+                        job["steps"][-1]["outcome"] = "warning"
+            exit_code = proc.wait()
+        except Exception as e:
+            with self._lock:
+                job["log_tail"].append(f"Runner error: {e}")
+
+        with self._lock:
+            self._close_step(job, "ok" if exit_code == 0 else "failed")
+            job["exit_code"] = exit_code
+            job["state"] = "succeeded" if exit_code == 0 else "failed"
+            job["finished_at"] = _now_iso()
+            job["finished_ts"] = time.time()
+            job["duration_s"] = round(time.time() - started, 1)
+        print(f"{'✅' if exit_code == 0 else '❌'} Pipeline job #{job['id']} {job['state']} in {job['duration_s']}s")
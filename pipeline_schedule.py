@@ -0,0 +1,90 @@
+import os
+import sqlite3
+from datetime import datetime, time as dtime, timedelta, timezone
+
+from ipo_parsing import parse_day
+from pipeline_state import get_state, set_state
+
+# ===========================
+# CONFIGURATION
+# ===========================
+
+DB_PATH = "data/ipo_ml_withsme.db"
+
+# GMP and subscription only move meaningfully while an IPO is bidding or listing,
+# so the cadence follows ipo_raw_data instead of a fixed clock:
+#   - any IPO open for bidding or listing today -> every ACTIVE_INTERVAL_MIN during market hours
+#   - nothing active                            -> once a day at IDLE_RUN_AT (picks up new IPOs)
+IST = timezone(timedelta(hours=5, minutes=30))
+MARKET_OPEN = dtime(9, 0)
+MARKET_CLOSE = dtime(17, 30)
+ACTIVE_INTERVAL_MIN = int(os.getenv("PIPELINE_ACTIVE_INTERVAL_MIN", "20"))
+IDLE_RUN_AT = dtime(15, 0)
+
+LAST_RUN_KEY = "last_run_at"
+
+
+def active_ipos(today, db_path=DB_PATH):
+    """Names of unlisted IPOs that are bidding or listing on `today` (an IST date)."""
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("""
+            SELECT ipo_name, open_date, close_date, listing_date FROM ipo_raw_data
+            WHERE is_listed = 0 OR is_listed IS NULL
+        """).fetchall()
+    except sqlite3.OperationalError:
+        return []  # ipo_raw_data not created yet
+    finally:
+        conn.close()
+
+    active = []
+    for name, open_s, close_s, listing_s in rows:
+        open_d, close_d, listing_d = (parse_day(s, today) for s in (open_s, close_s, listing_s))
+        bidding = open_d is not None and close_d is not None and open_d <= today <= close_d
+        if bidding or listing_d == today:
+            active.append(name)
+    return active
+
+
+def _next_market_slot(t):
+    """Earliest moment at or after `t` that falls inside weekday market hours."""
+    while True:
+        if t.weekday() < 5:
+            if t.time() < MARKET_OPEN:
+                return t.replace(hour=MARKET_OPEN.hour, minute=MARKET_OPEN.minute, second=0, microsecond=0)
+            if t.time() <= MARKET_CLOSE:
+                return t
+        t = (t + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_run(last_run=None, now=None, db_path=DB_PATH):
+    """When the pipeline should run next, and why. Returns (datetime in IST, reason)."""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    active = active_ipos(now.date(), db_path)
+
+    if active:
+        earliest = last_run + timedelta(minutes=ACTIVE_INTERVAL_MIN) if last_run else now
+        return _next_market_slot(max(earliest, now)), f"{len(active)} IPO(s) bidding/listing today"
+
+    idle_slot = datetime.combine(now.date(), IDLE_RUN_AT, tzinfo=IST)
+    if last_run is not None and last_run >= idle_slot:
+        idle_slot += timedelta(days=1)
+    return idle_slot, "no active IPOs, daily run"
+
+
+def last_run_at(db_path=DB_PATH):
+    value = get_state(LAST_RUN_KEY, db_path=db_path)
+    return datetime.fromisoformat(value).astimezone(IST) if value else None
+
+
+def mark_run(when=None, db_path=DB_PATH):
+    set_state(LAST_RUN_KEY, (when or datetime.now(IST)).isoformat(timespec="seconds"), db_path=db_path)
+
+
+def is_due(now=None, db_path=DB_PATH):
+    """(due, next_run_at, reason) for the current moment."""
+    now = (now or datetime.now(IST)).astimezone(IST)
+    run_at, reason = next_run(last_run_at(db_path), now, db_path)
+    return run_at <= now, run_at, reason
@@ -0,0 +1,88 @@
+import json
+import os
+import sqlite3
+
+# ===========================
+# CONFIGURATION
+# ===========================
+
+DB_PATH = "data/ipo_ml_withsme.db"
+
+# Small key/value table for bookkeeping the pipeline carries between runs
+# (last run time, live table fingerprint, ...). Lives next to ipo_raw_data so it travels with the DB.
+
+# Written by dail_scarper.py, read by run_pipeline.py to skip downstream steps on idle runs
+SCRAPE_CHANGED_KEY = "last_scrape_changed"
+# Per-row change set of the last scrape, read by the predictor and the scorer
+CHANGE_SET_KEY = "last_change_set"
+
+
+def _connect(db_path):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pipeline_state (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    return conn
+
+
+def get_state(key, default=None, db_path=DB_PATH):
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT value FROM pipeline_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+    finally:
+        conn.close()
+
+
+def set_state(key, value, db_path=DB_PATH):
+    conn = _connect(db_path)
+    try:
+        conn.execute("""
+            INSERT INTO pipeline_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+        """, (key, None if value is None else str(value)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ======================
+# CHANGE SET
+# ======================
+# {"new": [names], "changed": {name: [fields]}, "listed": [names], "closed": [names]}
+#   new     -> first time this IPO was scraped
+#   changed -> stored fields that moved in this scrape
+#   listed  -> became listed (or got its listing price) in this run
+#   closed  -> bidding window closed since the previous scrape (status flips without any field moving)
+
+
+def new_change_set():
+    return {"new": [], "changed": {}, "listed": [], "closed": []}
+
+
+def has_changes(changes):
+    return any(changes.get(k) for k in ("new", "changed", "listed", "closed"))
+
+
+def touched_names(changes, fields=None):
+    """Names that are new or had any of `fields` (default: any field) change."""
+    names = set(changes.get("new", []))
+    for name, changed_fields in changes.get("changed", {}).items():
+        if fields is None or set(changed_fields) & set(fields):
+            names.add(name)
+    return names
+
+
+def save_change_set(changes, db_path=DB_PATH):
+    set_state(CHANGE_SET_KEY, json.dumps(changes), db_path=db_path)
+
+
+def load_change_set(db_path=DB_PATH):
+    """Change set of the last scrape, or None if there isn't one (callers then process everything)."""
+    value = get_state(CHANGE_SET_KEY, db_path=db_path)
+    return json.loads(value) if value else None
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import sqlite3
+
+# ===========================
+# CONFIGURATION
+# ===========================
+
+DB_PATH = "data/ipo_ml_withsme.db"
+
+# Last model output per IPO, so a run only calls model.predict() for IPOs whose inputs moved.
+# Entries are keyed by a hash of the model inputs *and* the model's content hash (model_registry.py),
+# so a newly promoted model or a changed feature value can never serve a stale probability.
+#   scope "live"      -> ipo_predicition.py (unlisted IPOs)
+#   scope "scorecard" -> historical_scorer.py (listed IPOs)
+
+
+def input_hash(values, key):
+    raw = json.dumps([key, [None if v is None else float(v) for v in values]])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS prediction_cache (
+        scope TEXT NOT NULL,
+        ipo_name TEXT NOT NULL,
+        input_hash TEXT NOT NULL,
+        predicted_probability REAL,
+        predicted_at TEXT,
+        PRIMARY KEY (scope, ipo_name)
+    )
+    """)
+    return conn
+
+
+def load_cached(scope, db_path=DB_PATH):
+    """{ipo_name: (input_hash, predicted_probability, predicted_at)} for a scope."""
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT ipo_name, input_hash, predicted_probability, predicted_at FROM prediction_cache WHERE scope = ?",
+            (scope,),
+        ).fetchall()
+        return {name: (h, prob, at) for name, h, prob, at in rows}
+    finally:
+        conn.close()
+
+
+def store_predictions(scope, rows, db_path=DB_PATH):
+    """rows: iterable of (ipo_name, input_hash, predicted_probability, predicted_at)."""
+    conn = _connect(db_path)
+    try:
+        conn.executemany("""
+            INSERT INTO prediction_cache (scope, ipo_name, input_hash, predicted_probability, predicted_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(scope, ipo_name) DO UPDATE SET
+                input_hash = excluded.input_hash,
+                predicted_probability = excluded.predicted_probability,
+                predicted_at = excluded.predicted_at
+        """, [(scope, name, h, float(prob), at) for name, h, prob, at in rows])
+        conn.commit()
+    finally:
+        conn.close()
@@ -1,13 +1,25 @@
 import os
 import sys
 import time
+from datetime import datetime
+
+from pipeline_schedule import IST, is_due, mark_run
+from pipeline_state import SCRAPE_CHANGED_KEY, get_state
 
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
+# Daemon wakes at least this often to re-check the schedule (new IPOs can open in between)
+DAEMON_RECHECK_SECONDS = 15 * 60
+
 
-def run_all():
+def run_all(force=False):
     print("🚀 PIPELINE STARTED: Orchestrating your IPO workflow...")
+    # Recorded up front so a failing run still spaces out the retries
+    mark_run()
+    if force:
+        # Inherited by the scraper: ignore the stored fingerprint / HTTP validators
+        os.environ["FORCE_SCRAPE"] = "1"
 
     # --- STEP 1: RUN THE SCRAPER ---
     print("\n" + "="*40)
@@ -23,33 +35,38 @@ def run_all():
     else:
         print("✅ Scraper finished successfully.")
 
-    # Tiny pause to ensure file system sync
-    time.sleep(2)
+    # 👇 Nothing new on the live table -> predictions and scorecard would come out identical
+    changed = force or get_state(SCRAPE_CHANGED_KEY, "1") != "0"
+    if not changed:
+        print("\n⏭️ Live table unchanged since last run: skipping STEP 2 (Predictor) and STEP 3 (Scorecard).")
+    else:
+        # Tiny pause to ensure file system sync
+        time.sleep(2)
 
-    # --- STEP 2: RUN THE PREDICTOR ---
-    print("\n" + "="*40)
-    print("🔹 STEP 2: Starting Predictor (ipo_predicition.py)")
-    print("="*40)
+        # --- STEP 2: RUN THE PREDICTOR ---
+        print("\n" + "="*40)
+        print("🔹 STEP 2: Starting Predictor (ipo_predicition.py)")
+        print("="*40)
 
-    exit_code_2 = os.system("python ipo_predicition.py")
+        exit_code_2 = os.system("python ipo_predicition.py")
 
-    if exit_code_2 != 0:
-        print("❌ CRITICAL ERROR: Prediction script failed.")
-        sys.exit(1)
-    else:
-        print("✅ Predictor finished successfully.")
+        if exit_code_2 != 0:
+            print("❌ CRITICAL ERROR: Prediction script failed.")
+            sys.exit(1)
+        else:
+            print("✅ Predictor finished successfully.")
 
-    # --- STEP 3: RUN THE HISTORICAL SCORER ---
-    print("\n" + "="*40)
-    print("🔹 STEP 3: Starting Scorecard Generator (historical_scorer.py)")
-    print("="*40)
+        # --- STEP 3: RUN THE HISTORICAL SCORER ---
+        print("\n" + "="*40)
+        print("🔹 STEP 3: Starting Scorecard Generator (historical_scorer.py)")
+        print("="*40)
 
-    exit_code_3 = os.system("python historical_scorer.py")
+        exit_code_3 = os.system("python historical_scorer.py")
 
-    if exit_code_3 != 0:
-        print("⚠️ WARNING: Historical Scorecard script failed, but continuing.")
-    else:
-        print("✅ Scorecard Generator finished successfully.")
+        if exit_code_3 != 0:
+            print("⚠️ WARNING: Historical Scorecard script failed, but continuing.")
+        else:
+            print("✅ Scorecard Generator finished successfully.")
 
     # --- STEP 4: RUN THE MARKET METER ---
     print("\n" + "="*40)
@@ -65,20 +82,43 @@ def run_all():
 
     print("\n✨ PIPELINE COMPLETE: All data scraped and sent to API.")
 
+def run_daemon():
+    print("🕒 Running in Daemon Mode. Cadence adapts to IPO bidding/listing windows:")
+    print("   every ~20 min in market hours while an IPO is active, otherwise daily at 15:00 IST.")
+    while True:
+        due, run_at, reason = is_due()
+        if due:
+            print(f"\n⏰ Pipeline due ({reason}).")
+            try:
+                run_all()
+            except SystemExit:
+                # run_all exits on a critical failure; the daemon keeps going until the next slot
+                print("⚠️ Pipeline run failed, waiting for the next slot.")
+            continue
+
+        wait = (run_at - datetime.now(IST)).total_seconds()
+        print(f"💤 Next run at {run_at:%Y-%m-%d %H:%M} IST ({reason}).")
+        time.sleep(max(1, min(wait, DAEMON_RECHECK_SECONDS)))
+
+
 if __name__ == "__main__":
     if "--daemon" in sys.argv:
-        print("🕒 Running in Daemon Mode. Pipeline is scheduled to run daily at 15:00 (3 PM).")
-        print("   To change the time, edit 'run_pipeline.py'.")
-        try:
-            import schedule
-        except ImportError:
-            print("❌ Please run: pip install schedule")
-            sys.exit(1)
-            
-        schedule.every().day.at("15:00").do(run_all)
-        
-        while True:
-            schedule.run_pending()
-            time.sleep(60)
+        run_daemon()
+    elif "--check-due" in sys.argv:
+        # Used by the scheduled workflow: report whether a run is due without running it
+        due, run_at, reason = is_due()
+        if due:
+            print(f"✅ Pipeline due ({reason}).")
+        else:
+            print(f"💤 Not due until {run_at:%Y-%m-%d %H:%M} IST ({reason}).")
+        if os.getenv("GITHUB_OUTPUT"):
+            with open(os.environ["GITHUB_OUTPUT"], "a") as f:
+                f.write(f"due={'true' if due else 'false'}\n")
+    elif "--if-due" in sys.argv:
+        due, run_at, reason = is_due()
+        if due:
+            run_all(force="--force" in sys.argv)
+        else:
+            print(f"💤 Skipping: next run at {run_at:%Y-%m-%d %H:%M} IST ({reason}).")
     else:
-        run_all()
+        run_all(force="--force" in sys.argv)
@@ -0,0 +1,96 @@
+import base64
+import os
+import sys
+import tempfile
+
+# Pages through /today while a new snapshot upload lands between pages, on a throwaway DB:
+#   python scratch/test_today_pagination.py
+# Exits non-zero when a row is skipped, repeated or out of order, or when the cursor gives
+# the paywalled probability away.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+os.chdir(tempfile.mkdtemp())
+os.makedirs("data")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app  # noqa: E402
+
+VIP_KEY = "pagination-check"
+PAGE = 3
+
+
+def snapshot(probabilities):
+    return [
+        {"ipo_name": name, "predicted_probability": prob, "gmp_pct": 10.0, "status": "active",
+         "predicted_at": "2026-10-19T10:00:00"}
+        for name, prob in probabilities.items()
+    ]
+
+
+def sort_key(row):
+    # /today order: probability DESC with NULLs last, then name
+    prob = row["predicted_probability"]
+    return (prob is None or prob == "", -(prob or 0), row["ipo_name"])
+
+
+def main():
+    failures = []
+    with TestClient(app.app) as client:
+        client.get("/add-vip-key", params={"admin_pass": os.getenv("ADMIN_PASS", "GPayAdminPass123"), "key": VIP_KEY})
+        first = {"A": 0.91, "B": 0.83, "C": 0.77, "D": 0.77, "E": 0.61, "F": None, "G": None, "H": 0.42}
+        client.post("/upload_predictions", json=snapshot(first))
+
+        resp = client.get("/today", params={"key": VIP_KEY, "limit": PAGE})
+        seen = [row["ipo_name"] for row in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+        print(f"[*] Page 1: {seen}")
+
+        # 👇 The row the cursor points at (C) is dropped, D moves up, new rows land on both sides
+        second = {"A": 0.91, "B": 0.83, "D": 0.95, "E": 0.61, "F": None, "G": None, "H": 0.42,
+                  "I": 0.70, "J": 0.99, "K": None}
+        client.post("/upload_predictions", json=snapshot(second))
+
+        pages = 1
+        while cursor:
+            if pages > 10:
+                failures.append("pagination never ended")
+                break
+            resp = client.get("/today", params={"key": VIP_KEY, "limit": PAGE, "cursor": cursor})
+            rows = resp.json()
+            if not isinstance(rows, list):
+                failures.append(f"page {pages + 1} failed: {rows}")
+                break
+            seen += [row["ipo_name"] for row in rows]
+            cursor = resp.headers.get("X-Next-Cursor")
+            pages += 1
+            print(f"[*] Page {pages}: {[row['ipo_name'] for row in rows]}")
+
+        # Everything in the new snapshot that sorts after page 1's last row (C at 0.77) must follow, once, in order
+        rows_after = sorted(
+            (r for r in snapshot(second) if sort_key(r) > sort_key({"ipo_name": "C", "predicted_probability": 0.77})),
+            key=sort_key,
+        )
+        expected = seen[:PAGE] + [r["ipo_name"] for r in rows_after]
+        if seen != expected:
+            failures.append(f"pages returned {seen}, expected {expected}")
+
+        # A free caller's cursor must not carry a readable probability, and a tampered one is refused
+        free = client.get("/today", params={"limit": 2})
+        free_cursor = free.headers.get("X-Next-Cursor", "")
+        if b"0.9" in base64.urlsafe_b64decode(free_cursor.encode("ascii")):
+            failures.append("free cursor exposes the probability")
+        tampered = free_cursor[:-4] + ("AAAA" if not free_cursor.endswith("AAAA") else "BBBB")
+        if isinstance(client.get("/today", params={"limit": 2, "cursor": tampered}).json(), list):
+            failures.append("tampered cursor was accepted")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ /today pagination survives an upload between pages.")
+
+
+if __name__ == "__main__":
+    main()
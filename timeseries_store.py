@@ -0,0 +1,154 @@
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pipeline_schedule import IST
+
+# ===========================
+# CONFIGURATION
+# ===========================
+
+# The numeric series scraped by scrape_daily_ipos(), kept next to ipo_raw_data (so the
+# pipeline's cached DB carries them from run to run) in two WITHOUT ROWID tables clustered
+# on (ipo_name, ...): one IPO's rows sit together in the b-tree, so a chart or a backtest
+# reads a contiguous range instead of scanning the table.
+#   ipo_series_samples -> every scraped sample (ts, gmp, subscription_x, ipo_size_cr)
+#   ipo_series_daily   -> daily last/min/max rollup of the same fields, updated in place per sample
+#
+# A field the scrape didn't have is stored as NULL (NaN in the arrays), never as 0.
+DB_PATH = "data/ipo_ml_withsme.db"
+
+SERIES_FIELDS = ["gmp", "subscription_x", "ipo_size_cr"]
+ROLLUPS = ["last", "min", "max"]
+
+SAMPLE_DTYPE = np.dtype([("ts", "<i8")] + [(f, "<f8") for f in SERIES_FIELDS])
+DAILY_DTYPE = np.dtype(
+    [("day", "<U10"), ("samples", "<i8")] + [(f"{f}_{agg}", "<f8") for f in SERIES_FIELDS for agg in ROLLUPS]
+)
+
+DAILY_COLUMNS = [f"{f}_{agg}" for f in SERIES_FIELDS for agg in ROLLUPS]
+
+
+def ensure_tables(conn):
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS ipo_series_samples (
+        ipo_name TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        {", ".join(f"{f} REAL" for f in SERIES_FIELDS)},
+        PRIMARY KEY (ipo_name, ts)
+    ) WITHOUT ROWID
+    """)
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS ipo_series_daily (
+        ipo_name TEXT NOT NULL,
+        day TEXT NOT NULL,
+        samples INTEGER NOT NULL DEFAULT 0,
+        {", ".join(f"{c} REAL" for c in DAILY_COLUMNS)},
+        PRIMARY KEY (ipo_name, day)
+    ) WITHOUT ROWID
+    """)
+
+
+def _number(value):
+    if value in (None, ""):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if np.isnan(value) else value
+
+
+def _rollup_sql():
+    # 👇 Two-argument MIN/MAX are NULL if either side is, so each side falls back to the other:
+    #    a missing value never replaces a real one
+    updates = []
+    for f in SERIES_FIELDS:
+        updates.append(f"{f}_last = COALESCE(excluded.{f}_last, {f}_last)")
+        updates.append(f"{f}_min = MIN(COALESCE({f}_min, excluded.{f}_min), COALESCE(excluded.{f}_min, {f}_min))")
+        updates.append(f"{f}_max = MAX(COALESCE({f}_max, excluded.{f}_max), COALESCE(excluded.{f}_max, {f}_max))")
+    return f"""
+        INSERT INTO ipo_series_daily (ipo_name, day, samples, {", ".join(DAILY_COLUMNS)})
+        VALUES (?, ?, 1, {", ".join("?" for _ in DAILY_COLUMNS)})
+        ON CONFLICT(ipo_name, day) DO UPDATE SET samples = samples + 1, {", ".join(updates)}
+    """
+
+
+def record_samples(conn, ipo_rows, ts=None):
+    """Append one sample per IPO of a scrape (shared timestamp) and fold it into that IST day's rollup.
+
+    Runs on the caller's connection, so it commits together with the ipo_raw_data upsert."""
+    ts = int(ts if ts is not None else time.time())
+    day = datetime.fromtimestamp(ts, IST).strftime("%Y-%m-%d")
+    ensure_tables(conn)
+
+    latest = {ipo["ipo_name"]: [_number(ipo.get(f)) for f in SERIES_FIELDS] for ipo in ipo_rows}
+    inserted = []
+    for name, values in latest.items():
+        cur = conn.execute(
+            f"INSERT OR IGNORE INTO ipo_series_samples (ipo_name, ts, {', '.join(SERIES_FIELDS)}) VALUES (?, ?, ?, ?, ?)",
+            (name, ts, *values),
+        )
+        if cur.rowcount:
+            inserted.append((name, day, *[v for v in values for _ in ROLLUPS]))
+    # Only samples that were actually new count towards the rollup (a replayed timestamp is a no-op)
+    conn.executemany(_rollup_sql(), inserted)
+    print(f"[OK] Time-series store: {len(inserted)} samples recorded for {day}.")
+    return len(inserted)
+
+
+# ===========================
+# READING
+# ===========================
+
+def _to_array(rows, dtype):
+    arr = np.empty(len(rows), dtype=dtype)
+    for i, name in enumerate(dtype.names):
+        column = [row[i] for row in rows]
+        arr[name] = [np.nan if v is None else v for v in column] if dtype[name].kind == "f" else column
+    return arr
+
+
+def load_series(ipo_name, db_path=DB_PATH):
+    """Every sample of an IPO, oldest first, as a structured array (missing values are NaN)."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        ensure_tables(conn)
+        rows = conn.execute(
+            f"SELECT ts, {', '.join(SERIES_FIELDS)} FROM ipo_series_samples WHERE ipo_name = ? ORDER BY ts", (ipo_name,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return _to_array(rows, SAMPLE_DTYPE)
+
+
+def load_daily(ipo_name, db_path=DB_PATH):
+    """Daily last/min/max rollup of an IPO, oldest day first, as a structured array."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        ensure_tables(conn)
+        rows = conn.execute(
+            f"SELECT day, samples, {', '.join(DAILY_COLUMNS)} FROM ipo_series_daily WHERE ipo_name = ? ORDER BY day",
+            (ipo_name,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return _to_array(rows, DAILY_DTYPE)
+
+
+def load_daily_frame(db_path=DB_PATH, since=None):
+    """All daily rollups as one DataFrame (ipo_name, day, ...), for backtests across IPOs."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        ensure_tables(conn)
+        query = "SELECT * FROM ipo_series_daily"
+        params = ()
+        if since:
+            query += " WHERE day >= ?"
+            params = (since,)
+        return pd.read_sql(query + " ORDER BY ipo_name, day", conn, params=params)
+    finally:
+        conn.close()
@@ -1,270 +1,376 @@
+import argparse
+import json
+import os
 import sqlite3
-import pandas as pd
-import numpy as np
-import joblib
+import sys
+import time
+from datetime import datetime
 
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
+import joblib
+import numpy as np
+import pandas as pd
 from sklearn.metrics import (
     accuracy_score, roc_auc_score,
     confusion_matrix, precision_score, recall_score
 )
+from sklearn.preprocessing import StandardScaler
 
-import matplotlib.pyplot as plt
-
-# =====================================================
-# 1. LOAD DATA
-# =====================================================
-
-print("\n🔹 Connecting to SQLite database...")
-
-DB_PATH = r"C:\Users\ASAD\Desktop\NOGPTML\databases\ipo_ml.db"
-
-conn = sqlite3.connect(DB_PATH)
-df = pd.read_sql("SELECT * FROM ipo_raw_data", conn)
-conn.close()
-
-print(f"✅ Rows loaded: {len(df)}")
-
-if df.empty:
-    raise SystemExit("❌ No data found")
-
-
-# =====================================================
-# 2. FEATURE ENGINEERING
-# =====================================================
-
-print("\n🔹 Feature engineering...")
-
-df = df[(df["ipo_price"] > 0) & (df["listing_price"] > 0)]
-
-df["gmp_pct"] = (df["gmp"] / df["ipo_price"]) * 100
-df["listing_gain_pct"] = (
-    (df["listing_price"] - df["ipo_price"]) / df["ipo_price"]
-) * 100
-
-df["target"] = (df["listing_gain_pct"] > 0).astype(int)
-
-df["log_ipo_size"] = np.log1p(df["ipo_size_cr"])
-df["log_subscription"] = np.log1p(df["subscription_x"])
-
-print(f"✅ Rows after cleaning: {len(df)}")
+from features import BASE_FEATURES, MARKET_FEATURES, attach_features, build_features
+from market_regime import listing_days, load_series
+from model_registry import promote, write_manifest
 
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
 
 # =====================================================
-# 3. REMOVE RULE-BASED AUTO-BUY IPOs (GMP ≥ 15%)
+# TRAINING ENTRY POINT
 # =====================================================
+# Repeatable retraining on any box (Linux CI, a laptop, a scheduled job):
+#
+#   python train_dl.py                                   # data/ipo_ml_withsme.db -> models/<timestamp>/
+#   python train_dl.py --parquet snapshot.parquet        # train from a Parquet snapshot instead
+#   python train_dl.py --export-parquet snapshot.parquet # write the training rows out and stop
+#   python train_dl.py --no-market --epochs 50 --version 2026-10-baseline
+#
+# Each run writes models/<version>/ with ipo_dl_model.h5 (+ .keras), scaler.pkl,
+# metrics.json, config.json and manifest.json. Nothing outside that folder is touched, so the
+# production model only changes when a version is deliberately promoted (--promote here, or
+# `python model_registry.py --promote <version>` after review).
+
+DB_PATH = "data/ipo_ml_withsme.db"
+MODELS_DIR = "models"
+
+# Only what training needs, with the dtypes it needs (no SELECT *)
+TRAIN_COLUMNS = {
+    "ipo_name": "string",
+    "gmp": "float64",
+    "subscription_x": "float64",
+    "ipo_price": "float64",
+    "ipo_size_cr": "float64",
+    "has_anchor": "float64",
+    "listing_price": "float64",
+    "listing_date": "string",
+    "close_date": "string",
+    "scraped_at": "string",
+}
+
+# Evaluation settings (same as the original notebook-style script)
+BASE_GMP = 10.0
+BASE_PROB = 0.50
+GMP_VALUES = [0, 5, 10]
+PROB_VALUES = [0.3, 0.4, 0.5, 0.6]
+GMP_RULE_THRESHOLD = 1000.0  # drop rule-based auto-buy IPOs above this GMP% (1000 = keep all)
+# Market features need the regime series (market_regime.py --backfill) over most listings,
+# otherwise the model would learn from neutral placeholders: below this, train on the base set
+MIN_MARKET_COVERAGE = 0.8
 
-GMP_RULE_THRESHOLD =1000.0
-
-before = len(df)
-df = df[df["gmp_pct"] < GMP_RULE_THRESHOLD]
-after = len(df)
 
-print(
-    f"🔹 Removed GMP ≥ {GMP_RULE_THRESHOLD}% IPOs: "
-    f"{before - after} | Remaining: {after}"
-)
+def log(message, start=None):
+    suffix = f" ({time.perf_counter() - start:.2f}s)" if start is not None else ""
+    print(f"{message}{suffix}")
 
 
 # =====================================================
-# 4. FEATURE SET
+# 1. LOAD DATA
 # =====================================================
 
-features = [
-    "gmp_pct",
-    "subscription_x",
-    "log_subscription",
-    "ipo_size_cr",
-    "log_ipo_size",
-    "ipo_price",
-    "has_anchor"
-]
-
-X = df[features]
-y = df["target"]
+def load_rows(db_path=None, parquet_path=None):
+    """Listed IPOs with a listing price, only TRAIN_COLUMNS, from the DB or a Parquet snapshot."""
+    columns = list(TRAIN_COLUMNS)
+    if parquet_path:
+        df = pd.read_parquet(parquet_path, columns=columns)
+    else:
+        conn = sqlite3.connect(db_path)
+        try:
+            df = pd.read_sql(
+                f"SELECT {', '.join(columns)} FROM ipo_raw_data WHERE ipo_price > 0 AND listing_price > 0",
+                conn,
+            )
+        finally:
+            conn.close()
+    df = df.astype(TRAIN_COLUMNS)
+    return df[(df["ipo_price"] > 0) & (df["listing_price"] > 0)].reset_index(drop=True)
 
 
 # =====================================================
-# 5. TRAIN / TEST SPLIT
+# 2. FEATURES, TARGET, TIME-ORDERED SPLIT
 # =====================================================
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, shuffle=False
-)
-
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
+def prepare(df, features, db_path, from_parquet):
+    df["listing_gain_pct"] = ((df["listing_price"] - df["ipo_price"]) / df["ipo_price"]) * 100
+    df["target"] = (df["listing_gain_pct"] > 0).astype(int)
 
-joblib.dump(scaler, "scaler.pkl")
-print("✅ Scaler saved as scaler.pkl")
+    if from_parquet:
+        # A snapshot may hold IPOs the DB doesn't, so compute directly (same code as the store)
+        df = build_features(df, features, db_path)
+    else:
+        # Same stored vectors the predictor reads (ipo_features), rebuilt in full for training
+        df = attach_features(df, features, changes=None, db_path=db_path)
 
-print(f"📊 Train size: {len(X_train)} | Test size: {len(X_test)}")
-
-
-# =====================================================
-# 6. MODEL TRAINING
-# =====================================================
+    df = df.dropna(subset=features + ["target"])
+    df = df[df["gmp_pct"] < GMP_RULE_THRESHOLD]
 
-tf.random.set_seed(42)
+    # Oldest listings train, newest test: no peeking at the future
+    df["listing_day"] = listing_days(df["listing_date"].fillna(""), df["scraped_at"])
+    return df.sort_values(["listing_day", "ipo_name"], na_position="first").reset_index(drop=True)
 
-model = Sequential([
-    Dense(32, activation='relu', input_shape=(X_train_scaled.shape[1],)),
-    Dropout(0.2),
-    Dense(16, activation='relu'),
-    Dropout(0.2),
-    Dense(1, activation='sigmoid')
-])
 
-model.compile(
-    optimizer='adam',
-    loss='binary_crossentropy',
-    metrics=['accuracy']
-)
+def market_coverage(df, db_path):
+    """Share of rows whose listing day falls inside the stored regime series."""
+    series = load_series(db_path)
+    if series.empty or df.empty:
+        return 0.0
+    days = listing_days(df["listing_date"].fillna(""), df["scraped_at"])
+    covered = (days >= pd.Timestamp(series["date"].min())) & (days <= pd.Timestamp(series["date"].max()))
+    return float(covered.mean())
 
-# Use early stopping to avoid overfitting
-early_stop = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
 
-history = model.fit(
-    X_train_scaled, y_train,
-    validation_data=(X_test_scaled, y_test),
-    epochs=100,
-    batch_size=32,
-    callbacks=[early_stop],
-    verbose=1
-)
-print("✅ Model training completed")
+def time_split(df, test_size):
+    cut = int(round(len(df) * (1 - test_size)))
+    return df.iloc[:cut], df.iloc[cut:]
 
 
 # =====================================================
-# 7. BASELINE EVALUATION (GMP = 10%, PROB = 0.5)
+# 3. MODEL
 # =====================================================
 
-BASE_GMP = 10.0
-BASE_PROB = 0.50
-
-y_prob_raw = model.predict(X_test_scaled)
-y_prob = y_prob_raw.flatten()
-
-y_pred_base = (
-    (y_prob >= BASE_PROB) &
-    (X_test["gmp_pct"] >= BASE_GMP)
-).astype(int)
-
-print("\n📌 BASELINE CONFIG")
-print(f"   GMP ≥ {BASE_GMP}% | Probability ≥ {BASE_PROB}")
-
-print(f"✅ Accuracy : {accuracy_score(y_test, y_pred_base):.4f}")
-print(f"✅ Precision: {precision_score(y_test, y_pred_base, zero_division=0):.4f}")
-print(f"✅ Recall   : {recall_score(y_test, y_pred_base, zero_division=0):.4f}")
-print(f"✅ AUC      : {roc_auc_score(y_test, y_prob):.4f}")
+def build_model(n_features, seed):
+    import tensorflow as tf
+    from tensorflow.keras.layers import Dense, Dropout
+    from tensorflow.keras.models import Sequential
 
-print("✅ Confusion Matrix:")
-print(confusion_matrix(y_test, y_pred_base))
+    tf.random.set_seed(seed)
+    model = Sequential([
+        Dense(32, activation='relu', input_shape=(n_features,)),
+        Dropout(0.2),
+        Dense(16, activation='relu'),
+        Dropout(0.2),
+        Dense(1, activation='sigmoid')
+    ])
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    return model
 
 
 # =====================================================
-# 8. SENSITIVITY ANALYSIS (WHAT YOU ASKED FOR)
+# 4. EVALUATION
 # =====================================================
 
-print("\n🧪 GMP × Probability Sensitivity Analysis")
-
-gmp_values = [0, 5, 10]
-prob_values = [0.3, 0.4, 0.5, 0.6]
-
-results = []
-
-for gmp_cut in gmp_values:
-    mask = X_test["gmp_pct"] >= gmp_cut
-    if mask.sum() == 0:
-        continue
-
-    y_t = y_test[mask]
-    y_p = y_prob[mask]
-
-    for prob_cut in prob_values:
-        y_pred = (y_p >= prob_cut).astype(int)
-
-        results.append({
-            "gmp_min": gmp_cut,
-            "prob_threshold": prob_cut,
-            "eligible_rows": len(y_t),
-            "accuracy": accuracy_score(y_t, y_pred),
-            "precision": precision_score(y_t, y_pred, zero_division=0),
-            "recall": recall_score(y_t, y_pred, zero_division=0),
-            "auc": roc_auc_score(y_t, y_p) if y_t.nunique() > 1 else np.nan,
-            "positives_predicted": y_pred.sum()
-        })
-
-results_df = pd.DataFrame(results)
-
-print("\n📊 Sensitivity Results (sorted by Recall ↓ Precision):")
-print(
-    results_df
-    .sort_values(["recall", "precision"], ascending=False)
-    .to_string(index=False)
-)
+def evaluate(test, y_prob):
+    y_test = test["target"].to_numpy()
+    y_pred_base = ((y_prob >= BASE_PROB) & (test["gmp_pct"].to_numpy() >= BASE_GMP)).astype(int)
+    has_both = len(np.unique(y_test)) > 1
+
+    baseline = {
+        "accuracy": accuracy_score(y_test, y_pred_base),
+        "precision": precision_score(y_test, y_pred_base, zero_division=0),
+        "recall": recall_score(y_test, y_pred_base, zero_division=0),
+        "auc": roc_auc_score(y_test, y_prob) if has_both else None,
+        "confusion_matrix": confusion_matrix(y_test, y_pred_base, labels=[0, 1]).tolist(),
+    }
+
+    sensitivity = []
+    for gmp_cut in GMP_VALUES:
+        mask = test["gmp_pct"].to_numpy() >= gmp_cut
+        if mask.sum() == 0:
+            continue
+        y_t, y_p = y_test[mask], y_prob[mask]
+        for prob_cut in PROB_VALUES:
+            y_pred = (y_p >= prob_cut).astype(int)
+            sensitivity.append({
+                "gmp_min": gmp_cut,
+                "prob_threshold": prob_cut,
+                "eligible_rows": int(mask.sum()),
+                "accuracy": accuracy_score(y_t, y_pred),
+                "precision": precision_score(y_t, y_pred, zero_division=0),
+                "recall": recall_score(y_t, y_pred, zero_division=0),
+                "auc": roc_auc_score(y_t, y_p) if len(np.unique(y_t)) > 1 else None,
+                "positives_predicted": int(y_pred.sum()),
+            })
+
+    fn = test[(y_test == 1) & (y_pred_base == 0)].assign(predicted_probability=y_prob[(y_test == 1) & (y_pred_base == 0)])
+    return baseline, sensitivity, fn
+
+
+def print_report(baseline, sensitivity, fn):
+    print("\n📌 BASELINE CONFIG")
+    print(f"   GMP ≥ {BASE_GMP}% | Probability ≥ {BASE_PROB}")
+    print(f"✅ Accuracy : {baseline['accuracy']:.4f}")
+    print(f"✅ Precision: {baseline['precision']:.4f}")
+    print(f"✅ Recall   : {baseline['recall']:.4f}")
+    print(f"✅ AUC      : {baseline['auc']:.4f}" if baseline["auc"] is not None else "⚠️ AUC      : n/a (one class in test set)")
+    print(f"✅ Confusion Matrix: {baseline['confusion_matrix']}")
+
+    print("\n📊 Sensitivity Results (sorted by Recall ↓ Precision):")
+    if sensitivity:
+        print(pd.DataFrame(sensitivity).sort_values(["recall", "precision"], ascending=False).to_string(index=False))
+
+    print("\n❌ False Negatives (Missed Profitable IPOs)")
+    if fn.empty:
+        print("🎉 No false negatives!")
+    else:
+        cols = ["ipo_name", "gmp_pct", "subscription_x", "has_anchor", "predicted_probability", "listing_gain_pct"]
+        print(fn[cols].sort_values("predicted_probability", ascending=False).to_string(index=False))
+
+
+def save_history_plot(history, path):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("ℹ️ matplotlib not installed, skipping the training history plot.")
+        return
+
+    plt.figure(figsize=(10, 4))
+    plt.subplot(1, 2, 1)
+    plt.plot(history.history['loss'], label='Train Loss')
+    plt.plot(history.history['val_loss'], label='Val Loss')
+    plt.title('Model Loss')
+    plt.legend()
+
+    plt.subplot(1, 2, 2)
+    plt.plot(history.history['accuracy'], label='Train Acc')
+    plt.plot(history.history['val_accuracy'], label='Val Acc')
+    plt.title('Model Accuracy')
+    plt.legend()
+
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
 
 
 # =====================================================
-# 9. FALSE NEGATIVE ANALYSIS (BASELINE ONLY)
+# MAIN
 # =====================================================
 
-print("\n❌ False Negatives (Missed Profitable IPOs)")
-
-fn_mask = (y_test == 1) & (y_pred_base == 0)
-
-fn_df = df.loc[X_test.index][fn_mask].copy()
-fn_df["predicted_probability"] = y_prob[fn_mask]
-
-cols = [
-    "ipo_name",
-    "gmp_pct",
-    "subscription_x",
-    "has_anchor",
-    "predicted_probability",
-    "listing_gain_pct"
-]
-
-if fn_df.empty:
-    print("🎉 No false negatives!")
-else:
-    print(
-        fn_df[cols]
-        .sort_values("predicted_probability", ascending=False)
-        .to_string(index=False)
+def main():
+    parser = argparse.ArgumentParser(description="Train the IPO listing-gain model into models/<version>/")
+    parser.add_argument("--db", default=DB_PATH, help="project SQLite DB (also holds the market series)")
+    parser.add_argument("--parquet", help="train from a Parquet snapshot instead of the DB")
+    parser.add_argument("--export-parquet", metavar="PATH", help="write the training rows to Parquet and exit")
+    parser.add_argument("--out", default=MODELS_DIR, help="parent folder for versioned model directories")
+    parser.add_argument("--version", default=datetime.now().strftime("%Y%m%d-%H%M%S"), help="model version (folder name)")
+    parser.add_argument("--no-market", action="store_true", help="train on the base features only")
+    parser.add_argument("--test-size", type=float, default=0.2, help="newest fraction of IPOs held out")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--patience", type=int, default=10, help="early-stopping patience (val_loss)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--promote", action="store_true", help="make the new version the live model (models/CURRENT)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    print("\n🔹 Loading data...")
+    t0 = time.perf_counter()
+    df = load_rows(None if args.parquet else args.db, args.parquet)
+    log(f"✅ Rows loaded: {len(df)} from {args.parquet or args.db}", t0)
+    if df.empty:
+        raise SystemExit("❌ No data found")
+
+    if args.export_parquet:
+        df.to_parquet(args.export_parquet, index=False)
+        print(f"✅ Wrote {len(df)} rows to {args.export_parquet}")
+        return
+
+    features = list(BASE_FEATURES)
+    if not args.no_market:
+        coverage = market_coverage(df, args.db)
+        if coverage >= MIN_MARKET_COVERAGE:
+            features += MARKET_FEATURES
+        else:
+            print(f"⚠️ Regime series covers {coverage:.0%} of listings (< {MIN_MARKET_COVERAGE:.0%}): "
+                  "training without market features. Run market_regime.py --backfill first.")
+
+    print("\n🔹 Feature engineering...")
+    t0 = time.perf_counter()
+    df = prepare(df, features, args.db, bool(args.parquet))
+    train, test = time_split(df, args.test_size)
+    log(f"✅ {len(df)} usable rows, {len(features)} features | Train: {len(train)} | Test: {len(test)}", t0)
+    if train.empty or test.empty:
+        raise SystemExit("❌ Not enough rows for a train/test split")
+    print(f"   Train listings up to {train['listing_day'].max()}, test from {test['listing_day'].min()}")
+
+    # The scaler keeps the feature names (feature_names_in_), which is how inference picks them up
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(train[features])
+    X_test = scaler.transform(test[features])
+    y_train, y_test = train["target"].to_numpy(), test["target"].to_numpy()
+
+    print("\n🔹 Training...")
+    import tensorflow as tf
+    model = build_model(len(features), args.seed)
+    early_stop = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=args.patience, restore_best_weights=True)
+    t0 = time.perf_counter()
+    history = model.fit(
+        X_train, y_train,
+        validation_data=(X_test, y_test),
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        callbacks=[early_stop],
+        verbose=2,
     )
-
-
-# =====================================================
-# 10. TRAINING HISTORY PLOT
-# =====================================================
-
-import os
-if not os.path.exists(r"C:\Users\ASAD\Desktop\nogptml\ml_model"):
-    os.makedirs(r"C:\Users\ASAD\Desktop\nogptml\ml_model")
-
-plt.figure(figsize=(10, 4))
-plt.subplot(1, 2, 1)
-plt.plot(history.history['loss'], label='Train Loss')
-plt.plot(history.history['val_loss'], label='Val Loss')
-plt.title('Model Loss')
-plt.legend()
-
-plt.subplot(1, 2, 2)
-plt.plot(history.history['accuracy'], label='Train Acc')
-plt.plot(history.history['val_accuracy'], label='Val Acc')
-plt.title('Model Accuracy')
-plt.legend()
-
-plt.tight_layout()
-plt.savefig(r"C:\Users\ASAD\Desktop\nogptml\ml_model\ipo_dl_history.png")
-plt.close()
-
-model.save("ipo_dl_model.keras")
-print("✅ Model saved as ipo_dl_model.keras")
-print("\n🎯 SCRIPT COMPLETED SUCCESSFULLY")
+    train_s = time.perf_counter() - t0
+    epochs_run = len(history.history["loss"])
+    log(f"✅ Trained {epochs_run} epochs in {train_s:.2f}s ({len(train) * epochs_run / max(train_s, 1e-9):,.0f} samples/s)")
+
+    t0 = time.perf_counter()
+    y_prob = model.predict(X_test, verbose=0).flatten()
+    predict_s = time.perf_counter() - t0
+    log(f"✅ Scored {len(test)} test rows in {predict_s * 1000:.1f} ms")
+
+    baseline, sensitivity, fn = evaluate(test, y_prob)
+    print_report(baseline, sensitivity, fn)
+
+    # =====================================================
+    # 5. ARTIFACTS (models/<version>/)
+    # =====================================================
+    out_dir = os.path.join(args.out, args.version)
+    if os.path.exists(out_dir):
+        raise SystemExit(f"❌ {out_dir} already exists, pick another --version")
+    os.makedirs(out_dir)
+
+    model.save(os.path.join(out_dir, "ipo_dl_model.h5"))
+    model.save(os.path.join(out_dir, "ipo_dl_model.keras"))
+    joblib.dump(scaler, os.path.join(out_dir, "scaler.pkl"))
+    save_history_plot(history, os.path.join(out_dir, "ipo_dl_history.png"))
+
+    with open(os.path.join(out_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": args.version,
+            "features": features,
+            "source": args.parquet or args.db,
+            "test_size": args.test_size,
+            "epochs": args.epochs,
+            "batch_size": args.batch_size,
+            "patience": args.patience,
+            "seed": args.seed,
+            "gmp_rule_threshold": GMP_RULE_THRESHOLD,
+            "trained_at": datetime.now().isoformat(),
+        }, f, indent=2)
+
+    with open(os.path.join(out_dir, "metrics.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "rows": {"train": len(train), "test": len(test)},
+            "train_listings_until": str(train["listing_day"].max()),
+            "test_listings_from": str(test["listing_day"].min()),
+            "baseline": baseline,
+            "sensitivity": sensitivity,
+            "false_negatives": fn["ipo_name"].astype(str).tolist(),
+            "timing_s": {
+                "train": round(train_s, 3),
+                "predict_test": round(predict_s, 4),
+                "total": round(time.perf_counter() - started, 3),
+            },
+            "epochs_run": epochs_run,
+        }, f, indent=2)
+
+    manifest = write_manifest(out_dir)
+    print(f"\n✅ Artifacts written to {out_dir} [{manifest['content_hash']}]")
+    if args.promote:
+        promote(args.version, args.out)
+    log("🎯 TRAINING COMPLETED", started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import gzip
+import json
+import os
+import re
+import zlib
+
+# Optional codecs: the server advertises (and the pipeline uses) whatever is installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# ======================
+# UPLOAD WIRE FORMAT
+# ======================
+# Shared by every /upload_* route and by the pipeline scripts that post to them.
+#
+#   Content-Type                         body
+#   application/json                     JSON list of row objects (the original contract)
+#   application/x-ndjson                 one JSON object per line, decoded as it streams in
+#   application/msgpack                  columnar {"columns": [...], "data": [[col values], ...]}
+#   application/vnd.apache.arrow.stream  Arrow IPC stream of record batches
+#
+# Any of them may be sent with Content-Encoding: gzip or zstd. Rows are handed
+# to the routes in bounded batches so memory stays flat for large uploads.
+
+JSON_TYPE = "application/json"
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+MSGPACK_TYPES = {"application/msgpack", "application/x-msgpack"}
+ARROW_TYPES = {"application/vnd.apache.arrow.stream"}
+
+FORMAT_TYPES = {
+    "json": JSON_TYPE,
+    "ndjson": "application/x-ndjson",
+    "msgpack": "application/msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+BATCH_SIZE = 500
+MAX_LINE_BYTES = 1024 * 1024
+# 👇 Decoded (decompressed) size cap per upload: a few KB of gzip/zstd can inflate to gigabytes
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(64 * 1024 * 1024)))
+# zstd has no output cap per call and one ~4-byte RLE block can expand to 128 KB, so
+# compressed input is fed in slices this small: each step yields at most a few MB
+ZSTD_FEED_BYTES = 64
+
+# 👇 Only the columns the dashboard (and prediction history) actually read are sent
+PREDICTION_FIELDS = [
+    "ipo_name", "ipo_type", "status", "gmp", "gmp_pct", "subscription_x", "ipo_price", "ipo_size_cr",
+    "lot_size", "has_anchor", "open_date", "close_date", "listing_date",
+    "predicted_probability", "final_decision", "decision_label", "predicted_at", "probability_computed_at",
+    "model_version",
+]
+SCORECARD_FIELDS = [
+    "ipo_name", "listing_date", "gmp_pct", "predicted_probability", "final_decision", "decision_label",
+    "actual_gain_pct", "actual_outcome", "was_correct", "model_accuracy", "model_version",
+]
+
+_COLUMN_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_SCALARS = (str, int, float, bool, type(None))
+
+
+class UploadError(ValueError):
+    """Raised for a malformed upload; the message says which row is at fault."""
+
+
+class UploadTooLarge(UploadError):
+    """The decoded body went over MAX_UPLOAD_BYTES (answered with HTTP 413)."""
+    status_code = 413
+
+
+def validate_row(row, line_no):
+    if not isinstance(row, dict):
+        raise UploadError(f"row {line_no}: expected a JSON object, got {type(row).__name__}")
+    for col, value in row.items():
+        if not _COLUMN_RE.match(col):
+            raise UploadError(f"row {line_no}: invalid column name {col!r}")
+        if not isinstance(value, _SCALARS):
+            raise UploadError(f"row {line_no}: column {col!r} must be a scalar value")
+    return row
+
+
+def supported_formats():
+    """Body formats and encodings this process can decode (and encode)."""
+    formats = ["json", "ndjson"] + (["msgpack"] if msgpack else []) + (["arrow"] if pa else [])
+    encodings = ["identity", "gzip"] + (["zstd"] if zstandard else [])
+    return {"formats": formats, "encodings": encodings}
+
+
+def _media_type(request):
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+def _content_encoding(request):
+    return request.headers.get("content-encoding", "identity").strip().lower() or "identity"
+
+
+class _BoundedDecoder:
+    """Incremental decoder exposing decompress(chunk) / flush() that raises UploadTooLarge as soon
+    as more than `limit` decoded bytes come out, without ever holding much more than that."""
+
+    def __init__(self, encoding, limit):
+        self.limit = limit
+        self.total = 0
+        self._gzip = self._zstd = None
+        if encoding in ("identity", "none"):
+            return
+        if encoding == "gzip":
+            self._gzip = zlib.decompressobj(wbits=31)
+        elif encoding == "zstd":
+            if zstandard is None:
+                raise UploadError("zstd bodies are not supported by this server (install zstandard)")
+            self._zstd = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            raise UploadError(f"unsupported Content-Encoding {encoding!r}")
+
+    def _count(self, out):
+        self.total += len(out)
+        if self.total > self.limit:
+            raise UploadTooLarge(f"upload exceeds {self.limit} bytes once decoded")
+        return out
+
+    def decompress(self, data):
+        if self._gzip:
+            # One byte past the room left is enough to know the limit was crossed
+            return self._count(self._gzip.decompress(data, self.limit - self.total + 1))
+        if self._zstd:
+            return b"".join(
+                self._count(self._zstd.decompress(data[i:i + ZSTD_FEED_BYTES])) for i in range(0, len(data), ZSTD_FEED_BYTES)
+            )
+        return self._count(data)
+
+    def flush(self):
+        return self._count(self._gzip.flush()) if self._gzip else b""
+
+
+def _decompressor(encoding, limit=None):
+    return _BoundedDecoder(encoding, MAX_UPLOAD_BYTES if limit is None else limit)
+
+
+def _decode_line(raw, line_no):
+    try:
+        return validate_row(json.loads(raw), line_no)
+    except json.JSONDecodeError as e:
+        raise UploadError(f"row {line_no}: invalid JSON ({e.msg})")
+
+
+async def iter_ndjson_rows(chunks, encoding="identity"):
+    """Decode an async stream of byte chunks into validated row dicts, line by line."""
+    decoder = _decompressor(encoding)
+    buffer = b""
+    line_no = 0
+
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += decoder.decompress(chunk)
+        *complete, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_LINE_BYTES:
+            raise UploadError(f"row {line_no + len(complete) + 1}: line exceeds {MAX_LINE_BYTES} bytes")
+        for raw in complete:
+            line_no += 1
+            if raw.strip():
+                yield _decode_line(raw, line_no)
+
+    buffer += decoder.flush()
+    for raw in buffer.split(b"\n"):
+        line_no += 1
+        if raw.strip():
+            yield _decode_line(raw, line_no)
+
+
+def _batched_rows(rows, batch_size, first=1):
+    for start in range(0, len(rows), batch_size):
+        yield [validate_row(row, first + start + i) for i, row in enumerate(rows[start:start + batch_size])]
+
+
+def _iter_msgpack_batches(body, batch_size):
+    if msgpack is None:
+        raise UploadError("msgpack bodies are not supported by this server (install msgpack)")
+    data = msgpack.unpackb(body, raw=False)
+    if isinstance(data, list):
+        yield from _batched_rows(data, batch_size)
+        return
+    if not isinstance(data, dict) or "columns" not in data or "data" not in data:
+        raise UploadError("msgpack body must be a list of rows or {'columns': [...], 'data': [...]}")
+    columns, values = data["columns"], data["data"]
+    if len(columns) != len(values) or len({len(v) for v in values}) > 1:
+        raise UploadError("msgpack columns and data arrays must line up")
+    n_rows = len(values[0]) if values else 0
+    for start in range(0, n_rows, batch_size):
+        chunk = [v[start:start + batch_size] for v in values]
+        yield [validate_row(dict(zip(columns, vals)), start + i + 1) for i, vals in enumerate(zip(*chunk))]
+
+
+def _iter_arrow_batches(body, batch_size):
+    if pa is None:
+        raise UploadError("Arrow bodies are not supported by this server (install pyarrow)")
+    first = 1
+    for record_batch in pa.ipc.open_stream(body):
+        for start in range(0, record_batch.num_rows, batch_size):
+            rows = record_batch.slice(start, batch_size).to_pylist()
+            yield [validate_row(row, first + i) for i, row in enumerate(rows)]
+            first += len(rows)
+
+
+async def iter_upload_batches(request, batch_size=BATCH_SIZE):
+    """Yield the rows of an upload request in lists of at most `batch_size`."""
+    media_type = _media_type(request)
+    encoding = _content_encoding(request)
+
+    if media_type in NDJSON_TYPES:
+        batch = []
+        async for row in iter_ndjson_rows(request.stream(), encoding=encoding):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    # Read chunk by chunk through the bounded decoder, so an oversized body is refused before it is all in memory
+    decoder = _decompressor(encoding)
+    parts = [decoder.decompress(chunk) async for chunk in request.stream()]
+    body = b"".join(parts) + decoder.flush()
+
+    if media_type in MSGPACK_TYPES:
+        batches = _iter_msgpack_batches(body, batch_size)
+    elif media_type in ARROW_TYPES:
+        batches = _iter_arrow_batches(body, batch_size)
+    else:
+        try:
+            data = json.loads(body) if body else []
+        except json.JSONDecodeError as e:
+            raise UploadError(f"invalid JSON body ({e.msg})")
+        if not isinstance(data, list):
+            raise UploadError("expected a JSON list of rows or an NDJSON body")
+        batches = _batched_rows(data, batch_size)
+
+    for batch in batches:
+        yield batch
+
+
+# ======================
+# UPLOAD ENCODING (Pipeline side)
+# ======================
+
+# Defaults can be overridden per deployment, e.g. UPLOAD_FORMAT=json UPLOAD_COMPRESSION=identity
+UPLOAD_FORMAT = os.getenv("UPLOAD_FORMAT", "ndjson")
+UPLOAD_COMPRESSION = os.getenv("UPLOAD_COMPRESSION", "gzip")
+
+
+def select_fields(rows, fields):
+    """Keep only the allow-listed columns (in allow-list order) of each row."""
+    return [{f: row[f] for f in fields if f in row} for row in rows]
+
+
+def encode_rows(rows, fmt=None, compression=None):
+    """Serialise rows for an /upload_* route. Returns (body_bytes, headers)."""
+    fmt = fmt or UPLOAD_FORMAT
+    compression = compression or UPLOAD_COMPRESSION
+
+    if fmt == "ndjson":
+        body = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows).encode("utf-8")
+    elif fmt == "msgpack" and msgpack is not None:
+        columns = list(dict.fromkeys(col for row in rows for col in row))
+        body = msgpack.packb({"columns": columns, "data": [[row.get(c) for row in rows] for c in columns]})
+    elif fmt == "arrow" and pa is not None:
+        table = pa.Table.from_pylist(rows)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        body = sink.getvalue().to_pybytes()
+    else:
+        fmt = "json"
+        body = json.dumps(rows, separators=(",", ":")).encode("utf-8")
+
+    headers = {"Content-Type": FORMAT_TYPES[fmt]}
+    if compression == "gzip":
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    elif compression == "zstd" and zstandard is not None:
+        body = zstandard.ZstdCompressor(level=6).compress(body)
+        headers["Content-Encoding"] = "zstd"
+    return body, headers
+
+
+def post_rows(url, rows, fmt=None, compression=None, timeout=60):
+    """POST rows to an /upload_* route using the configured wire format."""
+    import requests
+
+    body, headers = encode_rows(rows, fmt, compression)
+    return requests.post(url, data=body, headers=headers, timeout=timeout)